@@ -1,12 +1,31 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g
 from flask_cors import CORS
+from backend import metrics
+from backend.audio_store import AudioStore, content_etag
+from backend.latency import LatencyTracker
+from backend.readiness import Readiness, STARTING_STATES
+from backend.request_context import new_request_id
+from backend.logging_setup import configure_logging, logging_stats
+from backend.prefork import preloaded_speech_to_text, process_stats
+from backend.tts_pipeline import split_into_segments, synthesize_segments
+from backend.transcription_service import TranscriptionQueueFull
+from backend.jobs import CRISIS_PRIORITY, JobManager, JobRejected, parse_priority
+from backend.tts_profiles import PROFILES, ProfileStats, default_profile
+from backend.app_common import (
+    AUDIO_CACHE_MAX_AGE, CRISIS_FOLLOW_UP, FALLBACK_RESPONSE, PERSIST_USER_AUDIO,
+    REQUIRED_SUBSYSTEMS, crisis_template, has_audio, health_timestamp,
+    parse_session_id, prewarm_tts_cache, record_audio_turn, request_profile,
+    save_speech, save_user_audio, speech_settings,
+)
+import json
 import os
+import time
 import warnings
 import traceback
 import logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 warnings.filterwarnings('ignore')
@@ -14,50 +33,130 @@ warnings.filterwarnings('ignore')
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend access
 
+@app.before_request
+def start_request_metrics():
+    g.request_id = new_request_id(request.headers.get("X-Request-ID"))
+    g.request_started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def finish_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    response.headers["X-Request-ID"] = g.request_id
+    if "session_id" in g:
+        response.headers["X-Session-ID"] = g.session_id
+    metrics.REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def close_request_metrics(error=None):
+    if "request_started" in g:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
 # Global variables for clients
 orch = None
 sst_client = None
 murf_client = None
+latency = LatencyTracker()
+audio_store = AudioStore("audios")
+tts_profiles = ProfileStats()
+readiness = Readiness(["orchestrator", "speech_to_text", "text_to_speech"])
+
+# The safety template synthesized per output profile (see crisis_audio).
+crisis_audio_filepaths = {}
+
+def llm_token_usage():
+    if orch is None:
+        return None
+    from backend.gemini_client import get_token_usage
+    return get_token_usage()
 
-def initialize_clients():
-    global orch, sst_client, murf_client
+def llm_cache_stats():
+    if orch is None:
+        return None
+    from backend.gemini_client import get_response_cache_stats
+    return get_response_cache_stats()
+
+def load_orchestrator():
+    global orch
+    logger.info("Initializing Orchestrator...")
+    from backend.orchastrator import Orchestrator
+    orch = Orchestrator()
+    readiness.mark("orchestrator", "warming")
     try:
-        logger.info("Initializing Orchestrator...")
-        from backend.orchastrator import Orchestrator
-        orch = Orchestrator()
-        logger.info("✓ Orchestrator initialized successfully")
+        # Build the shared Gemini model (and its prompt cache) before the first request.
+        from backend.gemini_client import get_model
+        get_model()
     except Exception as e:
-        logger.error(f"✗ Orchestrator initialization failed: {e}")
-        orch = None
+        logger.warning(f"⚠️  Gemini model warm-up failed, will retry on first request: {e}")
 
-    try:
+def load_speech_to_text():
+    global sst_client
+    client = preloaded_speech_to_text()
+    if client is not None:
+        # Loaded once by the pre-fork master (serve.py) and shared copy-on-write.
+        logger.info("Using the SpeechToText loaded by the pre-fork master")
+    elif int(os.getenv("STT_WORKERS", "1")) > 0:
+        logger.info("Initializing TranscriptionService...")
+        from backend.transcription_service import TranscriptionService
+        client = TranscriptionService()
+    else:
         logger.info("Initializing SpeechToText...")
         from backend.speech_to_text import SpeechToText
-        sst_client = SpeechToText()
-        logger.info("✓ SpeechToText initialized successfully")
-    except Exception as e:
-        logger.error(f"✗ SpeechToText initialization failed: {e}")
-        sst_client = None
+        client = SpeechToText()
+    readiness.mark("speech_to_text", "warming")
+    client.warm_up()
+    sst_client = client
 
+def load_text_to_speech():
+    global murf_client
+    logger.info("Initializing MurfTTSClient...")
+    from backend.text_to_speech import MurfTTSClient
+    client = MurfTTSClient()
+    if os.getenv("TTS_CACHE", "1") == "1":
+        from backend.tts_cache import CachedTTSClient
+        client = CachedTTSClient(client)
+    murf_client = client
     try:
-        logger.info("Initializing MurfTTSClient...")
-        from backend.text_to_speech import MurfTTSClient
-        murf_client = MurfTTSClient()
-        logger.info("✓ MurfTTSClient initialized successfully")
+        crisis_audio()
     except Exception as e:
-        logger.error(f"✗ MurfTTSClient initialization failed: {e}")
-        murf_client = None
+        logger.warning(f"⚠️  Crisis audio pre-synthesis failed, will retry on the first crisis turn: {e}")
+    if hasattr(client, "prewarm"):
+        prewarm_tts_cache(client)
+
+def initialize_clients(wait: bool = False):
+    """
+    Load every subsystem in its own background thread and return at once, so
+    the server can answer /health while Whisper and Gemini are still loading.
+    Pass wait=True to block until every subsystem is ready or failed.
+    """
+    readiness.run("orchestrator", load_orchestrator)
+    readiness.run("speech_to_text", load_speech_to_text)
+    readiness.run("text_to_speech", load_text_to_speech)
+    audio_store.start_janitor()
+    if wait:
+        readiness.wait()
+
+def stt_alive() -> bool:
+    return sst_client.is_alive() if hasattr(sst_client, "is_alive") else sst_client is not None
 
-def generate_ai_response(message) -> str:
+def service_status(name: str) -> str:
+    state = readiness.state(name)
+    if state == "ready":
+        return "available"
+    return "starting" if state in STARTING_STATES else "unavailable"
+
+def generate_ai_response(message, session_id: str = None) -> str:
     if orch is None:
         raise RuntimeError("Orchestrator not initialized. Check backend configuration.")
     try:
         if isinstance(message, str):
-            result = orch.start_session([message])
-        elif isinstance(message, list):
-            result = orch.start_session(message)
-        else:
+            message = [message]
+        elif not isinstance(message, list):
             raise ValueError("generate_ai_response: message must be str or list[str]")
+        with metrics.stage("llm"):
+            result = orch.start_session(message, session_id=session_id)
         if not result or 'solution' not in result:
             raise RuntimeError("Invalid response from Orchestrator")
         return result['solution']
@@ -71,37 +170,222 @@ def transcribe_audio(filepath: str) -> str:
     if not os.path.isfile(filepath):
         raise FileNotFoundError(f"Audio file not found: {filepath}")
     try:
-        return sst_client.transcribe(audio_path=filepath)
+        with metrics.stage("transcription"):
+            return sst_client.transcribe(audio_path=filepath)
     except Exception as e:
         logger.error(f"Audio transcription error: {e}")
         raise
 
-def generate_audio_response(ai_message: str) -> str:
+def transcribe_audio_bytes(audio_bytes: bytes) -> str:
+    if sst_client is None:
+        raise RuntimeError("SpeechToText client not initialized. Check backend configuration.")
+    try:
+        with metrics.stage("transcription"):
+            return sst_client.transcribe(audio_path=audio_bytes)
+    except Exception as e:
+        logger.error(f"Audio transcription error: {e}")
+        raise
+
+def generate_audio_response(ai_message: str, profile=None) -> str:
     if murf_client is None:
         raise RuntimeError("MurfTTSClient not initialized. Check backend configuration.")
+    profile = profile or default_profile()
     try:
-        os.makedirs("audios", exist_ok=True)
-        resp = murf_client.generate_speech(
-            text=ai_message,
-            voice_id="en-US-natalie",
-            style="empathetic",
-            encode_as_base64=True,
-            format="MP3",
-            sample_rate=44100,
-            channel_type="MONO",
-            rate=-6.0,
-            pitch=-5.0,
-            variation=4
-        )
-        if resp["success"] and resp.get("encoded_audio"):
-            # Always save as MP3
-            return murf_client.save_audio(resp["encoded_audio"], folder="audios", filename="ai_response.mp3")
+        with metrics.stage("tts"):
+            resp = murf_client.generate_speech(
+                text=ai_message,
+                **speech_settings(profile)
+            )
+        if has_audio(resp):
+            with metrics.stage("save_audio"):
+                return save_speech(audio_store, murf_client, resp, profile)
         else:
+            metrics.STAGE_ERRORS.inc(stage="tts")
             raise RuntimeError("Speech generation failed or no audio returned.")
     except Exception as e:
         logger.error(f"Audio generation error: {e}")
         raise
 
+def crisis_audio(profile=None) -> str:
+    """
+    Audio of the safety template. Synthesized when TTS loads (in the
+    default profile; the others come from the prewarmed TTS cache), and
+    again if the audio janitor has removed it.
+    """
+    profile = profile or default_profile()
+    path = crisis_audio_filepaths.get(profile.name)
+    if path is None or not os.path.exists(path):
+        path = crisis_audio_filepaths[profile.name] = generate_audio_response(crisis_template(orch), profile)
+    return path
+
+def crisis_reply(message: str, session_id: str = None, audio: bool = False, profile=None):
+    """
+    The crisis fast path. If `message` trips the safety matcher, answer at
+    once with the safety template (and its pre-synthesized audio) instead
+    of waiting on Gemini. The turn is recorded before replying; the
+    follow-up reply runs as a job ahead of all queued work, and the reply's
+    `follow_up` says where to collect it (None without a session_id, as
+    there is no session to follow up in). Returns None for other messages.
+    """
+    if orch is None or not orch.crisis_matches([message]):
+        return None
+    started = time.perf_counter()
+    reply = {"content": orch.crisis_template, "crisis": True, "follow_up": None}
+    if audio:
+        try:
+            reply["audio_filepath"] = crisis_audio(profile)
+        except Exception as e:
+            # The text still goes out; it matters more than the voice.
+            logger.error(f"Crisis audio unavailable: {e}")
+            reply["audio_filepath"] = None
+    try:
+        # Recorded before replying, so a turn sent next lands after it.
+        orch.record_crisis_turn([message], session_id)
+    except Exception as e:
+        logger.error(f"Could not record crisis turn for session {session_id}: {e}")
+    if CRISIS_FOLLOW_UP and session_id:
+        stages = ["llm", "tts"] if audio else ["llm"]
+        payload = {"crisis_follow_up": True}
+        if profile is not None:
+            payload["audio_profile"] = profile.name
+        try:
+            job = jobs.submit(payload, stages, session_id=session_id, priority=CRISIS_PRIORITY)
+            reply["follow_up"] = {"job_id": job.id, "events_url": f"/jobs/{job.id}/events"}
+        except Exception as e:
+            logger.error(f"Could not queue crisis follow-up for session {session_id}: {e}")
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    latency.record("crisis_path", elapsed_ms)
+    metrics.observe_stage("crisis_path", elapsed_ms / 1000)
+    logger.warning("Crisis turn answered on the fast path in %.1f ms (session %s)", elapsed_ms, session_id)
+    return reply
+
+def queue_full_response(error: TranscriptionQueueFull):
+    response = jsonify({
+        "error": "Server is busy transcribing other messages. Please try again shortly.",
+        "queue_depth": error.queue_depth,
+        "max_queue": error.max_queue
+    })
+    response.headers["Retry-After"] = "2"
+    return response, 503
+
+def stream_audio_segments(ai_message: str, profile=None):
+    """
+    Synthesize `ai_message` sentence by sentence and yield (segment_text,
+    audio_filepath) pairs in order as each segment becomes available.
+    """
+    if murf_client is None:
+        raise RuntimeError("MurfTTSClient not initialized. Check backend configuration.")
+    profile = profile or default_profile()
+    segments = split_into_segments(ai_message)
+    results = synthesize_segments(murf_client, segments, **speech_settings(profile))
+    for index, (segment, resp) in enumerate(zip(segments, results)):
+        if not has_audio(resp):
+            metrics.STAGE_ERRORS.inc(stage="tts")
+            raise RuntimeError(f"Speech generation failed for segment {index}.")
+        with metrics.stage("save_audio"):
+            audio_filepath = save_speech(audio_store, murf_client, resp, profile)
+        yield segment, audio_filepath
+
+def voice_turn_events(transcribe, session_id: str = None, profile=None):
+    """
+    Run one voice turn and yield it as Server-Sent Events: `transcript`,
+    `content`, one `segment` per synthesized sentence, then `done`.
+    `transcribe` is a zero-argument callable returning the user's text.
+    """
+    started = time.perf_counter()
+    profile = profile or default_profile()
+    try:
+        transcribed_text = transcribe()
+    except TranscriptionQueueFull as e:
+        logger.warning(f"Transcription rejected: {e}")
+        yield sse_event("error", {
+            "error": "Server is busy transcribing other messages. Please try again shortly.",
+            "queue_depth": e.queue_depth,
+            "max_queue": e.max_queue
+        })
+        return
+    except Exception as e:
+        logger.error(f"Audio transcription failed: {e}")
+        yield sse_event("error", {"error": "Audio transcription failed: " + str(e)})
+        return
+    yield sse_event("transcript", {"transcribed_text": transcribed_text})
+
+    crisis = crisis_reply(transcribed_text, session_id=session_id, audio=True, profile=profile)
+    if crisis is not None:
+        audio_filepath = crisis.pop("audio_filepath")
+        yield sse_event("content", crisis)
+        if audio_filepath:
+            yield sse_event("segment", {"index": 0, "text": crisis["content"], "audio_filepath": audio_filepath})
+        yield sse_event("done", {
+            "audio_filepaths": [audio_filepath] if audio_filepath else [],
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+        return
+
+    try:
+        ai_response = generate_ai_response(transcribed_text, session_id=session_id)
+    except Exception as e:
+        logger.error(f"AI response generation failed: {e}")
+        yield sse_event("error", {"error": "AI response generation failed: " + str(e)})
+        return
+    yield sse_event("content", {"content": ai_response})
+
+    first_audio_ms = None
+    audio_filepaths = []
+    try:
+        for index, (segment, audio_filepath) in enumerate(stream_audio_segments(ai_response, profile)):
+            if first_audio_ms is None:
+                first_audio_ms = (time.perf_counter() - started) * 1000
+                latency.record("voice_stream_first_audio", first_audio_ms)
+                metrics.observe_stage("voice_first_audio", first_audio_ms / 1000)
+            audio_filepaths.append(audio_filepath)
+            yield sse_event("segment", {"index": index, "text": segment, "audio_filepath": audio_filepath})
+    except Exception as e:
+        logger.error(f"Audio generation failed: {e}")
+        yield sse_event("error", {"error": "Audio generation failed: " + str(e)})
+        return
+
+    total_ms = (time.perf_counter() - started) * 1000
+    latency.record("voice_stream_total", total_ms)
+    if audio_filepaths:
+        tts_profiles.record(profile, audio_filepaths, first_audio_ms)
+    yield sse_event("done", {
+        "audio_filepaths": audio_filepaths,
+        "audio_profile": profile.name,
+        "time_to_first_audio_ms": first_audio_ms and round(first_audio_ms, 1),
+        "total_ms": round(total_ms, 1)
+    })
+
+def run_stt_job(job) -> dict:
+    transcribed_text = transcribe_audio_bytes(job.payload.pop("audio"))
+    if orch is not None and orch.crisis_matches([transcribed_text]):
+        # Jump ahead of everything still waiting for the LLM and TTS.
+        job.priority = CRISIS_PRIORITY
+    return {"transcribed_text": transcribed_text}
+
+def run_llm_job(job) -> dict:
+    if job.payload.get("crisis_follow_up"):
+        # Submitted by crisis_reply, which has already recorded the turn.
+        return {"content": orch.crisis_follow_up(job.session_id)}
+    message = job.result.get("transcribed_text") or job.payload["user_message"]
+    crisis = crisis_reply(message, session_id=job.session_id)
+    if crisis is not None:
+        return crisis
+    return {"content": generate_ai_response(message, session_id=job.session_id)}
+
+def run_tts_job(job) -> dict:
+    profile = PROFILES.get(job.payload.get("audio_profile")) or default_profile()
+    if job.result.get("crisis"):
+        return {"audio_filepath": crisis_audio(profile)}
+    if not job.result.get("content"):
+        return {"audio_filepath": None}
+    audio_filepath = generate_audio_response(job.result["content"], profile)
+    tts_profiles.record(profile, [audio_filepath], (time.time() - job.created) * 1000)
+    return {"audio_filepath": audio_filepath, "audio_profile": profile.name}
+
+# Turns submitted to POST /jobs run on these per-stage worker queues.
+jobs = JobManager({"stt": run_stt_job, "llm": run_llm_job, "tts": run_tts_job})
+
 @app.route("/", methods=["GET"])
 def health_check():
     return jsonify({
@@ -109,30 +393,83 @@ def health_check():
         "message": "AI Therapist API is operational",
         "version": "1.0.0",
         "services": {
-            "orchestrator": orch is not None,
-            "speech_to_text": sst_client is not None,
-            "text_to_speech": murf_client is not None
+            "orchestrator": readiness.is_ready("orchestrator"),
+            "speech_to_text": readiness.is_ready("speech_to_text"),
+            "text_to_speech": readiness.is_ready("text_to_speech")
         }
     }), 200
 
+@app.before_request
+def require_ready_subsystems():
+    required = REQUIRED_SUBSYSTEMS.get(request.endpoint, [])
+    if request.endpoint == "chat_endpoint":
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and data.get("dtype") == "audio":
+            required = REQUIRED_SUBSYSTEMS["voice_turn_endpoint"]
+    elif request.endpoint == "create_job" and request.files:
+        required = REQUIRED_SUBSYSTEMS["voice_turn_endpoint"]
+    starting = readiness.starting(required)
+    if starting:
+        response = jsonify({
+            "error": "Server is still starting up. Please try again shortly.",
+            "starting": starting
+        })
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
 @app.route("/health", methods=["GET"])
 def health():
+    subsystems = readiness.snapshot({"speech_to_text": stt_alive})
     return jsonify({
         "status": "healthy",
-        "timestamp": "2025-09-20 09:53:16",
+        "timestamp": health_timestamp(),
         "services": {
-            "orchestrator": "available" if orch is not None else "unavailable",
-            "speech_to_text": "available" if sst_client is not None else "unavailable", 
-            "text_to_speech": "available" if murf_client is not None else "unavailable"
-        }
+            "orchestrator": service_status("orchestrator"),
+            "speech_to_text": service_status("speech_to_text"),
+            "text_to_speech": service_status("text_to_speech")
+        },
+        "live": True,
+        "ready": all(entry["ready"] for entry in subsystems.values()),
+        "subsystems": subsystems,
+        "sessions": orch.sessions.stats() if orch is not None else None,
+        "session_store": orch.store_stats() if orch is not None else None,
+        "history_compaction": orch.compaction_stats() if orch is not None else None,
+        "process": process_stats(),
+        "transcription": sst_client.stats() if hasattr(sst_client, "stats") else None,
+        "tts_cache": murf_client.stats() if hasattr(murf_client, "stats") else None,
+        "tts_transport": murf_client.transport_stats() if murf_client is not None else None,
+        "llm_tokens": llm_token_usage(),
+        "llm_cache": llm_cache_stats(),
+        "logging": logging_stats(),
+        "audio_store": audio_store.stats(),
+        "tts_profiles": tts_profiles.summary(),
+        "jobs": jobs.stats(),
+        "latency": latency.summary()
     }), 200
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness probe for load balancers: 200 once every subsystem can serve
+    requests, 503 while any is still loading or has failed.
+    """
+    subsystems = readiness.snapshot({"speech_to_text": stt_alive})
+    is_ready = all(entry["ready"] for entry in subsystems.values())
+    return jsonify({"ready": is_ready, "subsystems": subsystems}), 200 if is_ready else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    Prometheus text exposition of stage latencies, errors, fallbacks and in-flight gauges.
+    """
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/test", methods=["POST"])
 def test_endpoint():
     try:
         logger.info("Test endpoint called")
         data = request.json
-        logger.info(f"Received data: {data}")
+        logger.debug("Received data: %s", data)
         return jsonify({
             "received": data,
             "message": "Test endpoint working perfectly",
@@ -148,16 +485,16 @@ def chat_endpoint():
     logger.info("=== CHAT ENDPOINT CALLED ===")
     try:
         data = request.json
-        logger.info(f"Request data: {data}")
+        logger.debug("Request data: %s", data)
         if not data:
             logger.error("Missing JSON body")
             return jsonify({"error": "Missing JSON body"}), 400
 
         user_message = data.get("user_message")
         dtype = data.get("dtype")
+        session_id = data.get("session_id")
 
-        logger.info(f"User message: {user_message}")
-        logger.info(f"Data type: {dtype}")
+        logger.info("dtype=%s session_id=%s message_chars=%d", dtype, session_id, len(user_message or ""))
 
         if dtype not in ("audio", "message"):
             logger.error(f"Invalid dtype: {dtype}")
@@ -165,31 +502,45 @@ def chat_endpoint():
         if not user_message or not isinstance(user_message, str) or not user_message.strip():
             logger.error("Missing or empty user_message")
             return jsonify({"error": "Missing or empty user_message"}), 400
+        try:
+            g.session_id = session_id = parse_session_id(session_id)
+        except ValueError as e:
+            logger.error("Invalid session_id")
+            return jsonify({"error": str(e)}), 400
 
         if dtype == "audio":
             logger.info("Processing audio message...")
             try:
-                logger.info(f"Transcribing audio file: {user_message}")
+                logger.debug("Transcribing audio file: %s", user_message)
                 transcribed_text = transcribe_audio(user_message)
-                logger.info(f"Transcribed text: {transcribed_text}")
+                logger.debug("Transcribed text: %s", transcribed_text)
             except FileNotFoundError as e:
                 logger.error(f"Audio file not found: {e}")
                 return jsonify({"error": str(e)}), 400
+            except TranscriptionQueueFull as e:
+                logger.warning(f"Transcription rejected: {e}")
+                return queue_full_response(e)
             except Exception as e:
                 logger.error(f"Audio transcription failed: {e}")
                 return jsonify({"error": "Audio transcription failed: " + str(e)}), 500
 
+            profile = request_profile(request.args, request.headers)
+            crisis = crisis_reply(transcribed_text, session_id=session_id, audio=True, profile=profile)
+            if crisis is not None:
+                return jsonify(dict(crisis, transcribed_text=transcribed_text, type="audio"))
+
             try:
                 logger.info("Generating AI response for transcribed text...")
-                ai_response = generate_ai_response(transcribed_text)
-                logger.info(f"AI response: {ai_response}")
+                ai_response = generate_ai_response(transcribed_text, session_id=session_id)
+                logger.debug("AI response: %s", ai_response)
             except Exception as e:
                 logger.error(f"AI response generation failed: {e}")
                 return jsonify({"error": "AI response generation failed: " + str(e)}), 500
 
             try:
                 logger.info("Generating audio response...")
-                audio_filepath = generate_audio_response(ai_response)
+                audio_filepath = generate_audio_response(ai_response, profile)
+                record_audio_turn(tts_profiles, profile, [audio_filepath], g.request_started)
                 logger.info(f"Audio file saved: {audio_filepath}")
             except Exception as e:
                 logger.error(f"Audio generation failed: {e}")
@@ -198,28 +549,33 @@ def chat_endpoint():
             response = {
                 "content": ai_response,
                 "audio_filepath": audio_filepath,
+                "audio_profile": profile.name,
                 "transcribed_text": transcribed_text,
                 "type": "audio"
             }
-            logger.info(f"Returning audio response: {response}")
+            logger.info("Returning audio response (%d chars)", len(ai_response))
             return jsonify(response)
 
         elif dtype == "message":
             logger.info("Processing text message...")
+            crisis = crisis_reply(user_message, session_id=session_id)
+            if crisis is not None:
+                return jsonify(dict(crisis, type="message"))
             try:
                 logger.info("Generating AI response for text message...")
-                ai_response = generate_ai_response(user_message)
-                logger.info(f"AI response: {ai_response}")
+                ai_response = generate_ai_response(user_message, session_id=session_id)
+                logger.debug("AI response: %s", ai_response)
                 response = {
                     "content": ai_response,
                     "type": "message"
                 }
-                logger.info(f"Returning text response: {response}")
+                logger.info("Returning text response (%d chars)", len(ai_response))
                 return jsonify(response)
             except Exception as e:
                 logger.error(f"AI response generation failed: {e}")
+                metrics.FALLBACKS.inc(endpoint="chat")
                 fallback_response = {
-                    "content": "I understand you're reaching out. I'm here to listen and support you. Could you tell me more about what's on your mind?",
+                    "content": FALLBACK_RESPONSE,
                     "type": "message"
                 }
                 logger.info("Returning fallback response")
@@ -230,21 +586,292 @@ def chat_endpoint():
         logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({"error": "Server error: " + str(e)}), 500
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream_endpoint():
+    """
+    Streaming variant of /chat for text messages. Replies are sent as
+    Server-Sent Events: one `token` event per Gemini chunk, then a `done`
+    event carrying the full text and timings, or an `error` event.
+    """
+    logger.info("=== CHAT STREAM ENDPOINT CALLED ===")
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Missing JSON body"}), 400
+
+    user_message = data.get("user_message")
+    session_id = data.get("session_id")
+    if not user_message or not isinstance(user_message, str) or not user_message.strip():
+        return jsonify({"error": "Missing or empty user_message"}), 400
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if orch is None:
+        return jsonify({"error": "Orchestrator not initialized. Check backend configuration."}), 503
+
+    def generate():
+        crisis = crisis_reply(user_message, session_id=session_id)
+        if crisis is not None:
+            yield sse_event("token", {"text": crisis["content"]})
+            yield sse_event("done", crisis)
+            return
+        started = time.perf_counter()
+        ttft_ms = None
+        parts = []
+        try:
+            with metrics.stage("llm"):
+                for chunk in orch.stream_session([user_message], session_id=session_id):
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                        latency.record("chat_stream_ttft", ttft_ms)
+                        metrics.observe_stage("llm_first_token", ttft_ms / 1000)
+                    parts.append(chunk)
+                    yield sse_event("token", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Streaming AI response failed: {e}")
+            if not parts:
+                metrics.FALLBACKS.inc(endpoint="chat_stream")
+                yield sse_event("done", {"content": FALLBACK_RESPONSE, "fallback": True})
+            else:
+                yield sse_event("error", {"error": "AI response generation failed: " + str(e)})
+            return
+        total_ms = (time.perf_counter() - started) * 1000
+        latency.record("chat_stream_total", total_ms)
+        logger.info(f"Stream complete: ttft={ttft_ms and round(ttft_ms)}ms total={round(total_ms)}ms")
+        yield sse_event("done", {
+            "content": "".join(parts),
+            "ttft_ms": ttft_ms and round(ttft_ms, 1),
+            "total_ms": round(total_ms, 1)
+        })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/chat/voice-stream", methods=["POST"])
+def chat_voice_stream_endpoint():
+    """
+    Streaming variant of /chat for audio messages. Sends Server-Sent Events:
+    `transcript`, then `content` with the full reply, then one `segment` per
+    synthesized sentence in playback order, then `done`.
+    """
+    logger.info("=== CHAT VOICE STREAM ENDPOINT CALLED ===")
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Missing JSON body"}), 400
+
+    user_message = data.get("user_message")
+    session_id = data.get("session_id")
+    if not user_message or not isinstance(user_message, str) or not user_message.strip():
+        return jsonify({"error": "Missing or empty user_message"}), 400
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return Response(
+        stream_with_context(voice_turn_events(lambda: transcribe_audio(user_message), session_id, request_profile(request.args, request.headers))),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/voice-turn", methods=["POST"])
+def voice_turn_endpoint():
+    """
+    One-request voice turn. Takes the recording as multipart field `audio`,
+    decodes and transcribes it in memory, and answers like /chat (or like
+    /chat/voice-stream when the form field `stream` is "1").
+    """
+    logger.info("=== VOICE TURN ENDPOINT CALLED ===")
+    if 'audio' not in request.files:
+        return jsonify({'error': 'No audio file provided'}), 400
+    with metrics.stage("upload"):
+        audio_bytes = request.files['audio'].read()
+    if not audio_bytes:
+        return jsonify({'error': 'Empty audio file'}), 400
+    session_id = request.form.get("session_id")
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if PERSIST_USER_AUDIO:
+        save_user_audio(audio_bytes, request.files['audio'].filename)
+    profile = request_profile(request.args, request.headers)
+
+    if request.form.get("stream") == "1":
+        return Response(
+            stream_with_context(voice_turn_events(lambda: transcribe_audio_bytes(audio_bytes), session_id, profile)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    try:
+        transcribed_text = transcribe_audio_bytes(audio_bytes)
+    except TranscriptionQueueFull as e:
+        logger.warning(f"Transcription rejected: {e}")
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Audio transcription failed: {e}")
+        return jsonify({"error": "Audio transcription failed: " + str(e)}), 500
+
+    crisis = crisis_reply(transcribed_text, session_id=session_id, audio=True, profile=profile)
+    if crisis is not None:
+        return jsonify(dict(crisis, transcribed_text=transcribed_text, type="audio"))
+
+    try:
+        ai_response = generate_ai_response(transcribed_text, session_id=session_id)
+    except Exception as e:
+        logger.error(f"AI response generation failed: {e}")
+        return jsonify({"error": "AI response generation failed: " + str(e)}), 500
+
+    try:
+        audio_filepath = generate_audio_response(ai_response, profile)
+        record_audio_turn(tts_profiles, profile, [audio_filepath], g.request_started)
+    except Exception as e:
+        logger.error(f"Audio generation failed: {e}")
+        return jsonify({"error": "Audio generation failed: " + str(e)}), 500
+
+    return jsonify({
+        "content": ai_response,
+        "audio_filepath": audio_filepath,
+        "audio_profile": profile.name,
+        "transcribed_text": transcribed_text,
+        "type": "audio"
+    })
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    """
+    Submit a turn as a job and answer 202 with its id at once. A multipart
+    upload with an `audio` file runs transcription, LLM and TTS; a JSON
+    body with `user_message` starts at the LLM. `reply_audio` "0" skips
+    TTS and `priority` is high, normal or low; turns that trip the safety
+    matcher always run first. Results are read from GET /jobs/<id> or
+    streamed from GET /jobs/<id>/events.
+    """
+    if request.files:
+        if 'audio' not in request.files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        with metrics.stage("upload"):
+            audio_bytes = request.files['audio'].read()
+        if not audio_bytes:
+            return jsonify({'error': 'Empty audio file'}), 400
+        fields = request.form
+        payload = {"audio": audio_bytes}
+        stages = ["stt", "llm", "tts"]
+    else:
+        fields = request.get_json(silent=True) or {}
+        user_message = fields.get("user_message")
+        if not isinstance(user_message, str) or not user_message.strip():
+            return jsonify({"error": "user_message is required"}), 400
+        payload = {"user_message": user_message.strip()}
+        stages = ["llm", "tts"]
+    if str(fields.get("reply_audio", "1")) == "0":
+        stages = stages[:-1]
+    else:
+        payload["audio_profile"] = request_profile(request.args, request.headers).name
+    session_id = fields.get("session_id")
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        priority = parse_priority(fields.get("priority"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if "user_message" in payload and orch is not None and orch.crisis_matches([payload["user_message"]]):
+        priority = CRISIS_PRIORITY
+
+    try:
+        job = jobs.submit(payload, stages, session_id=session_id, priority=priority)
+    except JobRejected as e:
+        logger.warning(f"Job rejected: {e}")
+        response = jsonify({
+            "error": "Server is busy. Please try again shortly.",
+            "stage": e.stage,
+            "queue_depth": e.queue_depth,
+            "max_queue": e.max_queue
+        })
+        response.headers["Retry-After"] = "2"
+        return response, 503
+    return jsonify(dict(
+        job.snapshot(),
+        status_url=f"/jobs/{job.id}",
+        events_url=f"/jobs/{job.id}/events"
+    )), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.snapshot())
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Stream a job's stage results as Server-Sent Events: `queued`,
+    `transcript`, `content`, `audio`, then `done` (or `error`). Reconnects
+    resume after the `Last-Event-ID` header or the `after` query parameter.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        return jsonify({"error": "after must be an integer"}), 400
+
+    def generate():
+        index = after
+        while not (job.finished and index >= len(job.events)):
+            events = job.wait(index, timeout=15)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for index, event, data in events:
+                yield f"id: {index}\n" + sse_event(event, data)
+                if event in ("done", "error"):
+                    return
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/upload-audio', methods=['POST'])
 def upload_audio():
     if 'audio' not in request.files:
         return jsonify({'error': 'No audio file provided'}), 400
-    audio_file = request.files['audio']
-    # Always save as mp3
-    filename = 'user_audio.mp3'
-    save_path = os.path.join('audios', filename)
-    os.makedirs('audios', exist_ok=True)
-    audio_file.save(save_path)
+    with metrics.stage("upload"):
+        audio_file = request.files['audio']
+        save_path = save_user_audio(audio_file.read(), audio_file.filename)
     return jsonify({'audio_filepath': save_path})
 
 @app.route('/audios/<filename>', methods=['GET'])
 def serve_audio(filename):
-    return send_from_directory('audios', filename)
+    """
+    Serve audio with conditional and Range support. Content-addressed replies
+    get their hash as a strong ETag and are cacheable forever; other files
+    (uploads) must be revalidated and stay out of shared caches.
+    """
+    # Files are written relative to the working directory, not the app root.
+    audio_dir = os.path.abspath(audio_store.folder)
+    etag = content_etag(filename)
+    if etag is None:
+        response = send_from_directory(audio_dir, filename, max_age=0)
+        response.cache_control.private = True
+        return response
+    response = send_from_directory(audio_dir, filename, etag=etag, max_age=AUDIO_CACHE_MAX_AGE)
+    response.cache_control.immutable = True
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
 
 @app.errorhandler(404)
 def not_found(error):
@@ -261,19 +888,20 @@ def internal_error(error):
 if __name__ == "__main__":
     logger.info("Starting AI Therapist Flask Server...")
     logger.info("Initializing backend clients...")
+    # Returns immediately; models load in the background and GET /ready reports progress.
     initialize_clients()
-    if orch is None:
-        logger.warning("⚠️  Orchestrator not available - text responses may fail")
-    if sst_client is None:
-        logger.warning("⚠️  SpeechToText not available - audio transcription will fail")
-    if murf_client is None:
-        logger.warning("⚠️  MurfTTSClient not available - audio generation will fail")
     logger.info("Starting Flask server on http://localhost:5000")
     logger.info("Available endpoints:")
     logger.info("  GET  /        - Health check")
     logger.info("  GET  /health  - Detailed health check")
+    logger.info("  GET  /ready   - Readiness probe")
+    logger.info("  GET  /metrics - Prometheus metrics")
     logger.info("  POST /test    - Test endpoint")
     logger.info("  POST /chat    - Main chat endpoint")
+    logger.info("  POST /chat/stream - Streaming chat endpoint (SSE)")
+    logger.info("  POST /chat/voice-stream - Streaming voice endpoint (SSE)")
+    logger.info("  POST /voice-turn - Upload and answer a voice message in one request")
+    logger.info("  POST /jobs    - Submit a turn as a job (poll GET /jobs/<id>)")
     logger.info("  POST /upload-audio - Audio upload endpoint")
     logger.info("  GET  /audios/<filename> - Serve audio files")
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
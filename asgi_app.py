@@ -0,0 +1,1071 @@
+"""
+Asyncio serving mode for the AI Therapist API.
+
+Exposes the same endpoints as app.py on Quart/Hypercorn. Gemini and Murf are
+called without blocking the event loop, Whisper runs on a thread pool, and
+every pipeline stage is capped by its own semaphore so a burst of voice turns
+cannot starve text chats.
+
+Run with:
+    python asgi_app.py
+or
+    hypercorn asgi_app:app --bind 0.0.0.0:5001
+"""
+from quart import Quart, request, websocket, jsonify, send_from_directory, Response, g
+from quart_cors import cors
+from backend import metrics
+from backend.audio_store import AudioStore, content_etag
+from concurrent.futures import ThreadPoolExecutor
+from backend.latency import LatencyTracker
+from backend.readiness import Readiness, STARTING_STATES
+from backend.request_context import new_request_id
+from backend.logging_setup import configure_logging, logging_stats
+from backend.prefork import preloaded_speech_to_text, process_stats
+from backend.streaming_stt import StreamingSegmenter
+from backend.tts_pipeline import split_into_segments, synthesize_segments_async
+from backend.transcription_service import TranscriptionQueueFull
+from backend.jobs import CRISIS_PRIORITY, JobManager, JobRejected, parse_priority
+from backend.tts_profiles import PROFILES, ProfileStats, default_profile
+from backend.app_common import (
+    AUDIO_CACHE_MAX_AGE, CRISIS_FOLLOW_UP, FALLBACK_RESPONSE, PERSIST_USER_AUDIO,
+    REQUIRED_SUBSYSTEMS, crisis_template, has_audio, health_timestamp,
+    parse_session_id, prewarm_tts_cache, record_audio_turn, request_profile,
+    save_speech, save_user_audio, speech_settings,
+)
+import asyncio
+import json
+import os
+import time
+import warnings
+import traceback
+import logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+warnings.filterwarnings('ignore')
+
+app = Quart(__name__)
+app = cors(app)  # Enable CORS for frontend access
+
+@app.before_request
+async def start_request_metrics():
+    g.request_id = new_request_id(request.headers.get("X-Request-ID"))
+    g.request_started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+async def finish_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    response.headers["X-Request-ID"] = g.request_id
+    if "session_id" in g:
+        response.headers["X-Session-ID"] = g.session_id
+    metrics.REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+async def close_request_metrics(error=None):
+    if "request_started" in g:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+# Per-stage concurrency limits
+STT_CONCURRENCY = int(os.getenv("ASYNC_STT_CONCURRENCY", "2"))
+LLM_CONCURRENCY = int(os.getenv("ASYNC_LLM_CONCURRENCY", "64"))
+TTS_CONCURRENCY = int(os.getenv("ASYNC_TTS_CONCURRENCY", "32"))
+
+# Longest utterance accepted on the live transcription socket
+STREAM_STT_MAX_SECONDS = float(os.getenv("STREAM_STT_MAX_SECONDS", "120"))
+
+# Global variables for clients
+orch = None
+sst_client = None
+murf_client = None
+stt_executor = None
+stt_limit = None
+llm_limit = None
+tts_limit = None
+main_loop = None
+latency = LatencyTracker()
+audio_store = AudioStore("audios")
+tts_profiles = ProfileStats()
+readiness = Readiness(["orchestrator", "speech_to_text", "text_to_speech"])
+
+# The safety template synthesized per output profile (see crisis_audio).
+crisis_audio_filepaths = {}
+
+def llm_token_usage():
+    if orch is None:
+        return None
+    from backend.gemini_client import get_token_usage
+    return get_token_usage()
+
+def llm_cache_stats():
+    if orch is None:
+        return None
+    from backend.gemini_client import get_response_cache_stats
+    return get_response_cache_stats()
+
+def load_orchestrator():
+    global orch
+    logger.info("Initializing Orchestrator...")
+    from backend.orchastrator import Orchestrator
+    orch = Orchestrator()
+    readiness.mark("orchestrator", "warming")
+    try:
+        # Build the shared Gemini model (and its prompt cache) before the first request.
+        from backend.gemini_client import get_model
+        get_model()
+    except Exception as e:
+        logger.warning(f"⚠️  Gemini model warm-up failed, will retry on first request: {e}")
+
+def load_speech_to_text():
+    global sst_client
+    client = preloaded_speech_to_text()
+    if client is not None:
+        # Loaded once by the pre-fork master (serve.py) and shared copy-on-write.
+        logger.info("Using the SpeechToText loaded by the pre-fork master")
+    elif int(os.getenv("STT_WORKERS", "1")) > 0:
+        logger.info("Initializing TranscriptionService...")
+        from backend.transcription_service import TranscriptionService
+        client = TranscriptionService()
+    else:
+        logger.info("Initializing SpeechToText...")
+        from backend.speech_to_text import SpeechToText
+        client = SpeechToText()
+    readiness.mark("speech_to_text", "warming")
+    client.warm_up()
+    sst_client = client
+
+def load_text_to_speech():
+    global murf_client
+    logger.info("Initializing MurfTTSClient...")
+    from backend.text_to_speech import MurfTTSClient
+    client = MurfTTSClient()
+    if os.getenv("TTS_CACHE", "1") == "1":
+        from backend.tts_cache import CachedTTSClient
+        client = CachedTTSClient(client)
+    murf_client = client
+    try:
+        synthesize_crisis_audio()
+    except Exception as e:
+        logger.warning(f"⚠️  Crisis audio pre-synthesis failed, will retry on the first crisis turn: {e}")
+    if hasattr(client, "prewarm"):
+        prewarm_tts_cache(client)
+
+def initialize_clients(wait: bool = False):
+    """
+    Load every subsystem in its own background thread and return at once, so
+    the server can answer /health while Whisper and Gemini are still loading.
+    Pass wait=True to block until every subsystem is ready or failed.
+    """
+    readiness.run("orchestrator", load_orchestrator)
+    readiness.run("speech_to_text", load_speech_to_text)
+    readiness.run("text_to_speech", load_text_to_speech)
+    audio_store.start_janitor()
+    if wait:
+        readiness.wait()
+
+def stt_alive() -> bool:
+    return sst_client.is_alive() if hasattr(sst_client, "is_alive") else sst_client is not None
+
+def service_status(name: str) -> str:
+    state = readiness.state(name)
+    if state == "ready":
+        return "available"
+    return "starting" if state in STARTING_STATES else "unavailable"
+
+@app.before_serving
+async def startup():
+    global stt_executor, stt_limit, llm_limit, tts_limit, main_loop
+    main_loop = asyncio.get_running_loop()
+    stt_executor = ThreadPoolExecutor(max_workers=STT_CONCURRENCY, thread_name_prefix="whisper")
+    stt_limit = asyncio.Semaphore(STT_CONCURRENCY)
+    llm_limit = asyncio.Semaphore(LLM_CONCURRENCY)
+    tts_limit = asyncio.Semaphore(TTS_CONCURRENCY)
+    # Models load on background threads; GET /ready reports when they are done.
+    initialize_clients()
+    logger.info(
+        f"Stage limits: stt={STT_CONCURRENCY} llm={LLM_CONCURRENCY} tts={TTS_CONCURRENCY}"
+    )
+
+@app.after_serving
+async def shutdown():
+    jobs.stop()
+    if murf_client is not None:
+        await murf_client.aclose()
+    if stt_executor is not None:
+        stt_executor.shutdown(wait=False)
+    if hasattr(sst_client, "shutdown"):
+        sst_client.shutdown(wait=False)
+
+async def generate_ai_response(message, session_id: str = None) -> str:
+    if orch is None:
+        raise RuntimeError("Orchestrator not initialized. Check backend configuration.")
+    try:
+        if isinstance(message, str):
+            message = [message]
+        elif not isinstance(message, list):
+            raise ValueError("generate_ai_response: message must be str or list[str]")
+        with metrics.stage("llm"):
+            async with llm_limit:
+                result = await orch.start_session_async(message, session_id=session_id)
+        if not result or 'solution' not in result:
+            raise RuntimeError("Invalid response from Orchestrator")
+        return result['solution']
+    except Exception as e:
+        logger.error(f"AI response generation error: {e}")
+        raise
+
+async def transcribe_audio(filepath: str) -> str:
+    if sst_client is None:
+        raise RuntimeError("SpeechToText client not initialized. Check backend configuration.")
+    if not os.path.isfile(filepath):
+        raise FileNotFoundError(f"Audio file not found: {filepath}")
+    try:
+        with metrics.stage("transcription"):
+            if hasattr(sst_client, "submit"):
+                # The transcription service queues and bounds work itself.
+                return await asyncio.wrap_future(sst_client.submit(filepath))
+            async with stt_limit:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(stt_executor, sst_client.transcribe, filepath)
+    except Exception as e:
+        logger.error(f"Audio transcription error: {e}")
+        raise
+
+async def transcribe_audio_bytes(audio_bytes: bytes) -> str:
+    """
+    Transcribe encoded audio bytes, or a decoded 16 kHz float array such as
+    one segment from the live transcription socket.
+    """
+    if sst_client is None:
+        raise RuntimeError("SpeechToText client not initialized. Check backend configuration.")
+    try:
+        with metrics.stage("transcription"):
+            if hasattr(sst_client, "submit"):
+                return await asyncio.wrap_future(sst_client.submit(audio_bytes))
+            async with stt_limit:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(stt_executor, sst_client.transcribe, audio_bytes)
+    except Exception as e:
+        logger.error(f"Audio transcription error: {e}")
+        raise
+
+async def generate_audio_response(ai_message: str, profile=None) -> str:
+    if murf_client is None:
+        raise RuntimeError("MurfTTSClient not initialized. Check backend configuration.")
+    profile = profile or default_profile()
+    try:
+        with metrics.stage("tts"):
+            async with tts_limit:
+                resp = await murf_client.generate_speech_async(
+                    text=ai_message,
+                    **speech_settings(profile)
+                )
+        if has_audio(resp):
+            with metrics.stage("save_audio"):
+                return await asyncio.to_thread(save_speech, audio_store, murf_client, resp, profile)
+        else:
+            metrics.STAGE_ERRORS.inc(stage="tts")
+            raise RuntimeError("Speech generation failed or no audio returned.")
+    except Exception as e:
+        logger.error(f"Audio generation error: {e}")
+        raise
+
+def synthesize_crisis_audio() -> str:
+    """
+    Synthesize the safety template in the default profile on the loading
+    thread, before the event loop serves any crisis turn.
+    """
+    profile = default_profile()
+    resp = murf_client.generate_speech(text=crisis_template(orch), **speech_settings(profile))
+    if not has_audio(resp):
+        raise RuntimeError("Speech generation failed or no audio returned.")
+    path = crisis_audio_filepaths[profile.name] = save_speech(audio_store, murf_client, resp, profile)
+    return path
+
+async def crisis_audio(profile=None) -> str:
+    """
+    Audio of the safety template, synthesized again (normally from the
+    TTS cache, which is prewarmed for the other profiles) if missing or
+    removed by the audio janitor.
+    """
+    profile = profile or default_profile()
+    path = crisis_audio_filepaths.get(profile.name)
+    if path is None or not os.path.exists(path):
+        path = crisis_audio_filepaths[profile.name] = await generate_audio_response(crisis_template(orch), profile)
+    return path
+
+async def crisis_reply(message: str, session_id: str = None, audio: bool = False, profile=None):
+    """
+    The crisis fast path. If `message` trips the safety matcher, answer at
+    once with the safety template (and its pre-synthesized audio) instead
+    of waiting for llm_limit and Gemini. The turn is recorded before
+    replying; the follow-up reply runs as a job ahead of all queued work,
+    and the reply's `follow_up` says where to collect it (None without a
+    session_id, as there is no session to follow up in). Returns None for
+    other messages.
+    """
+    if orch is None or not orch.crisis_matches([message]):
+        return None
+    started = time.perf_counter()
+    reply = {"content": orch.crisis_template, "crisis": True, "follow_up": None}
+    if audio:
+        try:
+            reply["audio_filepath"] = await crisis_audio(profile)
+        except Exception as e:
+            # The text still goes out; it matters more than the voice.
+            logger.error(f"Crisis audio unavailable: {e}")
+            reply["audio_filepath"] = None
+    try:
+        # Recorded before replying, so a turn sent next lands after it.
+        await orch.record_crisis_turn_async([message], session_id)
+    except Exception as e:
+        logger.error(f"Could not record crisis turn for session {session_id}: {e}")
+    if CRISIS_FOLLOW_UP and session_id:
+        stages = ["llm", "tts"] if audio else ["llm"]
+        payload = {"crisis_follow_up": True}
+        if profile is not None:
+            payload["audio_profile"] = profile.name
+        try:
+            job = jobs.submit(payload, stages, session_id=session_id, priority=CRISIS_PRIORITY)
+            reply["follow_up"] = {"job_id": job.id, "events_url": f"/jobs/{job.id}/events"}
+        except Exception as e:
+            logger.error(f"Could not queue crisis follow-up for session {session_id}: {e}")
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    latency.record("crisis_path", elapsed_ms)
+    metrics.observe_stage("crisis_path", elapsed_ms / 1000)
+    logger.warning("Crisis turn answered on the fast path in %.1f ms (session %s)", elapsed_ms, session_id)
+    return reply
+
+def queue_full_response(error: TranscriptionQueueFull):
+    response = jsonify({
+        "error": "Server is busy transcribing other messages. Please try again shortly.",
+        "queue_depth": error.queue_depth,
+        "max_queue": error.max_queue
+    })
+    response.headers["Retry-After"] = "2"
+    return response, 503
+
+async def stream_audio_segments(ai_message: str, profile=None):
+    if murf_client is None:
+        raise RuntimeError("MurfTTSClient not initialized. Check backend configuration.")
+    profile = profile or default_profile()
+    segments = split_into_segments(ai_message)
+    index = 0
+    async with tts_limit:
+        async for resp in synthesize_segments_async(murf_client, segments, **speech_settings(profile)):
+            if not has_audio(resp):
+                metrics.STAGE_ERRORS.inc(stage="tts")
+                raise RuntimeError(f"Speech generation failed for segment {index}.")
+            with metrics.stage("save_audio"):
+                audio_filepath = await asyncio.to_thread(save_speech, audio_store, murf_client, resp, profile)
+            yield segments[index], audio_filepath
+            index += 1
+
+async def voice_turn_steps(transcribe, session_id: str = None, profile=None):
+    """
+    Run one voice turn and yield its (event, data) steps: `transcript`,
+    `content`, one `segment` per synthesized sentence, then `done`, or
+    `error`. `transcribe` is a zero-argument callable returning an awaitable
+    of the user's text.
+    """
+    started = time.perf_counter()
+    profile = profile or default_profile()
+    try:
+        transcribed_text = await transcribe()
+    except TranscriptionQueueFull as e:
+        logger.warning(f"Transcription rejected: {e}")
+        yield "error", {
+            "error": "Server is busy transcribing other messages. Please try again shortly.",
+            "queue_depth": e.queue_depth,
+            "max_queue": e.max_queue
+        }
+        return
+    except Exception as e:
+        logger.error(f"Audio transcription failed: {e}")
+        yield "error", {"error": "Audio transcription failed: " + str(e)}
+        return
+    yield "transcript", {"transcribed_text": transcribed_text}
+
+    crisis = await crisis_reply(transcribed_text, session_id=session_id, audio=True, profile=profile)
+    if crisis is not None:
+        audio_filepath = crisis.pop("audio_filepath")
+        yield "content", crisis
+        if audio_filepath:
+            yield "segment", {"index": 0, "text": crisis["content"], "audio_filepath": audio_filepath}
+        yield "done", {
+            "audio_filepaths": [audio_filepath] if audio_filepath else [],
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        return
+
+    try:
+        ai_response = await generate_ai_response(transcribed_text, session_id=session_id)
+    except Exception as e:
+        logger.error(f"AI response generation failed: {e}")
+        yield "error", {"error": "AI response generation failed: " + str(e)}
+        return
+    yield "content", {"content": ai_response}
+
+    first_audio_ms = None
+    audio_filepaths = []
+    try:
+        index = 0
+        async for segment, audio_filepath in stream_audio_segments(ai_response, profile):
+            if first_audio_ms is None:
+                first_audio_ms = (time.perf_counter() - started) * 1000
+                latency.record("voice_stream_first_audio", first_audio_ms)
+                metrics.observe_stage("voice_first_audio", first_audio_ms / 1000)
+            audio_filepaths.append(audio_filepath)
+            yield "segment", {"index": index, "text": segment, "audio_filepath": audio_filepath}
+            index += 1
+    except Exception as e:
+        logger.error(f"Audio generation failed: {e}")
+        yield "error", {"error": "Audio generation failed: " + str(e)}
+        return
+
+    total_ms = (time.perf_counter() - started) * 1000
+    latency.record("voice_stream_total", total_ms)
+    if audio_filepaths:
+        tts_profiles.record(profile, audio_filepaths, first_audio_ms)
+    yield "done", {
+        "audio_filepaths": audio_filepaths,
+        "audio_profile": profile.name,
+        "time_to_first_audio_ms": first_audio_ms and round(first_audio_ms, 1),
+        "total_ms": round(total_ms, 1)
+    }
+
+async def voice_turn_events(transcribe, session_id: str = None, profile=None):
+    """
+    voice_turn_steps as Server-Sent Events.
+    """
+    async for event, data in voice_turn_steps(transcribe, session_id, profile):
+        yield sse_event(event, data)
+
+def run_on_loop(coro):
+    """
+    Run `coro` on the server's event loop from a job worker thread and
+    wait for its result, so jobs share the stage semaphores with requests.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, main_loop).result()
+
+def run_stt_job(job) -> dict:
+    transcribed_text = run_on_loop(transcribe_audio_bytes(job.payload.pop("audio")))
+    if orch is not None and orch.crisis_matches([transcribed_text]):
+        # Jump ahead of everything still waiting for the LLM and TTS.
+        job.priority = CRISIS_PRIORITY
+    return {"transcribed_text": transcribed_text}
+
+def run_llm_job(job) -> dict:
+    if job.payload.get("crisis_follow_up"):
+        # Submitted by crisis_reply, which has already recorded the turn.
+        # Not under llm_limit, so it never waits behind ordinary turns.
+        return {"content": run_on_loop(orch.crisis_follow_up_async(job.session_id))}
+    message = job.result.get("transcribed_text") or job.payload["user_message"]
+    crisis = run_on_loop(crisis_reply(message, session_id=job.session_id))
+    if crisis is not None:
+        return crisis
+    return {"content": run_on_loop(generate_ai_response(message, session_id=job.session_id))}
+
+def run_tts_job(job) -> dict:
+    profile = PROFILES.get(job.payload.get("audio_profile")) or default_profile()
+    if job.result.get("crisis"):
+        return {"audio_filepath": run_on_loop(crisis_audio(profile))}
+    if not job.result.get("content"):
+        return {"audio_filepath": None}
+    audio_filepath = run_on_loop(generate_audio_response(job.result["content"], profile))
+    tts_profiles.record(profile, [audio_filepath], (time.time() - job.created) * 1000)
+    return {"audio_filepath": audio_filepath, "audio_profile": profile.name}
+
+# Turns submitted to POST /jobs run on these per-stage worker queues.
+jobs = JobManager({"stt": run_stt_job, "llm": run_llm_job, "tts": run_tts_job})
+
+def event_stream_response(events) -> Response:
+    response = Response(events, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    return response
+
+@app.route("/", methods=["GET"])
+async def health_check():
+    return jsonify({
+        "status": "server is running",
+        "message": "AI Therapist API is operational",
+        "version": "1.0.0",
+        "services": {
+            "orchestrator": readiness.is_ready("orchestrator"),
+            "speech_to_text": readiness.is_ready("speech_to_text"),
+            "text_to_speech": readiness.is_ready("text_to_speech")
+        }
+    }), 200
+
+@app.before_request
+async def require_ready_subsystems():
+    required = REQUIRED_SUBSYSTEMS.get(request.endpoint, [])
+    if request.endpoint == "chat_endpoint":
+        data = await request.get_json(silent=True)
+        if isinstance(data, dict) and data.get("dtype") == "audio":
+            required = REQUIRED_SUBSYSTEMS["voice_turn_endpoint"]
+    elif request.endpoint == "create_job" and await request.files:
+        required = REQUIRED_SUBSYSTEMS["voice_turn_endpoint"]
+    starting = readiness.starting(required)
+    if starting:
+        response = jsonify({
+            "error": "Server is still starting up. Please try again shortly.",
+            "starting": starting
+        })
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+@app.route("/health", methods=["GET"])
+async def health():
+    subsystems = readiness.snapshot({"speech_to_text": stt_alive})
+    return jsonify({
+        "status": "healthy",
+        "timestamp": health_timestamp(),
+        "services": {
+            "orchestrator": service_status("orchestrator"),
+            "speech_to_text": service_status("speech_to_text"),
+            "text_to_speech": service_status("text_to_speech")
+        },
+        "live": True,
+        "ready": all(entry["ready"] for entry in subsystems.values()),
+        "subsystems": subsystems,
+        "sessions": orch.sessions.stats() if orch is not None else None,
+        "session_store": orch.store_stats() if orch is not None else None,
+        "history_compaction": orch.compaction_stats() if orch is not None else None,
+        "process": process_stats(),
+        "transcription": sst_client.stats() if hasattr(sst_client, "stats") else None,
+        "tts_cache": murf_client.stats() if hasattr(murf_client, "stats") else None,
+        "tts_transport": murf_client.transport_stats() if murf_client is not None else None,
+        "llm_tokens": llm_token_usage(),
+        "llm_cache": llm_cache_stats(),
+        "logging": logging_stats(),
+        "audio_store": audio_store.stats(),
+        "tts_profiles": tts_profiles.summary(),
+        "jobs": jobs.stats(),
+        "latency": latency.summary(),
+        "stage_limits": {
+            "speech_to_text": STT_CONCURRENCY,
+            "llm": LLM_CONCURRENCY,
+            "text_to_speech": TTS_CONCURRENCY
+        }
+    }), 200
+
+@app.route("/ready", methods=["GET"])
+async def ready():
+    """
+    Readiness probe for load balancers: 200 once every subsystem can serve
+    requests, 503 while any is still loading or has failed.
+    """
+    subsystems = readiness.snapshot({"speech_to_text": stt_alive})
+    is_ready = all(entry["ready"] for entry in subsystems.values())
+    return jsonify({"ready": is_ready, "subsystems": subsystems}), 200 if is_ready else 503
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_endpoint():
+    """
+    Prometheus text exposition of stage latencies, errors, fallbacks and in-flight gauges.
+    """
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route("/test", methods=["POST"])
+async def test_endpoint():
+    try:
+        logger.info("Test endpoint called")
+        data = await request.get_json()
+        logger.debug("Received data: %s", data)
+        return jsonify({
+            "received": data,
+            "message": "Test endpoint working perfectly",
+            "type": "test",
+            "status": "success"
+        }), 200
+    except Exception as e:
+        logger.error(f"Test endpoint error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/chat", methods=["POST"])
+async def chat_endpoint():
+    logger.info("=== CHAT ENDPOINT CALLED ===")
+    try:
+        data = await request.get_json(silent=True)
+        if not data:
+            logger.error("Missing JSON body")
+            return jsonify({"error": "Missing JSON body"}), 400
+
+        user_message = data.get("user_message")
+        dtype = data.get("dtype")
+        session_id = data.get("session_id")
+
+        if dtype not in ("audio", "message"):
+            logger.error(f"Invalid dtype: {dtype}")
+            return jsonify({"error": "Invalid dtype, must be 'audio' or 'message'"}), 400
+        if not user_message or not isinstance(user_message, str) or not user_message.strip():
+            logger.error("Missing or empty user_message")
+            return jsonify({"error": "Missing or empty user_message"}), 400
+        try:
+            g.session_id = session_id = parse_session_id(session_id)
+        except ValueError as e:
+            logger.error("Invalid session_id")
+            return jsonify({"error": str(e)}), 400
+
+        if dtype == "audio":
+            try:
+                transcribed_text = await transcribe_audio(user_message)
+            except FileNotFoundError as e:
+                logger.error(f"Audio file not found: {e}")
+                return jsonify({"error": str(e)}), 400
+            except TranscriptionQueueFull as e:
+                logger.warning(f"Transcription rejected: {e}")
+                return queue_full_response(e)
+            except Exception as e:
+                logger.error(f"Audio transcription failed: {e}")
+                return jsonify({"error": "Audio transcription failed: " + str(e)}), 500
+
+            profile = request_profile(request.args, request.headers)
+            crisis = await crisis_reply(transcribed_text, session_id=session_id, audio=True, profile=profile)
+            if crisis is not None:
+                return jsonify(dict(crisis, transcribed_text=transcribed_text, type="audio"))
+
+            try:
+                ai_response = await generate_ai_response(transcribed_text, session_id=session_id)
+            except Exception as e:
+                logger.error(f"AI response generation failed: {e}")
+                return jsonify({"error": "AI response generation failed: " + str(e)}), 500
+
+            try:
+                audio_filepath = await generate_audio_response(ai_response, profile)
+                record_audio_turn(tts_profiles, profile, [audio_filepath], g.request_started)
+            except Exception as e:
+                logger.error(f"Audio generation failed: {e}")
+                return jsonify({"error": "Audio generation failed: " + str(e)}), 500
+
+            return jsonify({
+                "content": ai_response,
+                "audio_filepath": audio_filepath,
+                "audio_profile": profile.name,
+                "transcribed_text": transcribed_text,
+                "type": "audio"
+            })
+
+        elif dtype == "message":
+            crisis = await crisis_reply(user_message, session_id=session_id)
+            if crisis is not None:
+                return jsonify(dict(crisis, type="message"))
+            try:
+                ai_response = await generate_ai_response(user_message, session_id=session_id)
+                return jsonify({
+                    "content": ai_response,
+                    "type": "message"
+                })
+            except Exception as e:
+                logger.error(f"AI response generation failed: {e}")
+                metrics.FALLBACKS.inc(endpoint="chat")
+                logger.info("Returning fallback response")
+                return jsonify({
+                    "content": FALLBACK_RESPONSE,
+                    "type": "message"
+                })
+
+    except Exception as e:
+        logger.error(f"Server error: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return jsonify({"error": "Server error: " + str(e)}), 500
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/chat/stream", methods=["POST"])
+async def chat_stream_endpoint():
+    logger.info("=== CHAT STREAM ENDPOINT CALLED ===")
+    data = await request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Missing JSON body"}), 400
+
+    user_message = data.get("user_message")
+    session_id = data.get("session_id")
+    if not user_message or not isinstance(user_message, str) or not user_message.strip():
+        return jsonify({"error": "Missing or empty user_message"}), 400
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if orch is None:
+        return jsonify({"error": "Orchestrator not initialized. Check backend configuration."}), 503
+
+    async def generate():
+        crisis = await crisis_reply(user_message, session_id=session_id)
+        if crisis is not None:
+            yield sse_event("token", {"text": crisis["content"]})
+            yield sse_event("done", crisis)
+            return
+        started = time.perf_counter()
+        ttft_ms = None
+        parts = []
+        try:
+            with metrics.stage("llm"):
+                async with llm_limit:
+                    async for chunk in orch.stream_session_async([user_message], session_id=session_id):
+                        if ttft_ms is None:
+                            ttft_ms = (time.perf_counter() - started) * 1000
+                            latency.record("chat_stream_ttft", ttft_ms)
+                            metrics.observe_stage("llm_first_token", ttft_ms / 1000)
+                        parts.append(chunk)
+                        yield sse_event("token", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Streaming AI response failed: {e}")
+            if not parts:
+                metrics.FALLBACKS.inc(endpoint="chat_stream")
+                yield sse_event("done", {"content": FALLBACK_RESPONSE, "fallback": True})
+            else:
+                yield sse_event("error", {"error": "AI response generation failed: " + str(e)})
+            return
+        total_ms = (time.perf_counter() - started) * 1000
+        latency.record("chat_stream_total", total_ms)
+        yield sse_event("done", {
+            "content": "".join(parts),
+            "ttft_ms": ttft_ms and round(ttft_ms, 1),
+            "total_ms": round(total_ms, 1)
+        })
+
+    return event_stream_response(generate())
+
+@app.route("/chat/voice-stream", methods=["POST"])
+async def chat_voice_stream_endpoint():
+    logger.info("=== CHAT VOICE STREAM ENDPOINT CALLED ===")
+    data = await request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Missing JSON body"}), 400
+
+    user_message = data.get("user_message")
+    session_id = data.get("session_id")
+    if not user_message or not isinstance(user_message, str) or not user_message.strip():
+        return jsonify({"error": "Missing or empty user_message"}), 400
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return event_stream_response(voice_turn_events(lambda: transcribe_audio(user_message), session_id, request_profile(request.args, request.headers)))
+
+@app.route("/voice-turn", methods=["POST"])
+async def voice_turn_endpoint():
+    logger.info("=== VOICE TURN ENDPOINT CALLED ===")
+    with metrics.stage("upload"):
+        files = await request.files
+        form = await request.form
+    if 'audio' not in files:
+        return jsonify({'error': 'No audio file provided'}), 400
+    audio_bytes = files['audio'].read()
+    if not audio_bytes:
+        return jsonify({'error': 'Empty audio file'}), 400
+    session_id = form.get("session_id")
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if PERSIST_USER_AUDIO:
+        await asyncio.to_thread(save_user_audio, audio_bytes, files['audio'].filename)
+    profile = request_profile(request.args, request.headers)
+
+    if form.get("stream") == "1":
+        return event_stream_response(voice_turn_events(lambda: transcribe_audio_bytes(audio_bytes), session_id, profile))
+
+    try:
+        transcribed_text = await transcribe_audio_bytes(audio_bytes)
+    except TranscriptionQueueFull as e:
+        logger.warning(f"Transcription rejected: {e}")
+        return queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Audio transcription failed: {e}")
+        return jsonify({"error": "Audio transcription failed: " + str(e)}), 500
+
+    crisis = await crisis_reply(transcribed_text, session_id=session_id, audio=True, profile=profile)
+    if crisis is not None:
+        return jsonify(dict(crisis, transcribed_text=transcribed_text, type="audio"))
+
+    try:
+        ai_response = await generate_ai_response(transcribed_text, session_id=session_id)
+    except Exception as e:
+        logger.error(f"AI response generation failed: {e}")
+        return jsonify({"error": "AI response generation failed: " + str(e)}), 500
+
+    try:
+        audio_filepath = await generate_audio_response(ai_response, profile)
+        record_audio_turn(tts_profiles, profile, [audio_filepath], g.request_started)
+    except Exception as e:
+        logger.error(f"Audio generation failed: {e}")
+        return jsonify({"error": "Audio generation failed: " + str(e)}), 500
+
+    return jsonify({
+        "content": ai_response,
+        "audio_filepath": audio_filepath,
+        "audio_profile": profile.name,
+        "transcribed_text": transcribed_text,
+        "type": "audio"
+    })
+
+@app.route("/jobs", methods=["POST"])
+async def create_job():
+    """
+    Submit a turn as a job and answer 202 with its id at once. A multipart
+    upload with an `audio` file runs transcription, LLM and TTS; a JSON
+    body with `user_message` starts at the LLM. `reply_audio` "0" skips
+    TTS and `priority` is high, normal or low; turns that trip the safety
+    matcher always run first. Results are read from GET /jobs/<id> or
+    streamed from GET /jobs/<id>/events.
+    """
+    with metrics.stage("upload"):
+        files = await request.files
+    if files:
+        if 'audio' not in files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        audio_bytes = files['audio'].read()
+        if not audio_bytes:
+            return jsonify({'error': 'Empty audio file'}), 400
+        fields = await request.form
+        payload = {"audio": audio_bytes}
+        stages = ["stt", "llm", "tts"]
+    else:
+        fields = await request.get_json(silent=True) or {}
+        user_message = fields.get("user_message")
+        if not isinstance(user_message, str) or not user_message.strip():
+            return jsonify({"error": "user_message is required"}), 400
+        payload = {"user_message": user_message.strip()}
+        stages = ["llm", "tts"]
+    if str(fields.get("reply_audio", "1")) == "0":
+        stages = stages[:-1]
+    else:
+        payload["audio_profile"] = request_profile(request.args, request.headers).name
+    session_id = fields.get("session_id")
+    try:
+        g.session_id = session_id = parse_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        priority = parse_priority(fields.get("priority"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if "user_message" in payload and orch is not None and orch.crisis_matches([payload["user_message"]]):
+        priority = CRISIS_PRIORITY
+
+    try:
+        job = jobs.submit(payload, stages, session_id=session_id, priority=priority)
+    except JobRejected as e:
+        logger.warning(f"Job rejected: {e}")
+        response = jsonify({
+            "error": "Server is busy. Please try again shortly.",
+            "stage": e.stage,
+            "queue_depth": e.queue_depth,
+            "max_queue": e.max_queue
+        })
+        response.headers["Retry-After"] = "2"
+        return response, 503
+    return jsonify(dict(
+        job.snapshot(),
+        status_url=f"/jobs/{job.id}",
+        events_url=f"/jobs/{job.id}/events"
+    )), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+async def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.snapshot())
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+async def job_events(job_id):
+    """
+    Stream a job's stage results as Server-Sent Events: `queued`,
+    `transcript`, `content`, `audio`, then `done` (or `error`). Reconnects
+    resume after the `Last-Event-ID` header or the `after` query parameter.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        return jsonify({"error": "after must be an integer"}), 400
+
+    async def generate():
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def listener():
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # loop closed; the server is shutting down
+
+        job.add_listener(listener)
+        try:
+            index = after
+            while not (job.finished and index >= len(job.events)):
+                changed.clear()
+                events = job.events_after(index)
+                if not events:
+                    try:
+                        await asyncio.wait_for(changed.wait(), 15)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                    continue
+                for index, event, data in events:
+                    yield f"id: {index}\n" + sse_event(event, data)
+                    if event in ("done", "error"):
+                        return
+        finally:
+            job.remove_listener(listener)
+
+    return event_stream_response(generate())
+
+@app.websocket("/ws/voice")
+async def voice_socket():
+    """
+    Live voice turn. The client streams 16 kHz mono 16-bit PCM as binary
+    messages while the user speaks; each pause completes a segment, which is
+    transcribed at once and answered with a `partial` message. On
+    {"type": "stop"} only the unfinished last segment is left to decode;
+    the turn then continues with the /chat/voice-stream events as JSON
+    messages ({"type": "transcript", ...}, content, segment, done).
+    Pass ?respond=0 to stop after the transcript, and ?audio_formats= or
+    ?audio_profile= to choose the reply's output profile.
+    """
+    new_request_id(websocket.headers.get("X-Request-ID"))
+    logger.info("=== VOICE SOCKET OPENED ===")
+    starting = readiness.starting(REQUIRED_SUBSYSTEMS["voice_turn_endpoint"])
+    if starting:
+        await websocket.send_json({
+            "type": "error",
+            "error": "Server is still starting up. Please try again shortly.",
+            "starting": starting
+        })
+        return
+    session_id = websocket.args.get("session_id")
+    try:
+        session_id = parse_session_id(session_id)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        return
+    respond = websocket.args.get("respond", "1") != "0"
+    profile = request_profile(websocket.args, websocket.headers)
+
+    segmenter = StreamingSegmenter()
+    segments = asyncio.Queue()
+    texts = []
+
+    async def transcribe_segments():
+        # One segment at a time, so partials arrive in order.
+        while True:
+            samples = await segments.get()
+            if samples is None:
+                return
+            text = (await transcribe_audio_bytes(samples)).strip()
+            if text:
+                texts.append(text)
+                await websocket.send_json({
+                    "type": "partial",
+                    "index": len(texts) - 1,
+                    "text": text,
+                    "transcript": " ".join(texts)
+                })
+
+    worker = asyncio.ensure_future(transcribe_segments())
+    try:
+        while not worker.done():
+            message = await websocket.receive()
+            if isinstance(message, bytes):
+                for samples in segmenter.feed(message):
+                    segments.put_nowait(samples)
+                if segmenter.received_seconds >= STREAM_STT_MAX_SECONDS:
+                    break
+            else:
+                try:
+                    control = json.loads(message)
+                except ValueError:
+                    control = None
+                if isinstance(control, dict) and control.get("type") == "stop":
+                    break
+
+        stopped = time.perf_counter()
+        tail = segmenter.flush()
+        if tail is not None:
+            segments.put_nowait(tail)
+        segments.put_nowait(None)
+
+        async def finish_transcript():
+            await worker  # re-raises a failed segment
+            tail_ms = (time.perf_counter() - stopped) * 1000
+            latency.record("stream_stt_tail", tail_ms)
+            metrics.observe_stage("stream_stt_tail", tail_ms / 1000)
+            if not texts:
+                raise ValueError("No speech detected.")
+            return " ".join(texts)
+
+        async for event, data in voice_turn_steps(finish_transcript, session_id, profile):
+            await websocket.send_json({"type": event, **data})
+            if event == "transcript" and not respond:
+                break
+    finally:
+        worker.cancel()
+
+@app.route('/upload-audio', methods=['POST'])
+async def upload_audio():
+    with metrics.stage("upload"):
+        files = await request.files
+        if 'audio' not in files:
+            return jsonify({'error': 'No audio file provided'}), 400
+        audio_file = files['audio']
+        save_path = await asyncio.to_thread(save_user_audio, audio_file.read(), audio_file.filename)
+    return jsonify({'audio_filepath': save_path})
+
+@app.route('/audios/<filename>', methods=['GET'])
+async def serve_audio(filename):
+    """
+    Same caching rules as app.py: content-addressed replies are immutable with
+    their hash as a strong ETag, uploads are private and revalidated. Range
+    requests are answered with 206.
+    """
+    # Files are written relative to the working directory, not the app root.
+    audio_dir = os.path.abspath(audio_store.folder)
+    etag = content_etag(filename)
+    if etag is None:
+        response = await send_from_directory(audio_dir, filename, cache_timeout=0)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    response = await send_from_directory(
+        audio_dir, filename, add_etags=False, conditional=False, cache_timeout=AUDIO_CACHE_MAX_AGE
+    )
+    response.set_etag(etag)
+    response.cache_control.immutable = True
+    response.headers["Accept-Ranges"] = "bytes"
+    return await response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+
+@app.errorhandler(404)
+async def not_found(error):
+    return jsonify({"error": "Endpoint not found"}), 404
+
+@app.errorhandler(405)
+async def method_not_allowed(error):
+    return jsonify({"error": "Method not allowed"}), 405
+
+@app.errorhandler(500)
+async def internal_error(error):
+    return jsonify({"error": "Internal server error"}), 500
+
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [os.getenv("BIND", "0.0.0.0:5001")]
+    logger.info(f"Starting AI Therapist async server on {config.bind[0]}")
+    asyncio.run(serve(app, config))
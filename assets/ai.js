@@ -3,7 +3,11 @@ const BACKEND_CONFIG = {
     BASE_URL: 'http://localhost:5001',
     ENDPOINTS: {
         CHAT: '/chat',
+        CHAT_STREAM: '/chat/stream',
         VOICE_CHAT: '/chat',
+        VOICE_CHAT_STREAM: '/chat/voice-stream',
+        VOICE_TURN: '/voice-turn',
+        VOICE_SOCKET: '/ws/voice',
         HEALTH_CHECK: '/health',
         UPLOAD_AUDIO: '/upload-audio'
     }
@@ -11,6 +15,217 @@ const BACKEND_CONFIG = {
 
 let currentMode = 'landing';
 
+// Audio formats this browser can play, sent as X-Audio-Formats so the server
+// picks the smallest reply format we support; on Data Saver ask for mp3-8k.
+const AUDIO_TYPES = { '.mp3': 'audio/mpeg', '.ogg': 'audio/ogg', '.wav': 'audio/wav' };
+const audioPreferences = (() => {
+    const probe = typeof Audio !== 'undefined' ? new Audio() : null;
+    const formats = ['audio/ogg; codecs=opus', 'audio/mpeg']
+        .filter(type => probe && probe.canPlayType(type) !== '')
+        .map(type => type.split(';')[0]);
+    const saveData = typeof navigator !== 'undefined' && navigator.connection && navigator.connection.saveData;
+    return { formats: formats.join(','), profile: saveData ? 'mp3-8k' : '' };
+})();
+
+function audioHeaders(headers = {}) {
+    if (audioPreferences.formats) headers['X-Audio-Formats'] = audioPreferences.formats;
+    if (audioPreferences.profile) headers['X-Audio-Profile'] = audioPreferences.profile;
+    return headers;
+}
+
+function audioQuery() {
+    const params = new URLSearchParams();
+    if (audioPreferences.formats) params.set('audio_formats', audioPreferences.formats);
+    if (audioPreferences.profile) params.set('audio_profile', audioPreferences.profile);
+    const query = params.toString();
+    return query ? `&${query}` : '';
+}
+
+function audioType(url) {
+    const match = /\.[a-z0-9]+$/i.exec(url.split('?')[0]);
+    return (match && AUDIO_TYPES[match[0].toLowerCase()]) || 'audio/mpeg';
+}
+
+// Read a Server-Sent Events response body, calling onEvent(type, data) per event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let type = 'message';
+            const dataLines = [];
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event:')) type = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            });
+            let data = {};
+            try {
+                data = dataLines.length ? JSON.parse(dataLines.join('\n')) : {};
+            } catch (e) {
+                console.error('Malformed stream event:', raw);
+            }
+            await onEvent(type, data);
+        }
+    }
+}
+
+// A crisis turn is answered with the safety resources at once; the coach's own
+// reply follows as a job. Wait for it and hand it to onReply({content, audio_filepath}).
+async function readFollowUp(followUp, onReply) {
+    if (!followUp || !followUp.events_url) return;
+    try {
+        const response = await fetch(`${BACKEND_CONFIG.BASE_URL}${followUp.events_url}`, {
+            headers: { 'Accept': 'text/event-stream' }
+        });
+        if (!response.ok || !response.body) return;
+        await readEventStream(response, async (type, data) => {
+            if (type === 'done' && data.content) await onReply(data);
+        });
+    } catch (error) {
+        console.warn('Follow-up reply unavailable:', error);
+    }
+}
+
+// AudioWorklet that hands raw microphone samples to the main thread
+const PCM_CAPTURE_WORKLET = `
+class PcmCapture extends AudioWorkletProcessor {
+    process(inputs) {
+        const channel = inputs[0] && inputs[0][0];
+        if (channel) this.port.postMessage(channel.slice(0));
+        return true;
+    }
+}
+registerProcessor('pcm-capture', PcmCapture);
+`;
+const LIVE_SAMPLE_RATE = 16000;
+const LIVE_SEND_SAMPLES = 1600; // 100 ms per WebSocket message
+
+// Streams the microphone to the voice socket as 16 kHz 16-bit PCM while the
+// user speaks. The server transcribes at every pause, so on stop only the
+// last few words are left to decode. Events arrive as onEvent(type, data).
+class LiveTranscriber {
+    constructor(audioContext, stream, sessionId, onEvent) {
+        this.audioContext = audioContext;
+        this.stream = stream;
+        this.onEvent = onEvent;
+        this.url = `${BACKEND_CONFIG.BASE_URL.replace(/^http/, 'ws')}${BACKEND_CONFIG.ENDPOINTS.VOICE_SOCKET}?session_id=${encodeURIComponent(sessionId)}${audioQuery()}`;
+        this.socket = null;
+        this.node = null;
+        this.source = null;
+        this.pending = new Int16Array(LIVE_SEND_SAMPLES);
+        this.pendingLength = 0;
+        this.sum = 0;
+        this.count = 0;
+        this.position = 0;
+        this.finished = new Promise((resolve, reject) => {
+            this.resolveFinished = resolve;
+            this.rejectFinished = reject;
+        });
+        this.finished.catch(() => {});
+        this.ready = this.open();
+        this.ready.catch(() => {});
+    }
+
+    async open() {
+        const socket = new WebSocket(this.url);
+        socket.binaryType = 'arraybuffer';
+        await new Promise((resolve, reject) => {
+            const timer = setTimeout(() => reject(new Error('Voice socket timed out')), 2000);
+            socket.onopen = () => { clearTimeout(timer); resolve(); };
+            socket.onerror = () => { clearTimeout(timer); reject(new Error('Voice socket unavailable')); };
+        });
+        socket.onmessage = async (message) => {
+            let data;
+            try {
+                data = JSON.parse(message.data);
+            } catch (e) {
+                console.error('Malformed voice socket message:', message.data);
+                return;
+            }
+            try {
+                await this.onEvent(data.type, data);
+                if (data.type === 'done') this.resolveFinished();
+            } catch (error) {
+                this.rejectFinished(error);
+            }
+        };
+        socket.onclose = () => this.rejectFinished(new Error('Voice socket closed'));
+        this.socket = socket;
+
+        if (!LiveTranscriber.worklets.has(this.audioContext)) {
+            const url = URL.createObjectURL(new Blob([PCM_CAPTURE_WORKLET], { type: 'application/javascript' }));
+            LiveTranscriber.worklets.set(this.audioContext, this.audioContext.audioWorklet.addModule(url));
+        }
+        await LiveTranscriber.worklets.get(this.audioContext);
+        this.source = this.audioContext.createMediaStreamSource(this.stream);
+        this.node = new AudioWorkletNode(this.audioContext, 'pcm-capture', { numberOfOutputs: 0 });
+        this.node.port.onmessage = (event) => this.appendSamples(event.data);
+        this.source.connect(this.node);
+    }
+
+    // Average down to 16 kHz and send in 100 ms chunks
+    appendSamples(samples) {
+        const ratio = this.audioContext.sampleRate / LIVE_SAMPLE_RATE;
+        for (let i = 0; i < samples.length; i++) {
+            this.sum += samples[i];
+            this.count++;
+            this.position++;
+            if (this.position < ratio) continue;
+            this.position -= ratio;
+            const value = Math.max(-1, Math.min(1, this.sum / this.count));
+            this.pending[this.pendingLength++] = value * 0x7fff;
+            this.sum = 0;
+            this.count = 0;
+            if (this.pendingLength === LIVE_SEND_SAMPLES) this.flushSamples();
+        }
+    }
+
+    flushSamples() {
+        if (this.pendingLength && this.socket && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(this.pending.slice(0, this.pendingLength).buffer);
+        }
+        this.pendingLength = 0;
+    }
+
+    // Resolves once the whole turn has been answered ('done')
+    async stop() {
+        await this.ready;
+        this.detach();
+        this.flushSamples();
+        if (this.socket.readyState !== WebSocket.OPEN) throw new Error('Voice socket closed');
+        this.socket.send(JSON.stringify({ type: 'stop' }));
+        try {
+            await this.finished;
+        } finally {
+            this.socket.onclose = null;
+            this.socket.close();
+        }
+    }
+
+    detach() {
+        if (this.source) this.source.disconnect();
+        if (this.node) this.node.port.onmessage = null;
+        this.source = null;
+        this.node = null;
+    }
+
+    cancel() {
+        this.detach();
+        if (this.socket) {
+            this.socket.onclose = null;
+            this.socket.close();
+        }
+    }
+}
+LiveTranscriber.worklets = new WeakMap();
+
 // Improved chat bubble styles injected once
 (function injectChatBubbleStyles() {
     const style = document.createElement('style');
@@ -70,10 +285,245 @@ function goToLanding() {
     document.getElementById('landingPage').classList.add('active');
 }
 
+// Conversations used to live in one localStorage key, rewritten whole on every save
+const LEGACY_STORAGE_KEY = 'therapyConversations';
+const HISTORY_PAGE_SIZE = 50;     // messages read from storage per page
+const HISTORY_RENDER_CHUNK = 25;  // messages added to the DOM per scroll step
+const HISTORY_MAX_RENDERED = 150; // stored messages kept in the DOM at once
+const HISTORY_EDGE_PX = 300;      // how close to an edge before more is rendered
+
+// Stores conversations in IndexedDB, one record per message, indexed by session
+// and time. Messages added in the same tick are written in one transaction; the
+// database does the I/O off the main thread and nothing re-serializes the whole
+// history. Falls back to memory when IndexedDB is unavailable.
+class ConversationStore {
+    constructor(name = 'therapyConversations') {
+        this.name = name;
+        this.db = null;
+        this.memory = null;
+        this.pending = [];
+        this.written = Promise.resolve();
+        this.ready = this.open();
+    }
+    async open() {
+        try {
+            this.db = await new Promise((resolve, reject) => {
+                const request = indexedDB.open(this.name, 1);
+                request.onupgradeneeded = () => {
+                    const messages = request.result.createObjectStore('messages', { keyPath: 'id' });
+                    messages.createIndex('session_time', ['session', 'timestamp', 'id']);
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        } catch (error) {
+            console.warn('IndexedDB unavailable, conversations will not be kept:', error);
+        }
+        await this.migrate();
+    }
+    // One-time move of the old localStorage array into IndexedDB
+    async migrate() {
+        const raw = localStorage.getItem(LEGACY_STORAGE_KEY);
+        if (raw === null) {
+            if (!this.db) this.memory = [];
+            return;
+        }
+        let messages = [];
+        try {
+            messages = JSON.parse(raw);
+        } catch (error) {
+            console.error('Unreadable saved conversations, not migrating:', error);
+        }
+        messages = Array.isArray(messages) ? messages.filter(msg => msg && msg.id != null && msg.session) : [];
+        if (!this.db) {
+            // Keep the old data where it is until IndexedDB works
+            this.memory = messages;
+            return;
+        }
+        await this.write(messages);
+        localStorage.removeItem(LEGACY_STORAGE_KEY);
+        console.info(`Moved ${messages.length} saved messages to IndexedDB`);
+    }
+    write(messages) {
+        if (!messages.length) return Promise.resolve();
+        return new Promise((resolve, reject) => {
+            const tx = this.db.transaction('messages', 'readwrite');
+            const store = tx.objectStore('messages');
+            messages.forEach(msg => store.put(msg));
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+    add(message) {
+        this.pending.push(message);
+        if (this.pending.length > 1) return;
+        this.written = this.written
+            .then(() => this.ready)
+            .then(() => {
+                const batch = this.pending.splice(0);
+                if (this.memory) {
+                    this.memory.push(...batch);
+                    return;
+                }
+                return this.write(batch);
+            })
+            .catch(error => console.error('Saving message failed:', error));
+    }
+    sessionRange(session, before = null) {
+        const upper = before ? [session, before.timestamp, before.id] : [session, []];
+        return IDBKeyRange.bound([session], upper, false, before !== null);
+    }
+    // The newest `limit` messages of `session` older than `before`, oldest first
+    async page(session, limit, before = null) {
+        await this.written;
+        await this.ready;
+        if (this.memory) {
+            const older = this.memory
+                .filter(msg => msg.session === session && (!before || msg.timestamp < before.timestamp))
+                .sort((a, b) => a.timestamp.localeCompare(b.timestamp));
+            return { messages: older.slice(-limit), hasOlder: older.length > limit };
+        }
+        return new Promise((resolve, reject) => {
+            const messages = [];
+            const index = this.db.transaction('messages').objectStore('messages').index('session_time');
+            const request = index.openCursor(this.sessionRange(session, before), 'prev');
+            request.onsuccess = () => {
+                const cursor = request.result;
+                if (cursor && messages.length < limit) {
+                    messages.push(cursor.value);
+                    cursor.continue();
+                    return;
+                }
+                resolve({ messages: messages.reverse(), hasOlder: Boolean(cursor) });
+            };
+            request.onerror = () => reject(request.error);
+        });
+    }
+    async sessionMessages(session) {
+        return (await this.page(session, Infinity)).messages;
+    }
+    async deleteSession(session) {
+        await this.written;
+        await this.ready;
+        if (this.memory) {
+            this.memory = this.memory.filter(msg => msg.session !== session);
+            return;
+        }
+        await new Promise((resolve, reject) => {
+            const tx = this.db.transaction('messages', 'readwrite');
+            const store = tx.objectStore('messages');
+            const request = store.index('session_time').getAllKeys(this.sessionRange(session));
+            request.onsuccess = () => request.result.forEach(key => store.delete(key));
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+}
+const conversationStore = new ConversationStore();
+
+// Renders a session's stored messages a window at a time. Older pages are read
+// from storage when the user scrolls near the top, and messages far outside the
+// viewport are taken out of the DOM again, so long histories stay cheap. Messages
+// from the current visit are appended after the window as usual.
+class HistoryView {
+    static attach(container, scroller) {
+        if (!HistoryView.views.has(container)) HistoryView.views.set(container, new HistoryView(container, scroller));
+        return HistoryView.views.get(container);
+    }
+    constructor(container, scroller) {
+        this.container = container;
+        this.scroller = scroller;
+        this.element = document.createElement('div');
+        this.element.className = 'history-window';
+        this.messages = [];
+        this.start = 0;
+        this.end = 0;
+        this.hasOlder = false;
+        this.manager = null;
+        this.render = null;
+        this.busy = false;
+        this.generation = 0;
+        if (scroller) scroller.addEventListener('scroll', () => this.onScroll(), { passive: true });
+    }
+    // Show the newest page of `manager`'s session, rendering each message with `render`
+    async reset(manager, render, anchor) {
+        const generation = ++this.generation;
+        const { messages, hasOlder } = await manager.loadRecent(HISTORY_PAGE_SIZE);
+        if (generation !== this.generation) return;
+        this.manager = manager;
+        this.render = render;
+        this.messages = messages;
+        this.hasOlder = hasOlder;
+        this.element.replaceChildren();
+        this.start = this.end = messages.length;
+        this.container.insertBefore(this.element, anchor);
+        this.renderBefore(Math.min(HISTORY_RENDER_CHUNK, messages.length));
+    }
+    renderBefore(count) {
+        const fragment = document.createDocumentFragment();
+        this.messages.slice(this.start - count, this.start).forEach(msg => fragment.appendChild(this.render(msg)));
+        const height = this.scroller.scrollHeight;
+        this.element.insertBefore(fragment, this.element.firstChild);
+        this.start -= count;
+        // Keep what the user is looking at in place
+        this.scroller.scrollTop += this.scroller.scrollHeight - height;
+        while (this.end - this.start > HISTORY_MAX_RENDERED) {
+            this.element.lastElementChild.remove();
+            this.end--;
+        }
+    }
+    renderAfter(count) {
+        const fragment = document.createDocumentFragment();
+        this.messages.slice(this.end, this.end + count).forEach(msg => fragment.appendChild(this.render(msg)));
+        this.element.appendChild(fragment);
+        this.end += count;
+        const height = this.scroller.scrollHeight;
+        let removed = 0;
+        while (this.end - this.start > HISTORY_MAX_RENDERED) {
+            this.element.firstElementChild.remove();
+            this.start++;
+            removed++;
+        }
+        if (removed) this.scroller.scrollTop -= height - this.scroller.scrollHeight;
+    }
+    async onScroll() {
+        if (this.busy || !this.manager || !this.element.isConnected) return;
+        this.busy = true;
+        try {
+            if (this.scroller.scrollTop < HISTORY_EDGE_PX) {
+                await this.showOlder();
+            } else if (this.end < this.messages.length) {
+                const bottom = this.element.getBoundingClientRect().bottom;
+                if (bottom - this.scroller.getBoundingClientRect().bottom < HISTORY_EDGE_PX) {
+                    this.renderAfter(Math.min(HISTORY_RENDER_CHUNK, this.messages.length - this.end));
+                }
+            }
+        } finally {
+            this.busy = false;
+        }
+    }
+    async showOlder() {
+        if (this.start === 0 && this.hasOlder) {
+            const generation = this.generation;
+            const { messages, hasOlder } = await this.manager.loadOlder(this.messages[0], HISTORY_PAGE_SIZE);
+            if (generation !== this.generation) return;
+            this.messages = messages.concat(this.messages);
+            this.start += messages.length;
+            this.end += messages.length;
+            this.hasOlder = hasOlder;
+        }
+        if (this.start > 0) this.renderBefore(Math.min(HISTORY_RENDER_CHUNK, this.start));
+    }
+}
+HistoryView.views = new WeakMap();
+
 class ConversationManager {
-    constructor() {
-        this.conversations = JSON.parse(localStorage.getItem('therapyConversations') || '[]');
+    constructor(store = conversationStore) {
+        this.store = store;
         this.currentSession = this.getCurrentSession();
+        // This session's messages loaded or added on this page, oldest first
+        this.messages = [];
     }
     getCurrentSession() {
         let session = sessionStorage.getItem('therapySession');
@@ -85,7 +535,7 @@ class ConversationManager {
     }
     addMessage(content, role, type = 'text', metadata = {}) {
         const message = {
-            id: Date.now() + Math.random(),
+            id: ConversationManager.nextId(),
             content,
             role,
             type,
@@ -93,30 +543,41 @@ class ConversationManager {
             session: this.currentSession,
             metadata
         };
-        this.conversations.push(message);
-        this.saveToStorage();
+        this.messages.push(message);
+        this.store.add(message);
         return message;
     }
+    // Increasing within the page, so messages from the same millisecond keep their order
+    static nextId() {
+        const id = Math.max(Date.now(), ConversationManager.lastId + 0.001) + Math.random() * 0.001;
+        ConversationManager.lastId = id;
+        return id;
+    }
+    async loadRecent(limit) {
+        const page = await this.store.page(this.currentSession, limit);
+        this.messages = page.messages;
+        return page;
+    }
+    async loadOlder(before, limit) {
+        const page = await this.store.page(this.currentSession, limit, before);
+        this.messages = page.messages.concat(this.messages);
+        return page;
+    }
     getMessagesForAPI() {
-        return this.conversations
-            .filter(msg => msg.session === this.currentSession)
-            .map(msg => ({
-                role: msg.role,
-                content: msg.content
-            }));
+        return this.messages.map(msg => ({
+            role: msg.role,
+            content: msg.content
+        }));
     }
     getAllSessionMessages() {
-        return this.conversations.filter(msg => msg.session === this.currentSession);
+        return this.store.sessionMessages(this.currentSession);
     }
-    saveToStorage() {
-        localStorage.setItem('therapyConversations', JSON.stringify(this.conversations));
+    async clearSession() {
+        this.messages = [];
+        await this.store.deleteSession(this.currentSession);
     }
-    clearSession() {
-        this.conversations = this.conversations.filter(msg => msg.session !== this.currentSession);
-        this.saveToStorage();
-    }
-    exportConversation() {
-        const sessionMessages = this.getAllSessionMessages();
+    async exportConversation() {
+        const sessionMessages = await this.getAllSessionMessages();
         const data = {
             timestamp: new Date().toISOString(),
             session: this.currentSession,
@@ -134,6 +595,7 @@ class ConversationManager {
         URL.revokeObjectURL(url);
     }
 }
+ConversationManager.lastId = 0;
 
 class VoiceTherapyApp {
     constructor() {
@@ -160,6 +622,12 @@ class VoiceTherapyApp {
         this.silenceTimer = null;
         this.silenceThreshold = 0.02;
         this.silenceDuration = 3000;
+        this.audioQueue = [];
+        this.playbackPromise = null;
+        this.resolvePlayback = null;
+        this.streamStarted = false;
+        this.liveTranscriber = null;
+        this.liveTurn = null;
     }
 
     activate() {
@@ -185,6 +653,10 @@ class VoiceTherapyApp {
         if (!this.activated) return;
         this.activated = false;
         this.stopRecording();
+        if (this.liveTranscriber) {
+            this.liveTranscriber.cancel();
+            this.liveTranscriber = null;
+        }
         if (this.recordBtn) this.recordBtn.removeEventListener('click', this.recordBtnHandler);
     }
 
@@ -227,6 +699,26 @@ class VoiceTherapyApp {
         this.mediaRecorder.onstop = async () => {
             const audioBlob = new Blob(this.audioChunks, { type: 'audio/webm' });
             this.audioChunks = [];
+            if (this.liveTranscriber) {
+                const live = this.liveTranscriber;
+                const turn = this.liveTurn;
+                this.liveTranscriber = null;
+                this.liveTurn = null;
+                try {
+                    this.updateStatus('AI is thinking...');
+                    await live.stop();
+                    await this.finishVoiceTurn(turn);
+                    return;
+                } catch (error) {
+                    if (this.streamStarted) {
+                        console.error('Live voice turn failed:', error);
+                        this.updateStatus('Connection error. Try again.');
+                        return;
+                    }
+                    // Nothing shown yet: send the recording the old way
+                    console.warn('Live transcription unavailable, uploading the recording:', error);
+                }
+            }
             if (audioBlob.size > 1000) {
                 this.updateStatus("Processing your response...");
                 await this.sendAudioToBackend(audioBlob);
@@ -274,6 +766,7 @@ class VoiceTherapyApp {
     startRecording() {
         if (this.isRecording || this.isPlaying || !this.mediaRecorder) return;
         this.mediaRecorder.start();
+        this.startLiveTranscription();
         this.isRecording = true;
         this.updateStatus('Listening... Speak now');
         this.updateVoiceAnimation('listening');
@@ -281,6 +774,15 @@ class VoiceTherapyApp {
         this.updateAudioVisualizer();
         this.monitorSilence();
     }
+    startLiveTranscription() {
+        if (!this.audioContext || !this.audioContext.audioWorklet || !window.WebSocket) return;
+        this.audioContext.resume();
+        this.streamStarted = false;
+        this.liveTurn = this.createVoiceTurn();
+        this.liveTranscriber = new LiveTranscriber(
+            this.audioContext, this.mediaStream, this.conversationManager.currentSession, this.liveTurn.onEvent
+        );
+    }
     stopRecording() {
         if (!this.isRecording || !this.mediaRecorder) return;
         this.mediaRecorder.stop();
@@ -325,8 +827,16 @@ class VoiceTherapyApp {
     async sendAudioToBackend(audioBlob) {
         try {
             this.updateStatus('Sending to AI therapist...');
+            try {
+                await this.streamVoiceResponse(audioBlob);
+                return;
+            } catch (streamError) {
+                // Only fall back to upload + /chat if nothing was rendered yet
+                if (this.streamStarted) throw streamError;
+                console.warn('Voice streaming unavailable, falling back to /chat:', streamError);
+            }
             const formData = new FormData();
-            formData.append('audio', audioBlob, 'user_audio.mp3');
+            formData.append('audio', audioBlob, 'user_audio.webm');
             const uploadResp = await fetch(`${BACKEND_CONFIG.BASE_URL}${BACKEND_CONFIG.ENDPOINTS.UPLOAD_AUDIO}`, {
                 method: 'POST',
                 body: formData
@@ -336,10 +846,11 @@ class VoiceTherapyApp {
             const messagesHistory = this.conversationManager.getMessagesForAPI();
             const response = await fetch(`${BACKEND_CONFIG.BASE_URL}${BACKEND_CONFIG.ENDPOINTS.VOICE_CHAT}`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: audioHeaders({ 'Content-Type': 'application/json' }),
                 body: JSON.stringify({
                     user_message: uploadData.audio_filepath,
                     dtype: 'audio',
+                    session_id: this.conversationManager.currentSession,
                     messages: messagesHistory
                 })
             });
@@ -351,6 +862,77 @@ class VoiceTherapyApp {
             this.updateStatus('Connection error. Try again.');
         }
     }
+    async streamVoiceResponse(audioBlob) {
+        this.streamStarted = false;
+        // Upload and answer in a single request; the server transcribes in memory
+        const formData = new FormData();
+        formData.append('audio', audioBlob, 'user_audio.webm');
+        formData.append('session_id', this.conversationManager.currentSession);
+        formData.append('stream', '1');
+        const response = await fetch(`${BACKEND_CONFIG.BASE_URL}${BACKEND_CONFIG.ENDPOINTS.VOICE_TURN}`, {
+            method: 'POST',
+            headers: audioHeaders({ 'Accept': 'text/event-stream' }),
+            body: formData
+        });
+        if (!response.ok || !response.body) throw new Error(`HTTP error! status: ${response.status}`);
+        const turn = this.createVoiceTurn();
+        await readEventStream(response, turn.onEvent);
+        await this.finishVoiceTurn(turn);
+    }
+    // Collects one voice turn from /voice-turn events or the live voice socket
+    createVoiceTurn() {
+        const turn = { content: null, segments: [], finished: false };
+        turn.onEvent = (type, data) => {
+            if (type === 'partial') {
+                this.updateStatus(`Heard: "${data.transcript}"`);
+            } else if (type === 'transcript') {
+                this.streamStarted = true;
+                this.conversationManager.addMessage(data.transcribed_text, 'user', 'text');
+                this.addMessageToUI(data.transcribed_text, 'user', 'text', null, true);
+                this.updateStatus('AI is thinking...');
+            } else if (type === 'content') {
+                turn.content = data.content;
+                turn.followUp = data.follow_up;
+            } else if (type === 'segment') {
+                turn.segments.push(data.audio_filepath);
+                this.enqueueAudioSegment(data.audio_filepath);
+            } else if (type === 'done') {
+                turn.finished = true;
+                if (data.time_to_first_audio_ms != null) console.debug(`Time to first audio: ${data.time_to_first_audio_ms} ms`);
+            } else if (type === 'error') {
+                throw new Error(data.error || 'Voice streaming failed');
+            }
+        };
+        return turn;
+    }
+    async finishVoiceTurn(turn) {
+        if (!turn.finished || turn.content === null) throw new Error('Stream ended unexpectedly');
+        const segments = turn.segments;
+        this.conversationManager.addMessage(turn.content, 'assistant', 'voice', { audioPath: segments[0], audioSegments: segments });
+        this.addMessageToUI(turn.content, 'assistant', 'voice', segments);
+        if (turn.followUp) readFollowUp(turn.followUp, (reply) => this.addVoiceFollowUp(reply));
+        if (this.playbackPromise) await this.playbackPromise;
+        this.updateRecordBtnUI('idle');
+        this.updateStatus('Click microphone to speak again');
+        this.scrollToBottom();
+    }
+    addVoiceFollowUp(reply) {
+        const audioPath = reply.audio_filepath;
+        this.conversationManager.addMessage(reply.content, 'assistant', audioPath ? 'voice' : 'text', audioPath ? { audioPath } : {});
+        this.addMessageToUI(reply.content, 'assistant', audioPath ? 'voice' : 'text', audioPath);
+        if (audioPath) this.enqueueAudioSegment(audioPath);
+        this.scrollToBottom();
+    }
+    enqueueAudioSegment(audioPath) {
+        this.audioQueue.push(audioPath);
+        if (!this.playbackPromise) this.playbackPromise = this.drainAudioQueue();
+    }
+    async drainAudioQueue() {
+        while (this.audioQueue.length) {
+            await this.playAudioResponse(this.audioQueue.shift());
+        }
+        this.playbackPromise = null;
+    }
     async handleBackendResponse(responseData) {
         if (responseData.transcribed_text) {
             this.conversationManager.addMessage(responseData.transcribed_text, 'user', 'text');
@@ -360,6 +942,7 @@ class VoiceTherapyApp {
             this.conversationManager.addMessage(responseData.content, 'assistant', 'voice', { audioPath: responseData.audio_filepath });
             await this.playAudioResponse(responseData.audio_filepath);
             this.addMessageToUI(responseData.content, 'assistant', 'voice', responseData.audio_filepath);
+            if (responseData.follow_up) readFollowUp(responseData.follow_up, (reply) => this.addVoiceFollowUp(reply));
         } else if (responseData.content) {
             this.conversationManager.addMessage(responseData.content, 'assistant', 'text');
             this.addMessageToUI(responseData.content, 'assistant', 'text');
@@ -370,6 +953,7 @@ class VoiceTherapyApp {
     }
     async playAudioResponse(audioPath) {
         return new Promise((resolve) => {
+            this.resolvePlayback = resolve;
             try {
                 this.updateStatus('AI is responding...');
                 this.updateVoiceAnimation('ai-speaking');
@@ -408,9 +992,17 @@ class VoiceTherapyApp {
             this.isPlaying = false;
             this.updateVoiceAnimation('idle');
         }
+        this.audioQueue = [];
+        if (this.resolvePlayback) this.resolvePlayback();
     }
     addMessageToUI(content, role, type = 'text', audioPath = null, isTranscript = false) {
         if (!this.messagesContainer) return;
+        const messageDiv = this.createMessageElement(content, role, type, audioPath, isTranscript);
+        this.messagesContainer.insertBefore(messageDiv, this.typingIndicator);
+        this.scrollToBottom();
+        return messageDiv;
+    }
+    createMessageElement(content, role, type = 'text', audioPath = null, isTranscript = false, timestamp = null) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message-slide-in message-bubble ${role === 'user' ? 'message-user' : 'message-ai'}`;
         let messageContent = '';
@@ -424,15 +1016,30 @@ class VoiceTherapyApp {
         } else {
             messageContent += `<div class="message-text">${content}</div>`;
         }
-        if (type === 'voice' && role === 'assistant' && audioPath) {
-            const audioUrl = audioPath.startsWith('http') ? audioPath : `${BACKEND_CONFIG.BASE_URL}/${audioPath}`;
-            messageContent += `<div class="mt-2"><audio controls class="w-full max-w-xs"><source src="${audioUrl}" type="audio/mp3">Your browser does not support audio playback.</audio></div>`;
+        const audioUrls = (Array.isArray(audioPath) ? audioPath : [audioPath])
+            .filter(Boolean)
+            .map(path => path.startsWith('http') ? path : `${BACKEND_CONFIG.BASE_URL}/${path}`);
+        if (type === 'voice' && role === 'assistant' && audioUrls.length) {
+            messageContent += `<div class="mt-2"><audio controls class="w-full max-w-xs"><source src="${audioUrls[0]}" type="${audioType(audioUrls[0])}">Your browser does not support audio playback.</audio></div>`;
         }
-        const timestamp = new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
-        messageContent += `<div class="text-xs opacity-60 mt-2">${timestamp}</div>`;
+        const time = (timestamp ? new Date(timestamp) : new Date()).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        messageContent += `<div class="text-xs opacity-60 mt-2">${time}</div>`;
         messageDiv.innerHTML = messageContent;
-        this.messagesContainer.insertBefore(messageDiv, this.typingIndicator);
-        this.scrollToBottom();
+        if (audioUrls.length > 1) {
+            // Play sentence segments back to back as one clip
+            const player = messageDiv.querySelector('audio');
+            let segmentIndex = 0;
+            player.addEventListener('ended', () => {
+                if (++segmentIndex < audioUrls.length) {
+                    player.src = audioUrls[segmentIndex];
+                    player.play();
+                } else {
+                    segmentIndex = 0;
+                    player.src = audioUrls[0];
+                }
+            });
+        }
+        return messageDiv;
     }
     updateRecordBtnUI(state) {
         if (!this.recordBtn) return;
@@ -486,27 +1093,25 @@ class VoiceTherapyApp {
             this.connectionStatus.innerHTML = '<i class="fas fa-circle text-red-500"></i> Backend: Disconnected';
         }
     }
-    clearChat() {
+    async clearChat() {
         if (confirm('Are you sure you want to clear this conversation? This will remove all messages including voice conversation history.')) {
-            this.conversationManager.clearSession();
-            this.loadChatHistory();
+            await this.conversationManager.clearSession();
+            await this.loadChatHistory();
         }
     }
-    loadChatHistory() {
+    async loadChatHistory() {
         if (!this.messagesContainer) return;
-        const existingMessages = this.messagesContainer.querySelectorAll('.message-slide-in');
-        existingMessages.forEach(msg => msg.remove());
-        const messages = this.conversationManager.getAllSessionMessages()
-            .sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
-        messages.forEach(msg => {
-            this.addMessageToUI(
-                msg.content,
-                msg.role,
-                msg.type,
-                msg.metadata?.audioPath,
-                msg.type === 'text' && msg.metadata && msg.metadata.isTranscript
-            );
-        });
+        // Messages from earlier in this visit; stored history is rendered by the view
+        this.messagesContainer.querySelectorAll(':scope > .message-slide-in').forEach(msg => msg.remove());
+        const history = HistoryView.attach(this.messagesContainer, document.getElementById('chatMessages'));
+        await history.reset(this.conversationManager, (msg) => this.createMessageElement(
+            msg.content,
+            msg.role,
+            msg.type,
+            msg.metadata?.audioSegments || msg.metadata?.audioPath,
+            msg.type === 'text' && msg.metadata && msg.metadata.isTranscript,
+            msg.timestamp
+        ), this.typingIndicator);
         this.scrollToBottom();
     }
 }
@@ -521,6 +1126,7 @@ class ChatTherapyApp {
         this.typingIndicator = null;
         this.connectionStatus = null;
         this.clearChatBtn = null;
+        this.streamStarted = false;
     }
     activate() {
         this.chatInput = document.getElementById('chatInput');
@@ -571,12 +1177,21 @@ class ChatTherapyApp {
         this.showTypingIndicator();
         try {
             const messagesHistory = this.conversationManager.getMessagesForAPI();
+            try {
+                await this.streamMessage(message);
+                return;
+            } catch (streamError) {
+                // Only fall back to the blocking endpoint if nothing was rendered yet
+                if (this.streamStarted) throw streamError;
+                console.warn('Streaming unavailable, falling back to /chat:', streamError);
+            }
             const response = await fetch(`${BACKEND_CONFIG.BASE_URL}${BACKEND_CONFIG.ENDPOINTS.CHAT}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ 
                     user_message: message,
                     dtype: 'message',
+                    session_id: this.conversationManager.currentSession,
                     messages: messagesHistory
                 })
             });
@@ -593,7 +1208,53 @@ class ChatTherapyApp {
             this.adjustTextareaHeight();
         }
     }
+    async streamMessage(message) {
+        this.streamStarted = false;
+        const response = await fetch(`${BACKEND_CONFIG.BASE_URL}${BACKEND_CONFIG.ENDPOINTS.CHAT_STREAM}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+            body: JSON.stringify({
+                user_message: message,
+                session_id: this.conversationManager.currentSession
+            })
+        });
+        if (!response.ok || !response.body) throw new Error(`HTTP error! status: ${response.status}`);
+        let text = '';
+        let bubble = null;
+        let result = null;
+        await readEventStream(response, (type, data) => {
+            if (type === 'token') {
+                text += data.text;
+                if (!bubble) {
+                    this.streamStarted = true;
+                    this.hideTypingIndicator();
+                    bubble = this.addMessageToUI('', 'assistant', 'text');
+                }
+                bubble.querySelector('.message-text').textContent = text;
+                this.scrollToBottom();
+            } else if (type === 'done') {
+                result = data;
+            } else if (type === 'error') {
+                throw new Error(data.error || 'Streaming failed');
+            }
+        });
+        if (!result) throw new Error('Stream ended unexpectedly');
+        if (!bubble) {
+            bubble = this.addMessageToUI(result.content, 'assistant', 'text');
+        } else {
+            bubble.querySelector('.message-text').textContent = result.content;
+        }
+        if (result.ttft_ms != null) console.debug(`Time to first token: ${result.ttft_ms} ms`);
+        this.conversationManager.addMessage(result.content, 'assistant', 'text');
+        if (result.follow_up) readFollowUp(result.follow_up, (reply) => this.addTextFollowUp(reply));
+        return bubble;
+    }
+    addTextFollowUp(reply) {
+        this.conversationManager.addMessage(reply.content, 'assistant', 'text');
+        this.addMessageToUI(reply.content, 'assistant', 'text');
+    }
     async handleBackendResponse(responseData) {
+        if (responseData.follow_up) readFollowUp(responseData.follow_up, (reply) => this.addTextFollowUp(reply));
         if (responseData.type === 'message' && responseData.content) {
             this.conversationManager.addMessage(responseData.content, 'assistant', 'text');
             this.addMessageToUI(responseData.content, 'assistant', 'text');
@@ -612,6 +1273,12 @@ class ChatTherapyApp {
     }
     addMessageToUI(content, role, type = 'text', audioPath = null, isTranscript = false) {
         if (!this.messagesContainer) return;
+        const messageDiv = this.createMessageElement(content, role, type, audioPath, isTranscript);
+        this.messagesContainer.insertBefore(messageDiv, this.typingIndicator);
+        this.scrollToBottom();
+        return messageDiv;
+    }
+    createMessageElement(content, role, type = 'text', audioPath = null, isTranscript = false, timestamp = null) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message-slide-in message-bubble ${role === 'user' ? 'message-user' : 'message-ai'}`;
         let messageContent = '';
@@ -627,29 +1294,26 @@ class ChatTherapyApp {
         }
         if (type === 'voice' && role === 'assistant' && audioPath) {
             const audioUrl = audioPath.startsWith('http') ? audioPath : `${BACKEND_CONFIG.BASE_URL}/${audioPath}`;
-            messageContent += `<div class="mt-2"><audio controls class="w-full max-w-xs"><source src="${audioUrl}" type="audio/mp3">Your browser does not support audio playback.</audio></div>`;
+            messageContent += `<div class="mt-2"><audio controls class="w-full max-w-xs"><source src="${audioUrl}" type="${audioType(audioUrl)}">Your browser does not support audio playback.</audio></div>`;
         }
-        const timestamp = new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
-        messageContent += `<div class="text-xs opacity-60 mt-2">${timestamp}</div>`;
+        const time = (timestamp ? new Date(timestamp) : new Date()).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        messageContent += `<div class="text-xs opacity-60 mt-2">${time}</div>`;
         messageDiv.innerHTML = messageContent;
-        this.messagesContainer.insertBefore(messageDiv, this.typingIndicator);
-        this.scrollToBottom();
+        return messageDiv;
     }
-    loadChatHistory() {
+    async loadChatHistory() {
         if (!this.messagesContainer) return;
-        const existingMessages = this.messagesContainer.querySelectorAll('.message-slide-in');
-        existingMessages.forEach(msg => msg.remove());
-        const messages = this.conversationManager.getAllSessionMessages()
-            .sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
-        messages.forEach(msg => {
-            this.addMessageToUI(
-                msg.content,
-                msg.role,
-                msg.type,
-                msg.metadata?.audioPath,
-                msg.type === 'text' && msg.metadata && msg.metadata.isTranscript
-            );
-        });
+        // Messages from earlier in this visit; stored history is rendered by the view
+        this.messagesContainer.querySelectorAll(':scope > .message-slide-in').forEach(msg => msg.remove());
+        const history = HistoryView.attach(this.messagesContainer, document.getElementById('chatMessages'));
+        await history.reset(this.conversationManager, (msg) => this.createMessageElement(
+            msg.content,
+            msg.role,
+            msg.type,
+            msg.metadata?.audioPath,
+            msg.type === 'text' && msg.metadata && msg.metadata.isTranscript,
+            msg.timestamp
+        ), this.typingIndicator);
         this.scrollToBottom();
     }
     showTypingIndicator() {
@@ -689,10 +1353,10 @@ class ChatTherapyApp {
             this.connectionStatus.innerHTML = '<i class="fas fa-circle text-red-500"></i> Backend: Disconnected';
         }
     }
-    clearChat() {
+    async clearChat() {
         if (confirm('Are you sure you want to clear this conversation? This will remove all messages including voice conversation history.')) {
-            this.conversationManager.clearSession();
-            this.loadChatHistory();
+            await this.conversationManager.clearSession();
+            await this.loadChatHistory();
         }
     }
 }
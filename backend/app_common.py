@@ -0,0 +1,146 @@
+import os
+import time
+import uuid
+
+from backend.tts_pipeline import split_into_segments
+from backend.tts_profiles import PROFILES, default_profile, negotiate_profile
+
+# Subsystems each endpoint needs; requests get a 503 while any is still starting.
+REQUIRED_SUBSYSTEMS = {
+    "chat_endpoint": ["orchestrator"],
+    "chat_stream_endpoint": ["orchestrator"],
+    "chat_voice_stream_endpoint": ["orchestrator", "speech_to_text", "text_to_speech"],
+    "voice_turn_endpoint": ["orchestrator", "speech_to_text", "text_to_speech"],
+    "create_job": ["orchestrator", "text_to_speech"],
+}
+
+# Format, sample rate and encoding come from the output profile (see speech_settings).
+VOICE_SETTINGS = {
+    "voice_id": "en-US-natalie",
+    "style": "empathetic",
+    "channel_type": "MONO",
+    "rate": -6.0,
+    "pitch": -5.0,
+    "variation": 4
+}
+
+# Browser cache lifetime for content-addressed audio (names never change)
+AUDIO_CACHE_MAX_AGE = int(os.getenv("AUDIO_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Keep a copy of /voice-turn uploads on disk (off by default)
+PERSIST_USER_AUDIO = os.getenv("PERSIST_USER_AUDIO", "0") == "1"
+
+# Follow a crisis turn's safety template with a model-written reply (see crisis_reply).
+CRISIS_FOLLOW_UP = os.getenv("CRISIS_FOLLOW_UP", "1") == "1"
+
+FALLBACK_RESPONSE = "I understand you're reaching out. I'm here to listen and support you. Could you tell me more about what's on your mind?"
+
+MAX_SESSION_ID_LENGTH = 128
+
+
+def parse_session_id(value) -> str:
+    """
+    A client-supplied session_id. Clients that send none get a new id of
+    their own (returned as X-Session-ID) rather than a shared session.
+    """
+    if value is None:
+        return uuid.uuid4().hex
+    if not isinstance(value, str) or len(value) > MAX_SESSION_ID_LENGTH:
+        raise ValueError(f"Invalid session_id, must be a string of at most {MAX_SESSION_ID_LENGTH} characters")
+    return value
+
+
+def health_timestamp() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def speech_settings(profile) -> dict:
+    return dict(VOICE_SETTINGS, **profile.speech_settings())
+
+
+def prewarm_profiles():
+    """
+    The profiles clients are likely to get: TTS_PROFILE and those in
+    TTS_PROFILE_PREFERENCE.
+    """
+    names = [default_profile().name] + os.getenv("TTS_PROFILE_PREFERENCE", "opus-24k,mp3-24k").split(",")
+    return [PROFILES[name] for name in dict.fromkeys(name.strip() for name in names) if name in PROFILES]
+
+
+def prewarm_tts_cache(tts_client) -> None:
+    """
+    Synthesize fixed replies (crisis message, fallback) into the TTS cache in
+    the background, both whole and split the way the streaming path splits
+    them, for each likely output profile.
+    """
+    phrases = [crisis_template(), FALLBACK_RESPONSE]
+    texts = list(phrases)
+    for phrase in phrases:
+        texts.extend(split_into_segments(phrase))
+    for profile in prewarm_profiles():
+        tts_client.prewarm(dict.fromkeys(texts), **speech_settings(profile))
+
+
+def crisis_template(orch=None) -> str:
+    if orch is not None:
+        return orch.crisis_template
+    from backend.system_instruction import get_advanced_therapist_instruction
+    return get_advanced_therapist_instruction().safety_protocols.response_template
+
+
+def request_profile(args, headers):
+    """
+    The output profile negotiated from the client's X-Audio-Formats and
+    X-Audio-Profile headers (or audio_formats and audio_profile query
+    parameters).
+    """
+    return negotiate_profile(
+        headers.get("X-Audio-Formats") or args.get("audio_formats"),
+        headers.get("X-Audio-Profile") or args.get("audio_profile"),
+    )
+
+
+def record_audio_turn(stats, profile, audio_filepaths, started: float) -> None:
+    """
+    Record a turn's audio bytes and time to audio (from `started`, a
+    perf_counter reading) under its output profile in `stats`, a
+    ProfileStats.
+    """
+    stats.record(profile, audio_filepaths, (time.perf_counter() - started) * 1000)
+
+
+def save_user_audio(audio_bytes: bytes, original_name: str = None) -> str:
+    """
+    Persist an upload under a unique name so concurrent users never collide.
+    """
+    ext = os.path.splitext(original_name or "")[1].lower() or ".webm"
+    if not ext[1:].isalnum():
+        ext = ".webm"
+    os.makedirs("audios", exist_ok=True)
+    save_path = os.path.join("audios", f"user_audio_{uuid.uuid4().hex}{ext}")
+    with open(save_path, "wb") as f:
+        f.write(audio_bytes)
+    return save_path
+
+
+def has_audio(resp: dict) -> bool:
+    return bool(resp["success"] and (
+        resp.get("audio_path") or resp.get("audio") or resp.get("encoded_audio") or resp.get("audio_file")
+    ))
+
+
+def save_speech(audio_store, tts_client, resp: dict, profile) -> str:
+    """
+    Save the audio of a successful Murf response to `audio_store`, named by
+    content so turns never overwrite each other. The audio is a TTS cache
+    file, raw bytes from its memory tier, the audioFile URL (downloaded as
+    raw bytes through `tts_client`) or base64, and is written in chunks.
+    Blocking.
+    """
+    if resp.get("audio_path"):
+        return audio_store.save_file(resp["audio_path"], profile.ext)
+    if resp.get("audio"):
+        return audio_store.save(resp["audio"], profile.ext)
+    if resp.get("encoded_audio"):
+        return audio_store.save_encoded(resp["encoded_audio"], profile.ext)
+    return audio_store.save_stream(tts_client.iter_audio(resp["audio_file"]), profile.ext)
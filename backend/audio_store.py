@@ -0,0 +1,228 @@
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Files the store (or the upload endpoints) created and may delete. Anything
+# else in the directory, such as a checked-in sample, is left alone.
+_MANAGED_NAME = re.compile(r"^(ai_[0-9a-f]{32}|user_audio_[0-9a-f]{32}|ai_response_[0-9a-f]{32}_\d{3})\.[a-z0-9]+$")
+_CONTENT_NAME = re.compile(r"^ai_([0-9a-f]{32})\.[a-z0-9]+$")
+# Bytes per read or write when streaming audio to disk.
+CHUNK_SIZE = 64 * 1024
+
+
+def decode_base64_chunks(encoded_audio: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Decode base64 audio a slice at a time, so a clip is never held twice
+    (as text and as bytes) in full.
+    """
+    # Slices must be whole 4-character groups to decode on their own.
+    step = max(4, chunk_size // 3 * 4)
+    for start in range(0, len(encoded_audio), step):
+        yield base64.b64decode(encoded_audio[start:start + step])
+
+
+def iter_file(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def content_etag(filename: str) -> Optional[str]:
+    """
+    Strong ETag of a content-addressed file, taken from its name; None for
+    any other file.
+    """
+    match = _CONTENT_NAME.match(filename)
+    return match.group(1) if match else None
+
+
+class AudioStore:
+    """
+    Generated audio on disk under content-addressed names.
+
+    Each clip is saved as `ai_<hash>.<ext>`, so two turns never overwrite
+    each other, a name always refers to the same bytes and identical clips
+    (the cached crisis message, say) are stored once. A background janitor
+    deletes managed files older than `ttl` seconds and then the oldest ones
+    until the directory fits in `max_bytes`.
+    """
+
+    def __init__(self, folder: str = "audios", ttl: float = None, max_bytes: int = None, interval: float = None):
+        if ttl is None:
+            ttl = float(os.getenv("AUDIO_TTL", "86400"))
+        if max_bytes is None:
+            max_bytes = int(os.getenv("AUDIO_MAX_BYTES", str(512 * 1024 * 1024)))
+        if interval is None:
+            interval = float(os.getenv("AUDIO_JANITOR_INTERVAL", "300"))
+        self.folder = folder
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.saved = 0
+        self.deduplicated = 0
+        self.removed_expired = 0
+        self.removed_quota = 0
+        self.last_sweep = {"files": 0, "bytes": 0, "ms": None}
+
+    def save(self, audio: bytes, ext: str = ".mp3") -> str:
+        """
+        Write `audio` under its content address and return the path.
+        """
+        if not audio:
+            raise ValueError("audio must not be empty.")
+        return self.save_stream([audio], ext)
+
+    def save_stream(self, chunks: Iterable[bytes], ext: str = ".mp3") -> str:
+        """
+        Write audio arriving in chunks (a download, a base64 decode) to a
+        temporary file, hashing as it goes, then move it to its content
+        address. Only one chunk is in memory at a time.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        tmp = os.path.join(self.folder, f"incoming_{threading.get_ident()}_{time.monotonic_ns()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            if not size:
+                raise ValueError("audio must not be empty.")
+            path = os.path.join(self.folder, f"ai_{digest.hexdigest()[:32]}{ext}")
+            if os.path.exists(path):
+                try:
+                    os.utime(path)  # restart its TTL
+                    with self._lock:
+                        self.deduplicated += 1
+                    return path
+                except OSError:
+                    pass  # removed by the janitor in the meantime; keep the new copy
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        with self._lock:
+            self.saved += 1
+        logger.debug("Audio saved at %s (%d bytes)", path, size)
+        return path
+
+    def save_encoded(self, encoded_audio: str, ext: str = ".mp3") -> str:
+        """
+        Same as save, for the base64 audio Murf returns; decoded in chunks.
+        """
+        if not encoded_audio:
+            raise ValueError("encoded_audio must not be empty.")
+        return self.save_stream(decode_base64_chunks(encoded_audio), ext)
+
+    def save_file(self, source: str, ext: str = ".mp3") -> str:
+        """
+        Same as save, copying an existing file (a TTS cache entry) in chunks.
+        """
+        return self.save_stream(iter_file(source), ext)
+
+    def sweep(self) -> dict:
+        """
+        Delete expired managed files, then the least recently saved ones
+        while the directory is over quota.
+        """
+        started = time.perf_counter()
+        now = time.time()
+        files = []
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            names = []
+        expired = 0
+        for name in names:
+            if not _MANAGED_NAME.match(name):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > self.ttl:
+                if self._remove(path):
+                    expired += 1
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        over_quota = 0
+        if total > self.max_bytes:
+            files.sort()
+            while files and total > self.max_bytes:
+                _, size, path = files.pop(0)
+                if self._remove(path):
+                    over_quota += 1
+                    total -= size
+
+        with self._lock:
+            self.removed_expired += expired
+            self.removed_quota += over_quota
+            self.last_sweep = {
+                "files": len(files),
+                "bytes": total,
+                "ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+        if expired or over_quota:
+            logger.info("Audio janitor removed %d expired and %d over-quota files", expired, over_quota)
+        return dict(self.last_sweep, removed_expired=expired, removed_quota=over_quota)
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def start_janitor(self) -> None:
+        """
+        Run sweep every `interval` seconds in a daemon thread.
+        """
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="audio-janitor", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Audio janitor sweep failed: %s", e)
+            if self._stop.wait(self.interval):
+                return
+
+    def stop_janitor(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "saved": self.saved,
+                "deduplicated": self.deduplicated,
+                "removed_expired": self.removed_expired,
+                "removed_quota": self.removed_quota,
+                "ttl_seconds": self.ttl,
+                "max_bytes": self.max_bytes,
+                "last_sweep": dict(self.last_sweep),
+            }
@@ -1,22 +1,63 @@
+import asyncio
+import logging
+import os
+import threading
 from typing import List, Dict, Optional
 from backend.system_instruction import SystemInstruction, TherapeuticTechnique
-from backend.gemini_client import get_gemini_chat_completion
+from backend.safety_matcher import SafetyMatcher
+from backend.session_store import SessionStore
+from backend.history_compactor import SUMMARY_HEADER, HistoryCompactor, estimate_tokens
+from backend.gemini_client import (
+    get_gemini_chat_completion,
+    get_gemini_chat_completion_async,
+    stream_gemini_chat_completion,
+    stream_gemini_chat_completion_async,
+)
+
+logger = logging.getLogger(__name__)
+
+# Sent (not stored) after the safety template to ask for the follow-up reply.
+FOLLOW_UP_REQUEST = (
+    "You have just shared the crisis resources above with me. Now reply to what "
+    "I said in your own words: briefly, warmly, and without repeating the resources."
+)
 
 class GeminiChatSession:
-    def __init__(self, instruction: SystemInstruction, techniques: List[TherapeuticTechnique]):
+    def __init__(
+        self,
+        instruction: SystemInstruction,
+        techniques: List[TherapeuticTechnique],
+        max_turns: Optional[int] = None,
+        safety_matcher: Optional[SafetyMatcher] = None,
+        session_id: Optional[str] = None,
+        store: Optional[SessionStore] = None,
+        compactor: Optional[HistoryCompactor] = None,
+    ):
         self.instruction = instruction
         self.techniques = techniques
+        if safety_matcher is None:
+            safety_matcher = SafetyMatcher.from_protocol(instruction.safety_protocols)
+        self.safety_matcher = safety_matcher
+        self.last_safety_matches = []
+        if max_turns is None:
+            max_turns = int(os.getenv("SESSION_MAX_TURNS", "20"))
+        self.max_turns = max_turns
+        self.lock = threading.Lock()
+        self.async_lock = asyncio.Lock()
+        # The therapist prompt is sent as the model's system instruction
+        # (see gemini_client.get_model), so the history only holds real turns.
         self.chat_history: List[Dict] = []
-        system_msg = (
-            f"{self.instruction.role}\n"
-            f"{self.instruction.core_principles}\n"
-            f"{self.instruction.therapeutic_approach}\n"
-            f"{self.instruction.communication_style}\n"
-            f"{self.instruction.intervention_strategies}\n"
-            f"{self.instruction.ethical_boundaries}\n"
-            f"{self.instruction.crisis_management}\n"
-        )
-        self.chat_history.append({"role": "model", "parts": [{"text": system_msg}]})
+        # With a store, every turn is also appended to its log and the
+        # history is loaded from it on first use (see sync).
+        self.session_id = session_id
+        self.store = store if session_id else None
+        self.last_turn_id: Optional[int] = None
+        # Older turns folded into a rolling summary (see _schedule_compaction).
+        self.compactor = compactor if compactor is not None and compactor.enabled else None
+        self.summary = ""
+        self.summarized_tokens = 0
+        self._compaction = None
+        self.last_context: Dict = {}
 
     def get_phase_intro(self) -> str:
         return f"{self.instruction.core_principles}\n{self.instruction.assessment_framework}"
@@ -25,28 +66,308 @@ class GeminiChatSession:
         user_message = user_message.strip()
         if not user_message:
             return None
-        self.chat_history.append({"role": "user", "parts": [{"text": user_message}]})
+        self._append("user", user_message)
         # Safety check
-        for trigger in self.instruction.safety_protocols.trigger_words:
-            if trigger in user_message.lower():
-                safety_msg = self.instruction.safety_protocols.response_template
-                self.chat_history.append({"role": "model", "parts": [{"text": safety_msg}]})
-                return safety_msg
+        self.last_safety_matches = self.safety_matcher.scan(user_message)
+        if self.last_safety_matches:
+            safety_msg = self.instruction.safety_protocols.response_template
+            self._append("model", safety_msg)
+            return safety_msg
         return None
 
+    def add_model_message(self, model_message: str) -> None:
+        if model_message:
+            self._append("model", model_message)
+
+    def _append(self, role: str, text: str) -> None:
+        self.chat_history.append({"role": role, "parts": [{"text": text}]})
+        if self.store is not None:
+            self.store.append(self.session_id, role, text)
+
+    def sync(self) -> None:
+        """
+        Bring chat_history up to date with the store: the recent history on
+        first use, then whatever other worker processes added since.
+        Called with the session lock held, before each turn.
+
+        A first load also restores the rolling summary, its pinned entries,
+        and only the turns the summary does not already cover.
+        """
+        if self.store is None:
+            return
+        if self.last_turn_id is None:
+            pinned, from_id = [], 0
+            saved = self.store.load_summary(self.session_id)
+            if saved is not None:
+                self.summary, self.summarized_tokens, pinned, from_id = saved
+            entries, self.last_turn_id = self.store.recent(self.session_id, self.max_turns, from_id)
+            self.chat_history = pinned + entries
+            return
+        entries, self.last_turn_id = self.store.since(self.session_id, self.last_turn_id)
+        self.chat_history.extend(entries)
+
+    async def sync_async(self) -> None:
+        """
+        sync for the asyncio paths: the store reads, and the flush a first
+        load waits for, run on a worker thread instead of the event loop.
+        """
+        if self.store is not None:
+            await asyncio.to_thread(self.sync)
+
+    def trim_history(self) -> int:
+        """
+        Keep the last `max_turns` user turns (and the model replies that
+        follow them), and any pinned entries before them. Returns the number
+        of entries dropped.
+        """
+        if not self.max_turns or self.max_turns < 1:
+            return 0
+        user_indices = [
+            i for i, entry in enumerate(self.chat_history)
+            if entry["role"] == "user"
+        ]
+        if len(user_indices) <= self.max_turns:
+            return 0
+        cut = user_indices[-self.max_turns]
+        kept = [entry for i, entry in enumerate(self.chat_history[:cut]) if self._is_pinned(i)]
+        self.chat_history[:cut] = kept
+        return cut - len(kept)
+
+    def prompt_history(self) -> List[Dict]:
+        """
+        chat_history as sent to the model: the rolling summary, if any, is
+        prepended to the first user turn.
+        """
+        if not self.summary:
+            return self.chat_history
+        summary_text = f"{SUMMARY_HEADER}{self.summary}"
+        if self.chat_history and self.chat_history[0]["role"] == "user":
+            first = self.chat_history[0]["parts"][0]["text"]
+            head = {"role": "user", "parts": [{"text": f"{summary_text}\n\n{first}"}]}
+            return [head] + self.chat_history[1:]
+        return [{"role": "user", "parts": [{"text": summary_text}]}] + self.chat_history
+
+    def _is_pinned(self, index: int) -> bool:
+        """
+        Safety-relevant entries stay verbatim: user turns that trip the
+        safety matcher, the safety template and the replies to those turns.
+        """
+        entry = self.chat_history[index]
+        text = entry["parts"][0]["text"]
+        if entry["role"] == "user":
+            return bool(self.safety_matcher.scan(text))
+        if text == self.instruction.safety_protocols.response_template:
+            return True
+        for previous in reversed(self.chat_history[:index]):
+            if previous["role"] == "user":
+                return bool(self.safety_matcher.scan(previous["parts"][0]["text"]))
+        return False
+
+    def _begin_turn(self) -> None:
+        self.sync()
+        self._apply_compaction()
+
+    async def _begin_turn_async(self) -> None:
+        # With a store, applying a summary also writes it, so the whole
+        # step runs on a worker thread instead of the event loop.
+        if self.store is not None:
+            await asyncio.to_thread(self._begin_turn)
+        else:
+            self._apply_compaction()
+
+    def _end_turn(self) -> None:
+        self._schedule_compaction()
+
+    def _apply_compaction(self) -> None:
+        """
+        Swap in a finished summary. It replaces the entries it was built
+        from, provided they are still at the front of the history, and is
+        saved with the session so a reload does not bring those entries back.
+        """
+        if self._compaction is None or not self._compaction[0].done():
+            return
+        future, replaced, pinned = self._compaction
+        self._compaction = None
+        try:
+            summary = future.result()
+        except Exception as e:
+            logger.warning("History summary failed, keeping turns verbatim: %s", e)
+            return
+        n = len(replaced)
+        if len(self.chat_history) < n or any(a is not b for a, b in zip(self.chat_history, replaced)):
+            self.compactor.record_discarded()
+            return
+        self.summarized_tokens += estimate_tokens(replaced) - estimate_tokens(pinned)
+        self.chat_history = pinned + self.chat_history[n:]
+        self.summary = summary
+        self.compactor.record_applied(n - len(pinned))
+        if self.store is not None:
+            self.store.save_summary(
+                self.session_id, summary, self.summarized_tokens, pinned, len(self.chat_history) - len(pinned),
+            )
+
+    def _schedule_compaction(self) -> None:
+        if self.compactor is None or self._compaction is not None:
+            return
+        plan = self.compactor.plan(self.chat_history, self.summary, self._is_pinned)
+        if plan is None:
+            return
+        replaced, pinned, folded = plan
+        self._compaction = (self.compactor.submit(self.summary, folded), replaced, pinned)
+
+    def _prompt(self) -> List[Dict]:
+        """
+        The history for this turn's model call; records its estimated size
+        and the tokens the summary saves.
+        """
+        prompt = self.prompt_history()
+        prompt_tokens = estimate_tokens(prompt)
+        saved = max(0, self.summarized_tokens - len(self.summary) // 4) if self.summary else 0
+        self.last_context = {
+            "prompt_tokens_estimate": prompt_tokens,
+            "saved_tokens_estimate": saved,
+            "summarized": bool(self.summary),
+        }
+        if self.compactor is not None:
+            self.compactor.record_turn(prompt_tokens, saved)
+            logger.info("Prompt ~%d tokens, ~%d saved by the history summary", prompt_tokens, saved)
+        return prompt
+
     def generate_solution(self) -> str:
-        return get_gemini_chat_completion(self.chat_history)
+        return get_gemini_chat_completion(self._prompt())
+
+    async def generate_solution_async(self) -> str:
+        return await get_gemini_chat_completion_async(self._prompt())
+
+    def _follow_up_prompt(self) -> Optional[List[Dict]]:
+        """
+        The prompt for a reply after the safety template, or None when the
+        history no longer ends with it (the user has moved on).
+        """
+        template = self.instruction.safety_protocols.response_template
+        if not self.chat_history or self.chat_history[-1]["parts"][0]["text"] != template:
+            return None
+        return self._prompt() + [{"role": "user", "parts": [{"text": FOLLOW_UP_REQUEST}]}]
+
+    def follow_up(self) -> Optional[str]:
+        """
+        A model-written reply to a turn that was answered with the safety
+        template. Runs after that turn, so the template is never held up
+        by Gemini. Returns None if there is nothing to follow up on.
+        """
+        with self.lock:
+            self._begin_turn()
+            prompt = self._follow_up_prompt()
+            if prompt is None:
+                return None
+            reply = get_gemini_chat_completion(prompt)
+            self.add_model_message(reply)
+            self._end_turn()
+        return reply
+
+    async def follow_up_async(self) -> Optional[str]:
+        async with self.async_lock:
+            await self._begin_turn_async()
+            prompt = self._follow_up_prompt()
+            if prompt is None:
+                return None
+            reply = await get_gemini_chat_completion_async(prompt)
+            self.add_model_message(reply)
+            self._end_turn()
+        return reply
 
     def run_chat(self, user_messages: List[str]) -> dict:
         phase_intro = self.get_phase_intro()
         safety_warnings = []
-        for user_message in user_messages:
-            warning = self.add_user_message(user_message)
-            if warning:
-                safety_warnings.append(warning)
-        solution = self.generate_solution()
+        safety_matches = []
+        with self.lock:
+            self._begin_turn()
+            for user_message in user_messages:
+                warning = self.add_user_message(user_message)
+                if warning:
+                    safety_warnings.append(warning)
+                    safety_matches.extend(self.last_safety_matches)
+            self.trim_history()
+            if safety_warnings:
+                # The safety template is the reply; see follow_up.
+                solution = safety_warnings[-1]
+            else:
+                solution = self.generate_solution()
+                self.add_model_message(solution)
+            self._end_turn()
+        return {
+            "phase_intro": phase_intro,
+            "safety_warnings": safety_warnings,
+            "safety_matches": [
+                {"phrase": m.phrase, "category": m.category} for m in safety_matches
+            ],
+            "solution": solution,
+            "crisis": bool(safety_warnings),
+            "context": dict(self.last_context),
+        }
+
+    async def run_chat_async(self, user_messages: List[str]) -> dict:
+        phase_intro = self.get_phase_intro()
+        safety_warnings = []
+        safety_matches = []
+        async with self.async_lock:
+            await self._begin_turn_async()
+            for user_message in user_messages:
+                warning = self.add_user_message(user_message)
+                if warning:
+                    safety_warnings.append(warning)
+                    safety_matches.extend(self.last_safety_matches)
+            self.trim_history()
+            if safety_warnings:
+                solution = safety_warnings[-1]
+            else:
+                solution = await self.generate_solution_async()
+                self.add_model_message(solution)
+            self._end_turn()
         return {
             "phase_intro": phase_intro,
             "safety_warnings": safety_warnings,
-            "solution": solution
-        }
\ No newline at end of file
+            "safety_matches": [
+                {"phrase": m.phrase, "category": m.category} for m in safety_matches
+            ],
+            "solution": solution,
+            "crisis": bool(safety_warnings),
+            "context": dict(self.last_context),
+        }
+
+    def stream_chat(self, user_messages: List[str]):
+        """
+        Like run_chat, but yields the reply chunk by chunk as Gemini produces it.
+        The complete reply is committed to chat_history once the stream ends.
+        A safety hit yields the safety template alone, as in run_chat.
+        """
+        with self.lock:
+            self._begin_turn()
+            warnings = [self.add_user_message(user_message) for user_message in user_messages]
+            self.trim_history()
+            if any(warnings):
+                yield [warning for warning in warnings if warning][-1]
+                self._end_turn()
+                return
+            parts = []
+            for chunk in stream_gemini_chat_completion(self._prompt()):
+                parts.append(chunk)
+                yield chunk
+            self.add_model_message("".join(parts))
+            self._end_turn()
+
+    async def stream_chat_async(self, user_messages: List[str]):
+        async with self.async_lock:
+            await self._begin_turn_async()
+            warnings = [self.add_user_message(user_message) for user_message in user_messages]
+            self.trim_history()
+            if any(warnings):
+                yield [warning for warning in warnings if warning][-1]
+                self._end_turn()
+                return
+            parts = []
+            async for chunk in stream_gemini_chat_completion_async(self._prompt()):
+                parts.append(chunk)
+                yield chunk
+            self.add_model_message("".join(parts))
+            self._end_turn()
@@ -1,22 +1,300 @@
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
+from collections import deque
+from datetime import timedelta
 from dotenv import load_dotenv
-import google.generativeai as genai
+from backend.system_instruction import get_advanced_therapist_instruction, build_system_prompt
+from backend.response_cache import ResponseCache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY not found in environment variables.")
 
-genai.configure(api_key=GEMINI_API_KEY)
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+GENERATION_CONFIG = {
+    "temperature": 0,
+    "max_output_tokens": 2048
+}
+
+# Explicit context caching of the system prompt (where the model supports it)
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "1") == "1"
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+# Replies are deterministic (temperature 0), so history-free and opt-in
+# turns can be answered from cache. The namespace ties entries to the
+# model, prompt and generation settings that produced them.
+_response_cache = None
+if os.getenv("LLM_CACHE", "1") == "1":
+    _response_cache = ResponseCache(namespace=json.dumps([
+        MODEL_NAME,
+        hashlib.sha256(build_system_prompt(get_advanced_therapist_instruction()).encode("utf-8")).hexdigest(),
+        GENERATION_CONFIG,
+    ], sort_keys=True))
+
+_genai = None
+_model = None
+_model_expires_at = None
+_model_lock = threading.Lock()
+# The live CachedContent behind _model, if any (see get_model).
+_cached_content = None
+
+_usage_lock = threading.Lock()
+_usage = {
+    "calls": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+    "output_tokens": 0,
+    "context_cache": "disabled",
+}
+_recent_prompt_tokens = deque(maxlen=100)
+
+SUMMARY_INSTRUCTION = (
+    "You keep a running summary of a supportive mental-health conversation for the counsellor "
+    "who continues it. Merge the previous summary and the new turns into one summary of at most "
+    "150 words, in the third person: the user's concerns and feelings, relevant life context, "
+    "techniques and coping strategies discussed, what helped, and agreed next steps. "
+    "Keep any mention of risk or safety concerns. Do not invent details."
+)
+SUMMARY_CONFIG = {
+    "temperature": 0,
+    "max_output_tokens": 400
+}
+_summary_model = None
+_summary_usage = {"calls": 0, "prompt_tokens": 0, "output_tokens": 0}
+
+def _load_genai():
+    """
+    Import and configure google.generativeai on first use. The import takes
+    about a second, so it is kept off the module import path.
+    """
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+def _build_model():
+    """
+    Build the model once with the therapist prompt as a real system
+    instruction. When context caching is on, the prompt is uploaded once as
+    cached content and later calls only reference it.
+    """
+    global _cached_content
+    _cached_content = None
+    genai = _load_genai()
+    system_prompt = build_system_prompt(get_advanced_therapist_instruction())
+    if CONTEXT_CACHE_ENABLED:
+        try:
+            from google.generativeai import caching
+            cached = caching.CachedContent.create(
+                model=f"models/{MODEL_NAME}",
+                display_name="therapist-system-prompt",
+                system_instruction=system_prompt,
+                ttl=timedelta(seconds=CONTEXT_CACHE_TTL),
+            )
+            _usage["context_cache"] = "active"
+            _cached_content = cached
+            return genai.GenerativeModel.from_cached_content(cached), time.monotonic() + CONTEXT_CACHE_TTL - 60
+        except Exception as e:
+            # Prompt too short for explicit caching, or not supported by this model.
+            logger.warning("Gemini context cache unavailable, using plain system instruction: %s", e)
+            _usage["context_cache"] = "unavailable"
+    return genai.GenerativeModel(MODEL_NAME, system_instruction=system_prompt), None
+
+def _extend_context_cache() -> bool:
+    """
+    Push back the expiry of the live cached content, so the prompt is not
+    uploaded again. False if it could not be extended.
+    """
+    try:
+        _cached_content.update(ttl=timedelta(seconds=CONTEXT_CACHE_TTL))
+        return True
+    except Exception as e:
+        logger.warning("Could not extend the Gemini context cache, creating a new one: %s", e)
+        return False
+
+def _delete_context_cache(cached) -> None:
+    try:
+        cached.delete()
+    except Exception as e:
+        # It still expires on its own at the end of its TTL.
+        logger.warning("Could not delete the old Gemini context cache %s: %s", getattr(cached, "name", ""), e)
+
+def get_model():
+    """
+    Return the shared model handle. When its context cache is about to
+    expire, the cache's TTL is extended; if that fails, the model is rebuilt
+    on a new cache and the old one is deleted.
+    """
+    global _model, _model_expires_at
+    if _model is not None and (_model_expires_at is None or time.monotonic() < _model_expires_at):
+        return _model
+    with _model_lock:
+        if _model is None or (_model_expires_at is not None and time.monotonic() >= _model_expires_at):
+            if _model is not None and _cached_content is not None and _extend_context_cache():
+                _model_expires_at = time.monotonic() + CONTEXT_CACHE_TTL - 60
+            else:
+                old = _cached_content
+                _model, _model_expires_at = _build_model()
+                if old is not None and old is not _cached_content:
+                    _delete_context_cache(old)
+        return _model
+
+def _record_usage(response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    with _usage_lock:
+        _usage["calls"] += 1
+        _usage["prompt_tokens"] += prompt_tokens
+        _usage["cached_tokens"] += getattr(usage, "cached_content_token_count", 0) or 0
+        _usage["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+        _recent_prompt_tokens.append(prompt_tokens)
+
+def get_token_usage() -> dict:
+    """
+    Prompt/cached/output token totals across calls, plus the recent per-call prompt sizes.
+    """
+    with _usage_lock:
+        recent = list(_recent_prompt_tokens)
+        return {
+            **_usage,
+            "last_prompt_tokens": recent[-1] if recent else None,
+            "avg_recent_prompt_tokens": round(sum(recent) / len(recent), 1) if recent else None,
+        }
+
+def get_summary_usage() -> dict:
+    with _usage_lock:
+        return dict(_summary_usage)
+
+def get_summary_model():
+    """
+    Model handle for history summaries. It has its own system instruction,
+    so summary calls neither use nor count against the therapist model.
+    """
+    global _summary_model
+    if _summary_model is None:
+        with _model_lock:
+            if _summary_model is None:
+                _summary_model = _load_genai().GenerativeModel(MODEL_NAME, system_instruction=SUMMARY_INSTRUCTION)
+    return _summary_model
+
+def summarize_history(previous_summary: str, entries: list) -> str:
+    """
+    Fold `entries` (chat_history format) into `previous_summary`.
+    """
+    lines = []
+    if previous_summary:
+        lines.append(f"Previous summary:\n{previous_summary}\n")
+    lines.append("New turns:")
+    for entry in entries:
+        speaker = "User" if entry["role"] == "user" else "Counsellor"
+        lines.append(f"{speaker}: {entry['parts'][0]['text']}")
+    response = get_summary_model().generate_content(
+        [{"role": "user", "parts": [{"text": "\n".join(lines)}]}],
+        generation_config=SUMMARY_CONFIG
+    )
+    usage = getattr(response, "usage_metadata", None)
+    with _usage_lock:
+        _summary_usage["calls"] += 1
+        if usage is not None:
+            _summary_usage["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+            _summary_usage["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+    return response.text.strip()
+
+def get_response_cache_stats():
+    return _response_cache.stats() if _response_cache is not None else None
+
+def _cache_lookup(chat_history: list):
+    """
+    Return (key, cached reply). The key is None when the history is not cacheable.
+    """
+    if _response_cache is None:
+        return None, None
+    key = _response_cache.key(chat_history)
+    return key, _response_cache.get(key)
+
+def _cache_store(key, text: str) -> None:
+    if _response_cache is not None:
+        _response_cache.put(key, text)
 
 def get_gemini_chat_completion(chat_history: list) -> str:
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content(
+    key, cached = _cache_lookup(chat_history)
+    if cached is not None:
+        return cached
+    response = get_model().generate_content(
         chat_history,
-        generation_config={
-            "temperature": 0,
-            "max_output_tokens": 2048
-        }
+        generation_config=GENERATION_CONFIG
+    )
+    _record_usage(response)
+    _cache_store(key, response.text)
+    return response.text
+
+async def get_gemini_chat_completion_async(chat_history: list) -> str:
+    key, cached = _cache_lookup(chat_history)
+    if cached is not None:
+        return cached
+    response = await get_model().generate_content_async(
+        chat_history,
+        generation_config=GENERATION_CONFIG
+    )
+    _record_usage(response)
+    _cache_store(key, response.text)
+    return response.text
+
+def stream_gemini_chat_completion(chat_history: list):
+    """
+    Yield the reply text chunk by chunk as Gemini generates it. A cached
+    reply is yielded as a single chunk.
+    """
+    key, cached = _cache_lookup(chat_history)
+    if cached is not None:
+        yield cached
+        return
+    response = get_model().generate_content(
+        chat_history,
+        generation_config=GENERATION_CONFIG,
+        stream=True
+    )
+    last = None
+    parts = []
+    for chunk in response:
+        last = chunk
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    if last is not None:
+        _record_usage(last)
+    _cache_store(key, "".join(parts))
+
+async def stream_gemini_chat_completion_async(chat_history: list):
+    key, cached = _cache_lookup(chat_history)
+    if cached is not None:
+        yield cached
+        return
+    response = await get_model().generate_content_async(
+        chat_history,
+        generation_config=GENERATION_CONFIG,
+        stream=True
     )
-    return response.text
\ No newline at end of file
+    last = None
+    parts = []
+    async for chunk in response:
+        last = chunk
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    if last is not None:
+        _record_usage(last)
+    _cache_store(key, "".join(parts))
@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADER = "Summary of the earlier part of this session:\n"
+
+
+def estimate_tokens(entries: List[Dict]) -> int:
+    """
+    Rough prompt size of chat_history entries: about four characters per
+    token plus a little framing per entry. Good enough to budget with, and
+    needs no tokenizer or API call.
+    """
+    return sum(len(entry["parts"][0]["text"]) // 4 + 4 for entry in entries)
+
+
+class HistoryCompactor:
+    """
+    Folds old turns of long sessions into a rolling summary.
+
+    Once a session's prompt is estimated above `token_budget` tokens, every
+    entry before its last `keep_turns` user turns is handed to `summarize`
+    on a background thread, together with the current summary. The session
+    swaps the new summary in at the start of its next turn, so the model
+    call for the summary never sits on a user's request. Entries the
+    session marks as pinned (safety-relevant ones) are never summarized.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str, List[Dict]], str],
+        token_budget: int = None,
+        keep_turns: int = None,
+        workers: int = None,
+    ):
+        if token_budget is None:
+            token_budget = int(os.getenv("SESSION_TOKEN_BUDGET", "3000"))
+        if keep_turns is None:
+            keep_turns = int(os.getenv("SESSION_SUMMARY_KEEP_TURNS", "4"))
+        if workers is None:
+            workers = int(os.getenv("SESSION_SUMMARY_WORKERS", "1"))
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_turns = max(1, keep_turns)
+        self.workers = max(1, workers)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.applied = 0
+        self.discarded = 0
+        self.failed = 0
+        self.summarized_entries = 0
+        self.summary_ms = deque(maxlen=100)
+        self._recent_turns = deque(maxlen=100)
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0
+
+    def plan(self, history: List[Dict], summary: str, pinned: Callable[[int], bool]) -> Optional[Tuple[List[Dict], List[Dict], List[Dict]]]:
+        """
+        Decide whether `history` needs compacting. Returns (entries to
+        replace, pinned entries among them, entries to summarize), or None.
+        """
+        if not self.enabled:
+            return None
+        if estimate_tokens(history) + len(summary) // 4 <= self.token_budget:
+            return None
+        user_indices = [i for i, entry in enumerate(history) if entry["role"] == "user"]
+        if len(user_indices) <= self.keep_turns:
+            return None
+        old = history[:user_indices[-self.keep_turns]]
+        kept = [entry for i, entry in enumerate(old) if pinned(i)]
+        folded = [entry for i, entry in enumerate(old) if not pinned(i)]
+        if not folded:
+            return None
+        return old, kept, folded
+
+    def submit(self, summary: str, entries: List[Dict]) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summarizer")
+            self.scheduled += 1
+        return self._executor.submit(self._summarize, summary, entries)
+
+    def _summarize(self, summary: str, entries: List[Dict]) -> str:
+        started = time.perf_counter()
+        try:
+            result = self.summarize(summary, entries)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        if not result:
+            with self._lock:
+                self.failed += 1
+            raise ValueError("Summarizer returned an empty summary.")
+        with self._lock:
+            self.summary_ms.append((time.perf_counter() - started) * 1000)
+        return result
+
+    def record_applied(self, entries: int) -> None:
+        with self._lock:
+            self.applied += 1
+            self.summarized_entries += entries
+
+    def record_discarded(self) -> None:
+        with self._lock:
+            self.discarded += 1
+
+    def record_turn(self, prompt_tokens: int, saved_tokens: int) -> None:
+        with self._lock:
+            self._recent_turns.append((prompt_tokens, saved_tokens))
+
+    def stats(self) -> dict:
+        with self._lock:
+            turns = list(self._recent_turns)
+            durations = list(self.summary_ms)
+            return {
+                "token_budget": self.token_budget,
+                "keep_turns": self.keep_turns,
+                "scheduled": self.scheduled,
+                "applied": self.applied,
+                "discarded": self.discarded,
+                "failed": self.failed,
+                "summarized_entries": self.summarized_entries,
+                "avg_summary_ms": round(sum(durations) / len(durations), 1) if durations else None,
+                "avg_recent_prompt_tokens": round(sum(t for t, _ in turns) / len(turns), 1) if turns else None,
+                "avg_recent_saved_tokens": round(sum(s for _, s in turns) / len(turns), 1) if turns else None,
+            }
@@ -0,0 +1,397 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend.request_context import request_id_var
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("stt", "llm", "tts")
+# Event each stage publishes when it finishes.
+STAGE_EVENTS = {"stt": "transcript", "llm": "content", "tts": "audio"}
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+# Turns that tripped the safety matcher: ahead of everything, never shed.
+CRISIS_PRIORITY = -1
+TERMINAL_STATES = ("done", "failed", "rejected", "expired")
+
+
+class JobRejected(RuntimeError):
+    """
+    Raised by JobManager.submit when a stage the job needs is saturated.
+    """
+
+    def __init__(self, stage: str, queue_depth: int, max_queue: int):
+        super().__init__(f"Stage {stage} is saturated ({queue_depth}/{max_queue} jobs waiting).")
+        self.stage = stage
+        self.queue_depth = queue_depth
+        self.max_queue = max_queue
+
+
+def parse_priority(value) -> int:
+    """
+    "high", "normal" or "low" (or 0-2) to a priority, lower runs first.
+    """
+    if value is None or value == "":
+        return PRIORITIES["normal"]
+    if isinstance(value, str) and value.lower() in PRIORITIES:
+        return PRIORITIES[value.lower()]
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("priority must be one of high, normal, low.")
+    if number not in PRIORITIES.values():
+        raise ValueError("priority must be one of high, normal, low.")
+    return number
+
+
+class Job:
+    """
+    One turn moving through the stage queues.
+
+    Every stage result is appended to `events` as (index, event, data), so
+    pollers and subscribers can pick up exactly what they have not seen.
+    """
+
+    def __init__(self, stages: List[str], payload: dict, session_id: str = None, priority: int = 1, request_id: str = "-"):
+        self.id = uuid.uuid4().hex
+        # The submitting request's id, carried into the worker threads' logs.
+        self.request_id = request_id
+        self.stages = stages
+        self.payload = payload
+        self.session_id = session_id
+        self.priority = priority
+        self.state = "queued"
+        self.stage = stages[0]
+        self.result: Dict = {}
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.enqueued = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.stage_ms: Dict[str, float] = {}
+        self.events: List[Tuple[int, str, dict]] = []
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def publish(self, event: str, data: dict, state: str = None) -> None:
+        with self._cond:
+            if state is not None:
+                # Set together with the final event, so nobody sees a
+                # finished job whose last event is still missing.
+                self.state = state
+                self.finished_at = time.time()
+            self.events.append((len(self.events) + 1, event, data))
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def events_after(self, index: int) -> List[Tuple[int, str, dict]]:
+        with self._cond:
+            return self.events[index:]
+
+    def wait(self, index: int, timeout: float) -> List[Tuple[int, str, dict]]:
+        """
+        Block until there are events after `index` (or the timeout passes).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > index, timeout)
+            return self.events[index:]
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def finish(self, state: str, error: str = None) -> None:
+        self.error = error
+        self.payload = {}
+        if state == "done":
+            self.publish("done", dict(self.result, stage_ms=dict(self.stage_ms)), state=state)
+        else:
+            self.publish("error", {"error": error, "state": state, "stage": self.stage}, state=state)
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "stage": None if self.finished else self.stage,
+            "priority": self.priority,
+            "session_id": self.session_id,
+            "result": dict(self.result),
+            "error": self.error,
+            "stage_ms": dict(self.stage_ms),
+            "events": len(self.events),
+            "created": self.created,
+            "finished": self.finished_at,
+        }
+
+
+class StageQueue:
+    """
+    Priority queue of jobs waiting for one stage, bounded to `max_queue`.
+    """
+
+    def __init__(self, name: str, max_queue: int):
+        self.name = name
+        self.max_queue = max_queue
+        self._heap: List[Tuple[int, int, Job]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def put(self, job: Job, admit: bool = False) -> Optional[Job]:
+        """
+        Queue `job`. With `admit`, a full queue either drops its lowest
+        priority job to make room (and returns it) or raises JobRejected.
+        Jobs already admitted are always accepted, so no work is lost
+        between stages.
+        """
+        evicted = None
+        with self._cond:
+            if admit and len(self._heap) >= self.max_queue:
+                worst = max(self._heap, key=lambda item: (item[0], item[1])) if self._heap else None
+                if worst is None or worst[0] <= job.priority:
+                    raise JobRejected(self.name, len(self._heap), self.max_queue)
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                evicted = worst[2]
+            job.enqueued = time.monotonic()
+            heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+            self._cond.notify()
+        return evicted
+
+    def is_full(self) -> bool:
+        with self._cond:
+            return len(self._heap) >= self.max_queue
+
+    def ahead_of(self, priority: int) -> int:
+        """
+        The number of queued jobs that run before a new job at `priority`.
+        """
+        with self._cond:
+            return sum(1 for item in self._heap if item[0] <= priority)
+
+    def get(self) -> Optional[Job]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._heap or self.closed)
+            if self.closed:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class JobManager:
+    """
+    Runs turns as jobs through per-stage queues: speech-to-text, the LLM
+    and text-to-speech.
+
+    Each stage has a fixed number of worker threads (its concurrency) and a
+    priority queue; higher-priority jobs are picked first. A job is only
+    admitted when every queue on its path has room, except that a new job
+    may push out a lower-priority job still waiting for its first stage.
+    Crisis jobs (CRISIS_PRIORITY) skip admission control altogether: they
+    are always accepted and run ahead of everything queued.
+    Jobs that waited longer than `queue_timeout` seconds for a stage expire
+    instead of running late. Finished jobs are kept for `ttl` seconds.
+
+    `handlers` maps each stage to a function taking the job and returning
+    a dict, which is merged into job.result and published as the stage's
+    event.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[Job], dict]],
+        concurrency: Dict[str, int] = None,
+        max_queue: int = None,
+        queue_timeout: float = None,
+        ttl: float = None,
+    ):
+        if concurrency is None:
+            concurrency = {
+                "stt": int(os.getenv("JOB_STT_CONCURRENCY", "2")),
+                "llm": int(os.getenv("JOB_LLM_CONCURRENCY", "16")),
+                "tts": int(os.getenv("JOB_TTS_CONCURRENCY", "8")),
+            }
+        if max_queue is None:
+            max_queue = int(os.getenv("JOB_MAX_QUEUE", "32"))
+        if queue_timeout is None:
+            queue_timeout = float(os.getenv("JOB_QUEUE_TIMEOUT", "60"))
+        if ttl is None:
+            ttl = float(os.getenv("JOB_TTL", "600"))
+        self.handlers = handlers
+        self.concurrency = {stage: max(1, concurrency.get(stage, 1)) for stage in STAGES}
+        self.queues = {stage: StageQueue(stage, max_queue) for stage in STAGES}
+        self.queue_timeout = queue_timeout
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._busy = {stage: 0 for stage in STAGES}
+        self.submitted = 0
+        self.crisis = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for stage in STAGES:
+                for i in range(self.concurrency[stage]):
+                    thread = threading.Thread(target=self._work, args=(stage,), name=f"job-{stage}-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def stop(self) -> None:
+        for queue in self.queues.values():
+            queue.close()
+
+    def submit(self, payload: dict, stages: List[str], session_id: str = None, priority: int = 1) -> Job:
+        """
+        Admit a job that runs `stages` in order; raises JobRejected when a
+        stage on its path is saturated.
+        """
+        if not stages or any(stage not in STAGES for stage in stages):
+            raise ValueError(f"stages must be a sequence of {', '.join(STAGES)}.")
+        self.start()
+        job = Job(stages, payload, session_id=session_id, priority=priority, request_id=request_id_var.get())
+        crisis = priority <= CRISIS_PRIORITY
+        try:
+            for stage in stages[1:]:
+                if not crisis and self.queues[stage].is_full():
+                    queue = self.queues[stage]
+                    raise JobRejected(stage, len(queue), queue.max_queue)
+            # Published before the job is queued, so a worker's first stage
+            # event can never come ahead of it. A rejected job's id is
+            # never handed out, so nobody sees this event.
+            position = self.queues[stages[0]].ahead_of(priority)
+            job.publish("queued", {"job_id": job.id, "stage": job.stage, "priority": priority, "position": position})
+            evicted = self.queues[stages[0]].put(job, admit=not crisis)
+        except JobRejected:
+            with self._lock:
+                self.rejected += 1
+            raise
+        with self._lock:
+            self._evict_expired()
+            self._jobs[job.id] = job
+            self.submitted += 1
+            if crisis:
+                self.crisis += 1
+            if evicted is not None:
+                self.evicted += 1
+        if evicted is not None:
+            logger.warning("Job %s shed from %s for higher-priority job %s", evicted.id, stages[0], job.id)
+            evicted.finish("rejected", "Shed under load for a higher-priority job. Please try again shortly.")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict_expired(self) -> None:
+        now = time.time()
+        while self._jobs:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.finished_at is None and now - oldest.created <= self.ttl * 2:
+                break
+            if oldest.finished_at is not None and now - oldest.finished_at <= self.ttl:
+                break
+            self._jobs.popitem(last=False)
+
+    def _work(self, stage: str) -> None:
+        queue = self.queues[stage]
+        while True:
+            job = queue.get()
+            if job is None:
+                return
+            waited = time.monotonic() - job.enqueued
+            if self.queue_timeout and waited > self.queue_timeout:
+                with self._lock:
+                    self.expired += 1
+                job.finish("expired", f"Waited {waited:.0f} s for {stage}; please try again.")
+                continue
+            self._run(stage, job)
+
+    def _run(self, stage: str, job: Job) -> None:
+        token = request_id_var.set(job.request_id)
+        try:
+            self._run_stage(stage, job)
+        finally:
+            request_id_var.reset(token)
+
+    def _run_stage(self, stage: str, job: Job) -> None:
+        job.state = "running"
+        job.stage = stage
+        with self._lock:
+            self._busy[stage] += 1
+        started = time.perf_counter()
+        try:
+            output = self.handlers[stage](job) or {}
+        except Exception as e:
+            logger.error("Job %s failed in %s: %s", job.id, stage, e)
+            with self._lock:
+                self.failed += 1
+            job.finish("failed", str(e))
+            return
+        finally:
+            with self._lock:
+                self._busy[stage] -= 1
+            job.stage_ms[stage] = round((time.perf_counter() - started) * 1000, 1)
+        job.result.update(output)
+        job.publish(STAGE_EVENTS[stage], output)
+        position = job.stages.index(stage) + 1
+        if position == len(job.stages):
+            with self._lock:
+                self.completed += 1
+            job.finish("done")
+            return
+        job.state = "queued"
+        job.stage = job.stages[position]
+        self.queues[job.stage].put(job)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "crisis": self.crisis,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "shed": self.evicted,
+                "expired": self.expired,
+                "tracked": len(self._jobs),
+                "stages": {
+                    stage: {
+                        "concurrency": self.concurrency[stage],
+                        "busy": self._busy[stage],
+                        "queued": len(self.queues[stage]),
+                        "max_queue": self.queues[stage].max_queue,
+                    }
+                    for stage in STAGES
+                },
+            }
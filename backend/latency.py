@@ -0,0 +1,43 @@
+import threading
+from collections import deque
+from typing import Dict
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent latency samples (in milliseconds) per metric name
+    and reports simple percentiles over them.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, value_ms: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(value_ms)
+
+    def summary(self) -> dict:
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+        return {name: self._percentiles(values) for name, values in snapshot.items()}
+
+    @staticmethod
+    def _percentiles(values: list) -> dict:
+        if not values:
+            return {"count": 0}
+
+        def pick(q: float) -> float:
+            return round(values[min(len(values) - 1, int(q * len(values)))], 1)
+
+        return {
+            "count": len(values),
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": round(values[-1], 1),
+        }
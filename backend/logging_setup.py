@@ -0,0 +1,169 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from backend.request_context import RequestIdFilter
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+# Long runs of base64 (encoded audio) and credentials that must never reach a log.
+_BASE64_RUN = re.compile(r"[A-Za-z0-9+/]{200,}={0,2}")
+_SECRETS = re.compile(r"(?i)(api[-_]?key|authorization|token)(['\"]?\s*[:=]\s*['\"]?(?:bearer\s+)?)([^\s'\",}]+)")
+# Case-insensitive regex scans are slow; only run _SECRETS when one of these appears.
+_SECRET_HINTS = ("key", "authorization", "token")
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+_stats_lock = threading.Lock()
+_stats = {"dropped": 0, "sampled_out": 0, "truncated": 0, "redacted": 0}
+_listener = None
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def redact(message: str, max_chars: int) -> str:
+    """
+    Replace base64 payloads and credentials, then cut the message to `max_chars`.
+    """
+    redacted = _BASE64_RUN.sub(lambda m: f"<{len(m.group(0))} chars of base64>", message)
+    lowered = redacted.lower()
+    if any(hint in lowered for hint in _SECRET_HINTS):
+        redacted = _SECRETS.sub(r"\1\2<redacted>", redacted)
+    if redacted != message:
+        _count("redacted")
+    if max_chars and len(redacted) > max_chars:
+        _count("truncated")
+        redacted = f"{redacted[:max_chars]}... [{len(redacted) - max_chars} more chars]"
+    return redacted
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Renders the message once in the calling thread, redacted and size-bounded,
+    so the queue never holds large arguments.
+    """
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = redact(record.getMessage(), self.max_chars)
+        record.args = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through only a `rate` fraction of DEBUG (and lower) records.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if random.random() < self.rate:
+            return True
+        _count("sampled_out")
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: when the queue is full the
+    record is dropped and counted.
+    """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count("dropped")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The message is already rendered by RedactingFilter; skip the extra
+        # formatting and copy QueueHandler.prepare would do.
+        if record.exc_info:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> dict:
+    """
+    Parse LOG_LEVELS, e.g. "backend.text_to_speech=DEBUG,werkzeug=WARNING".
+    """
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(stream=None) -> QueueListener:
+    """
+    Send all logging through a bounded queue to a background writer thread.
+
+    Configured from the environment:
+    - LOG_LEVEL: root level (default INFO)
+    - LOG_LEVELS: per-logger overrides, "name=LEVEL,name=LEVEL"
+    - LOG_MAX_CHARS: longest message kept (default 2000)
+    - LOG_DEBUG_SAMPLE: fraction of DEBUG records kept (default 1.0)
+    - LOG_QUEUE_SIZE: records buffered before new ones are dropped (default 10000)
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+    queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_DEBUG_SAMPLE", "1.0"))))
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(RedactingFilter(int(os.getenv("LOG_MAX_CHARS", "2000"))))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_levels(os.getenv("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """
+    Flush queued records and stop the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    if _listener is not None:
+        stats["queued"] = _listener.queue.qsize()
+    return stats
@@ -0,0 +1,232 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; covers a cached TTS hit (a few ms) up to a slow Whisper job.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Holds metrics and renders them in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "therapist_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    ["stage"],
+))
+STAGE_ERRORS = registry.register(Counter(
+    "therapist_stage_errors_total",
+    "Pipeline stage calls that raised an error.",
+    ["stage"],
+))
+STAGE_IN_FLIGHT = registry.register(Gauge(
+    "therapist_stage_in_flight",
+    "Pipeline stage calls currently running.",
+    ["stage"],
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    "therapist_request_duration_seconds",
+    "Time from request start until the response was ready; streamed bodies are covered by the stage metrics.",
+    ["endpoint"],
+))
+REQUESTS = registry.register(Counter(
+    "therapist_requests_total",
+    "Requests by endpoint and response status.",
+    ["endpoint", "status"],
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "therapist_requests_in_flight",
+    "Requests currently being handled.",
+))
+TTS_AUDIO_BYTES = registry.register(Histogram(
+    "therapist_tts_audio_bytes",
+    "Bytes of synthesized audio sent per turn, by output profile.",
+    ["profile"],
+    buckets=(8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576, 2097152, 4194304),
+))
+TIME_TO_AUDIO_SECONDS = registry.register(Histogram(
+    "therapist_time_to_audio_seconds",
+    "Time from the start of a turn until its first audio was ready, by output profile.",
+    ["profile"],
+))
+FALLBACKS = registry.register(Counter(
+    "therapist_fallbacks_total",
+    "Replies replaced by the canned fallback after a failure.",
+    ["endpoint"],
+))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class stage:
+    """
+    Context manager that times a pipeline stage, tracks it as in flight and
+    counts it as an error if it raises.
+    """
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(stage=self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, stage=self.name)
+        STAGE_IN_FLIGHT.dec(stage=self.name)
+        # Cancellation and generator close are not stage failures.
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS.inc(stage=self.name)
+        return False
+
+
+def timed(name: str, fn):
+    """
+    Wrap a function (sync or async) so each call is recorded as stage `name`.
+    """
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with stage(name):
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """
+    Record a duration measured elsewhere, such as time to first token.
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
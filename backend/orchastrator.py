@@ -1,11 +1,99 @@
+import os
 from backend.system_instruction import get_advanced_therapist_instruction, get_therapeutic_techniques
 from backend.conversation import GeminiChatSession
+from backend.session_registry import SessionRegistry
+from backend.safety_matcher import SafetyMatcher
+from backend.session_store import create_session_store
+from backend.history_compactor import HistoryCompactor
+from backend.gemini_client import get_summary_usage, summarize_history
 
 class Orchestrator:
     def __init__(self):
         self.instruction = get_advanced_therapist_instruction()
         self.techniques = get_therapeutic_techniques()
-        self.session = GeminiChatSession(self.instruction, self.techniques)
+        self.safety_matcher = SafetyMatcher.from_protocol(self.instruction.safety_protocols)
+        lexicon_path = os.getenv("SAFETY_LEXICON_PATH")
+        if lexicon_path:
+            # Extend the built-in triggers with a clinical lexicon file.
+            self.safety_matcher = SafetyMatcher.from_lexicon_file(lexicon_path, base=self.safety_matcher.phrases())
+        self.store = create_session_store()
+        self.compactor = HistoryCompactor(summarize_history)
+        self.sessions = SessionRegistry(self.new_session)
 
-    def start_session(self, user_messages: list) -> dict:
-        return self.session.run_chat(user_messages)
\ No newline at end of file
+    def new_session(self, session_id: str = None) -> GeminiChatSession:
+        return GeminiChatSession(
+            self.instruction,
+            self.techniques,
+            safety_matcher=self.safety_matcher,
+            session_id=session_id,
+            store=self.store,
+            compactor=self.compactor,
+        )
+
+    def _session(self, session_id: str = None) -> GeminiChatSession:
+        if not session_id:
+            # A one-off session, in memory only: callers without an id never
+            # share, or persist, a history.
+            return self.new_session()
+        return self.sessions.get(session_id)
+
+    def compaction_stats(self) -> dict:
+        return dict(self.compactor.stats(), usage=get_summary_usage())
+
+    def store_stats(self) -> dict:
+        if self.store is None:
+            return {"backend": "memory"}
+        return self.store.stats()
+
+    @property
+    def crisis_template(self) -> str:
+        return self.instruction.safety_protocols.response_template
+
+    def crisis_matches(self, user_messages: list) -> list:
+        """
+        Safety matches in `user_messages`, checked without touching the
+        session, so a crisis can be answered before the turn is queued.
+        """
+        return [match for message in user_messages for match in self.safety_matcher.scan(message)]
+
+    def record_crisis_turn(self, user_messages: list, session_id: str = None) -> None:
+        """
+        Add a crisis turn (answered with the safety template, no model
+        call) to the session. Cheap, so it is done before the fast path
+        replies and no later turn can overtake it.
+        """
+        self._session(session_id).run_chat(user_messages)
+
+    async def record_crisis_turn_async(self, user_messages: list, session_id: str = None) -> None:
+        await self._session(session_id).run_chat_async(user_messages)
+
+    def crisis_follow_up(self, session_id: str = None):
+        """
+        The model-written reply to a recorded crisis turn, or None if the
+        user has moved on since. Without a session_id there is no recorded
+        turn to follow up on, so it is also None.
+        """
+        if not session_id:
+            return None
+        return self._session(session_id).follow_up()
+
+    async def crisis_follow_up_async(self, session_id: str = None):
+        if not session_id:
+            return None
+        return await self._session(session_id).follow_up_async()
+
+    def start_session(self, user_messages: list, session_id: str = None) -> dict:
+        session = self._session(session_id)
+        return session.run_chat(user_messages)
+
+    async def start_session_async(self, user_messages: list, session_id: str = None) -> dict:
+        session = self._session(session_id)
+        return await session.run_chat_async(user_messages)
+
+    def stream_session(self, user_messages: list, session_id: str = None):
+        session = self._session(session_id)
+        return session.stream_chat(user_messages)
+
+    def stream_session_async(self, user_messages: list, session_id: str = None):
+        session = self._session(session_id)
+        return session.stream_chat_async(user_messages)
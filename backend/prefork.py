@@ -0,0 +1,315 @@
+"""
+Pre-fork multi-worker server.
+
+The master process imports the app and loads Whisper once, then forks the
+workers. Forked workers see the master's memory copy-on-write: the model
+weights are never written after loading (inference runs under no_grad),
+so their pages stay shared between every worker instead of being loaded
+once per process. Anything that is not fork-safe (the Gemini gRPC client,
+the SQLite session store, background threads) is created in each worker
+after the fork, by the app's usual initialize_clients().
+"""
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, List, Optional
+
+from backend.logging_setup import configure_logging, stop_logging
+
+logger = logging.getLogger(__name__)
+
+# Set in the master before forking; workers pick it up in load_speech_to_text.
+_preloaded_stt = None
+# Index of this worker, None outside a pre-forked worker.
+_worker_index: Optional[int] = None
+
+
+def preloaded_speech_to_text():
+    """
+    The SpeechToText the pre-fork master loaded, or None when not running
+    under the pre-fork launcher.
+    """
+    return _preloaded_stt
+
+
+def memory_stats(pid: int = None) -> Optional[Dict[str, float]]:
+    """
+    Resident, proportional, shared and private memory of a process in MB,
+    from /proc/<pid>/smaps_rollup. None where that is not available.
+
+    Shared counts pages mapped by more than one process (the inherited
+    weights, for a worker); PSS splits those evenly between the processes
+    that share them, so summing PSS over the workers gives the real total.
+    """
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    fields = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    mb = lambda *keys: round(sum(fields.get(key, 0) for key in keys) / 1024, 1)  # noqa: E731
+    return {
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+def process_stats() -> dict:
+    """
+    This process's place in the pre-fork setup and its memory, for /health.
+    """
+    return {
+        "pid": os.getpid(),
+        "worker": _worker_index,
+        "memory": memory_stats(),
+    }
+
+
+class PreforkServer:
+    """
+    Loads the models in the master, binds the listening socket and forks
+    `workers` processes that all accept on it. Workers that die are
+    replaced; SIGTERM or SIGINT stops them all.
+
+    Every worker is pinned to `threads` torch intra-op threads (by default
+    the CPU count divided by the worker count) and, with `pin_cpus`, to
+    its own slice of CPUs, so the workers do not oversubscribe the cores.
+    The master logs each worker's RSS and shared memory every
+    `report_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        app_module: str = "app",
+        host: str = None,
+        port: int = None,
+        workers: int = None,
+        threads: int = None,
+        pin_cpus: bool = None,
+        report_interval: float = None,
+    ):
+        if host is None:
+            host = os.getenv("HOST", "0.0.0.0")
+        if port is None:
+            port = int(os.getenv("PORT", "5001"))
+        if workers is None:
+            workers = int(os.getenv("PREFORK_WORKERS", "2"))
+        if threads is None:
+            threads = int(os.getenv("PREFORK_TORCH_THREADS", "0"))
+        if pin_cpus is None:
+            pin_cpus = os.getenv("PREFORK_PIN_CPUS", "0") == "1"
+        if report_interval is None:
+            report_interval = float(os.getenv("PREFORK_REPORT_INTERVAL", "60"))
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if not hasattr(os, "fork"):
+            raise RuntimeError("The pre-fork server needs os.fork (Linux or macOS).")
+        self.app_module = app_module
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        self.threads = threads or max(1, len(self.cpus) // workers)
+        self.pin_cpus = pin_cpus
+        self.report_interval = report_interval
+        self.module = None
+        self.sock = None
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self.restarts = 0
+        self._stopping = False
+
+    def preload(self) -> None:
+        """
+        Import the app and load Whisper in the master, before any fork.
+        """
+        global _preloaded_stt
+        # The app must use the preloaded model, not a transcription pool.
+        os.environ["STT_WORKERS"] = "0"
+        started = time.perf_counter()
+        self.module = importlib.import_module(self.app_module)
+
+        import torch
+        from backend.speech_to_text import SpeechToText, WhisperProfile
+
+        # One thread in the master: an OpenMP pool that exists at fork time
+        # is not usable in the children.
+        torch.set_num_threads(1)
+        profile = WhisperProfile.from_env()
+        profile.threads = 1
+        _preloaded_stt = SpeechToText(profile=profile)
+        _preloaded_stt.model.eval()
+        # Objects that exist now live for the whole run. Freezing them keeps
+        # the collector from writing to their pages in the workers, which
+        # would copy those pages into every worker.
+        gc.collect()
+        gc.freeze()
+        logger.info(
+            "Loaded Whisper %s in the master in %.1f s (%s)",
+            profile.model, time.perf_counter() - started, memory_stats(),
+        )
+
+    def bind(self) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(int(os.getenv("PREFORK_BACKLOG", "128")))
+        self.sock.set_inheritable(True)
+        logger.info("Listening on %s:%d with %d workers, %d torch threads each", self.host, self.port, self.workers, self.threads)
+
+    def spawn(self, index: int) -> int:
+        # The log writer thread does not survive a fork; stop it so no
+        # worker inherits its queue mid-write, and restart it on both sides.
+        stop_logging()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker_main(index)
+            except BaseException:
+                logging.getLogger(__name__).exception("Worker %d crashed", index)
+                code = 1
+            finally:
+                stop_logging()
+                os._exit(code)
+        configure_logging()
+        self.children[pid] = index
+        logger.info("Started worker %d (pid %d)", index, pid)
+        return pid
+
+    def _worker_main(self, index: int) -> None:
+        global _worker_index
+        _worker_index = index
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        configure_logging()
+        self._pin(index)
+        module = self.module
+        # Loads the Gemini client, TTS and session store here, in the worker.
+        module.initialize_clients()
+        if self.app_module == "asgi_app":
+            import asyncio
+            from hypercorn.asyncio import serve
+            from hypercorn.config import Config
+
+            config = Config()
+            config.bind = [f"fd://{self.sock.fileno()}"]
+            asyncio.run(serve(module.app, config))
+        else:
+            from werkzeug.serving import make_server
+
+            server = make_server(self.host, self.port, module.app, threaded=True, fd=self.sock.fileno())
+            server.serve_forever()
+
+    def _pin(self, index: int) -> None:
+        import torch
+
+        torch.set_num_threads(self.threads)
+        _preloaded_stt.profile.threads = self.threads
+        if self.pin_cpus and hasattr(os, "sched_setaffinity"):
+            start = (index * self.threads) % len(self.cpus)
+            cpus = [self.cpus[(start + i) % len(self.cpus)] for i in range(self.threads)]
+            os.sched_setaffinity(0, cpus)
+
+    def memory_report(self) -> List[dict]:
+        rows = [{"worker": "master", "pid": os.getpid(), **(memory_stats() or {})}]
+        for pid, index in sorted(self.children.items(), key=lambda item: item[1]):
+            rows.append({"worker": index, "pid": pid, **(memory_stats(pid) or {})})
+        return rows
+
+    def log_memory_report(self) -> None:
+        for row in self.memory_report():
+            logger.info(
+                "memory %s pid=%d rss=%sMB pss=%sMB shared=%sMB private=%sMB",
+                row["worker"], row["pid"], row.get("rss_mb"), row.get("pss_mb"), row.get("shared_mb"), row.get("private_mb"),
+            )
+
+    def stop(self, signum=None, frame=None) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        self.preload()
+        self.bind()
+        for index in range(self.workers):
+            self.spawn(index)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        next_report = time.monotonic() + min(self.report_interval, 30) if self.report_interval > 0 else None
+        try:
+            while not self._stopping:
+                self._reap()
+                if next_report is not None and time.monotonic() >= next_report:
+                    self.log_memory_report()
+                    next_report = time.monotonic() + self.report_interval
+                time.sleep(0.5)
+        finally:
+            self._shutdown()
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            index = self.children.pop(pid, None)
+            if index is None or self._stopping:
+                continue
+            logger.warning("Worker %d (pid %d) exited with status %d, restarting", index, pid, status)
+            self.restarts += 1
+            self.spawn(index)
+
+    def _shutdown(self) -> None:
+        logger.info("Stopping %d workers", len(self.children))
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + 10
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+        if self.sock is not None:
+            self.sock.close()
+
+
+def main(argv: List[str] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the API with Whisper loaded once and shared by forked workers.")
+    parser.add_argument("--app", default=os.getenv("PREFORK_APP", "app"), choices=["app", "asgi_app"])
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="PREFORK_WORKERS (default 2)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker (default: CPUs / workers)")
+    parser.add_argument("--pin-cpus", action="store_true", default=None, help="Give each worker its own CPUs")
+    args = parser.parse_args(argv)
+    configure_logging()
+    PreforkServer(
+        app_module=args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        threads=args.threads,
+        pin_cpus=args.pin_cpus,
+    ).run()
+
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# A subsystem in one of these states is expected to become ready soon.
+STARTING_STATES = ("pending", "loading", "warming")
+
+
+class Readiness:
+    """
+    Startup state of each subsystem, for liveness/readiness reporting.
+
+    Every subsystem moves pending -> loading -> warming -> ready, or ends up
+    failed. It counts as live unless it failed (or its probe says otherwise)
+    and as ready once it can serve requests.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._started = time.monotonic()
+        self._cond = threading.Condition()
+        self._states = {
+            name: {"state": "pending", "error": None, "ready_ms": None}
+            for name in names
+        }
+
+    def mark(self, name: str, state: str, error: str = None) -> None:
+        with self._cond:
+            entry = self._states[name]
+            entry["state"] = state
+            entry["error"] = error
+            if state in ("ready", "failed"):
+                entry["ready_ms"] = round((time.monotonic() - self._started) * 1000, 1)
+            self._cond.notify_all()
+
+    def run(self, name: str, load: Callable[[], None]) -> threading.Thread:
+        """
+        Run `load` in a background thread and record how it went. `load` may
+        call mark(name, "warming") once the model is in memory.
+        """
+        def target():
+            self.mark(name, "loading")
+            try:
+                load()
+            except Exception as e:
+                logger.error("✗ %s failed to start: %s", name, e)
+                self.mark(name, "failed", str(e))
+                return
+            self.mark(name, "ready")
+            logger.info("✓ %s ready after %s ms", name, self._states[name]["ready_ms"])
+
+        thread = threading.Thread(target=target, name=f"startup-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def state(self, name: str) -> str:
+        with self._cond:
+            return self._states[name]["state"]
+
+    def is_ready(self, name: str) -> bool:
+        return self.state(name) == "ready"
+
+    def starting(self, names: Iterable[str] = None) -> List[str]:
+        """
+        Names (of `names`, default all) that have not finished starting yet.
+        """
+        with self._cond:
+            names = self._states if names is None else names
+            return [name for name in names if self._states[name]["state"] in STARTING_STATES]
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until every subsystem is ready or failed. Returns False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: all(s["state"] not in STARTING_STATES for s in self._states.values()),
+                timeout=timeout,
+            )
+
+    def snapshot(self, probes: Dict[str, Callable[[], bool]] = None) -> dict:
+        """
+        Per-subsystem liveness and readiness. `probes` maps a subsystem name
+        to a callable that checks the running instance is still healthy.
+        """
+        probes = probes or {}
+        with self._cond:
+            states = {name: dict(entry) for name, entry in self._states.items()}
+        for name, entry in states.items():
+            live = entry["state"] != "failed"
+            if live and entry["state"] == "ready" and name in probes:
+                try:
+                    live = bool(probes[name]())
+                except Exception:
+                    live = False
+            entry["live"] = live
+            entry["ready"] = live and entry["state"] == "ready"
+        return states
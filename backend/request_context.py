@@ -0,0 +1,29 @@
+import contextvars
+import logging
+import re
+import uuid
+
+# Id of the request being handled in the current thread / asyncio task.
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def new_request_id(incoming: str = None) -> str:
+    """
+    Reuse a well-formed X-Request-ID from the caller, otherwise make one up,
+    and make it the current request id.
+    """
+    request_id = incoming if incoming and _VALID_ID.match(incoming) else uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds `request_id` to every log record so the format can include it.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
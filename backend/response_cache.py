@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+
+def normalize_message(text: str) -> str:
+    """
+    Case-fold and collapse whitespace, so "Hi " and "hi" share an entry.
+    """
+    return " ".join((text or "").casefold().split())
+
+
+class ResponseCache:
+    """
+    LRU cache with TTL for model replies, keyed by a hash of the normalized
+    history sent to the model.
+
+    Only histories without personal context are cached:
+    - history-free turns: the first user message of a session (up to
+      `max_chars`) with nothing before it;
+    - opt-in prefixes: histories whose user messages all appear in `opt_in`.
+    Every other conversation returns no key and always goes to the model.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        ttl: float = None,
+        max_chars: int = None,
+        opt_in: Iterable[str] = None,
+        namespace: str = "",
+    ):
+        if max_entries is None:
+            max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+        if ttl is None:
+            ttl = float(os.getenv("LLM_CACHE_TTL", "86400"))
+        if max_chars is None:
+            max_chars = int(os.getenv("LLM_CACHE_MAX_CHARS", "200"))
+        if opt_in is None:
+            opt_in = load_opt_in(os.getenv("LLM_CACHE_OPT_IN_PATH"))
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.opt_in = {normalize_message(text) for text in opt_in}
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def key(self, history: List[dict]) -> Optional[str]:
+        """
+        Cache key for `history`, or None when it must not be cached.
+        """
+        turns = [
+            (entry["role"], normalize_message(" ".join(part.get("text", "") for part in entry["parts"])))
+            for entry in history
+        ]
+        user_texts = [text for role, text in turns if role == "user"]
+        history_free = len(turns) == 1 and turns[0][0] == "user" and len(turns[0][1]) <= self.max_chars
+        opted_in = bool(user_texts) and all(text in self.opt_in for text in user_texts)
+        if not (history_free or opted_in):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        material = json.dumps([self.namespace, turns], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Optional[str], text: str) -> None:
+        if key is None or not text:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "bypassed": self.bypassed,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "opt_in_prefixes": len(self.opt_in),
+            }
+
+
+def load_opt_in(path: str = None) -> List[str]:
+    """
+    Read the opt-in list: a JSON array of user messages that are safe to share.
+    """
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return list(json.load(f))
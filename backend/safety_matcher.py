@@ -0,0 +1,159 @@
+import json
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+_APOSTROPHES = re.compile(r"[‘’ʼ`]")
+_CONTRACTIONS = [
+    (re.compile(r"\bcan't\b"), "cannot"),
+    (re.compile(r"\bwon't\b"), "will not"),
+    (re.compile(r"\bshan't\b"), "shall not"),
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"\bi'm\b"), "i am"),
+    (re.compile(r"\b(it|that|there|what|he|she)'s\b"), r"\1 is"),
+    (re.compile(r"'re\b"), " are"),
+    (re.compile(r"'ve\b"), " have"),
+    (re.compile(r"'ll\b"), " will"),
+    (re.compile(r"'d\b"), " would"),
+]
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_REPEATS = re.compile(r"([a-z])\1+")
+
+# Stems whose inflected forms must match too ("hopelessness", "self-harming",
+# "suicides"). Every other phrase has to end at a word boundary, so "end it
+# all" does not fire on "end it already".
+INFLECTABLE = ("suicide", "self-harm", "hopeless")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form used on both sides of the match: lower case, contractions
+    expanded, punctuation turned into single spaces and every run of a
+    repeated letter collapsed to one ("Sooo hopelesss" -> "so hoples").
+    """
+    text = _APOSTROPHES.sub("'", text.lower())
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = _NON_WORD.sub(" ", text)
+    text = _REPEATS.sub(r"\1", text)
+    return text.strip()
+
+
+@dataclass(frozen=True)
+class SafetyMatch:
+    phrase: str
+    category: str
+    start: int
+    end: int
+
+
+class SafetyMatcher:
+    """
+    Aho-Corasick automaton over normalized trigger phrases.
+
+    Phrases are compiled once; each message is normalized and scanned in a
+    single left-to-right pass, so cost grows with message length and not with
+    the size of the lexicon. Phrases match whole words. Stems listed in
+    `inflectable` may also end inside a word, so their inflected forms match
+    too ("hopeless" finds "hopelessness", "self-harm" finds "self-harmed").
+    """
+
+    def __init__(self, phrases: Dict[str, str], inflectable: Iterable[str] = INFLECTABLE):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._phrases: List[Tuple[str, str, int, int]] = []
+        open_ended = {normalize_text(stem) for stem in inflectable}
+        for phrase, category in phrases.items():
+            normalized = normalize_text(phrase)
+            if not normalized:
+                continue
+            # The trailing space makes the match end at a word boundary.
+            tail = 0 if normalized in open_ended else 1
+            self._add(f" {normalized}" + " " * tail, len(self._phrases))
+            self._phrases.append((phrase, category, len(normalized), tail))
+        self._build_failure_links()
+
+    @classmethod
+    def from_protocol(cls, protocol) -> "SafetyMatcher":
+        """
+        Build from a SafetyProtocol, using its trigger_categories when given.
+        """
+        categories = getattr(protocol, "trigger_categories", None) or {}
+        phrases = {word: categories.get(word, "safety") for word in protocol.trigger_words}
+        return cls(phrases)
+
+    @classmethod
+    def from_lexicon_file(cls, path: str, base: Dict[str, str] = None) -> "SafetyMatcher":
+        """
+        Load a JSON lexicon of the form {"category": ["phrase", ...], ...}.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            lexicon = json.load(f)
+        phrases = dict(base or {})
+        for category, words in lexicon.items():
+            for word in words:
+                phrases[word] = category
+        return cls(phrases)
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def phrases(self) -> Dict[str, str]:
+        return {phrase: category for phrase, category, _, _ in self._phrases}
+
+    def scan(self, text: str) -> List[SafetyMatch]:
+        """
+        Return every trigger phrase found in `text` (first occurrence of each).
+        Offsets refer to the normalized text.
+        """
+        if not text:
+            return []
+        haystack = f" {normalize_text(text)} "
+        goto, fail, out = self._goto, self._fail, self._out
+        seen = set()
+        matches = []
+        node = 0
+        for i, ch in enumerate(haystack):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                if index in seen:
+                    continue
+                seen.add(index)
+                phrase, category, length, tail = self._phrases[index]
+                # `i` is the key's last character (the phrase's, or the space
+                # after it); offsets are shifted back by the leading space
+                # added to haystack.
+                end = i - tail
+                matches.append(SafetyMatch(phrase, category, end - length, end))
+        return matches
+
+    def _add(self, key: str, index: int) -> None:
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(index)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from backend.conversation import GeminiChatSession
+
+
+class SessionRegistry:
+    """
+    Keeps one GeminiChatSession per client session id.
+
+    Sessions are created on demand, kept in least-recently-used order and
+    evicted when the registry is full or when a session has been idle for
+    longer than `idle_ttl` seconds. With a session store behind them, an
+    evicted session is only dropped from memory and reloads on its next use.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[str], GeminiChatSession],
+        max_sessions: int = None,
+        idle_ttl: float = None,
+    ):
+        if max_sessions is None:
+            max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+        if idle_ttl is None:
+            idle_ttl = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1.")
+        self.session_factory = session_factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, GeminiChatSession]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+
+    def get(self, session_id: str) -> GeminiChatSession:
+        """
+        Return the session for `session_id`, creating it if needed.
+        """
+        if not session_id or not isinstance(session_id, str):
+            raise ValueError("session_id is required and must be a string.")
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self.session_factory(session_id)
+                self._sessions[session_id] = session
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    oldest, _ = self._sessions.popitem(last=False)
+                    self._last_seen.pop(oldest, None)
+                    self.evicted_lru += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            self._last_seen[session_id] = now
+            return session
+
+    def drop(self, session_id: str) -> bool:
+        """
+        Forget a session explicitly. Returns True if it existed.
+        """
+        with self._lock:
+            self._last_seen.pop(session_id, None)
+            return self._sessions.pop(session_id, None) is not None
+
+    def evict_idle(self) -> int:
+        """
+        Evict every session idle for longer than `idle_ttl`. Returns the count.
+        """
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def _evict_idle(self, now: float) -> int:
+        # Sessions are in LRU order, so the idle ones are all at the front.
+        count = 0
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if now - self._last_seen.get(oldest, now) <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self._last_seen.pop(oldest, None)
+            count += 1
+        self.evicted_idle += count
+        return count
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "live_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_ttl_seconds": self.idle_ttl,
+                "created": self.created,
+                "evicted_lru": self.evicted_lru,
+                "evicted_idle": self.evicted_idle,
+                "evicted_total": self.evicted_lru + self.evicted_idle,
+            }
@@ -0,0 +1,329 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (history entries in chat_history format, id of the newest turn read)
+Turns = Tuple[List[Dict], int]
+# (summary, tokens it saves, pinned entries kept verbatim, id of the first
+# turn the summary does not cover)
+Summary = Tuple[str, int, List[Dict], int]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    writer TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_by_session ON turns (session_id, id);
+CREATE INDEX IF NOT EXISTS user_turns_by_session ON turns (session_id, id) WHERE role = 'user';
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    summarized_tokens INTEGER NOT NULL,
+    pinned TEXT NOT NULL,
+    from_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SessionStore:
+    """
+    Durable turn log behind GeminiChatSession.
+
+    Turns are only ever appended. A session loads its recent history the
+    first time a process touches it and afterwards pulls the turns other
+    processes appended since, so any worker can serve any session.
+    """
+
+    def append(self, session_id: str, role: str, text: str) -> None:
+        raise NotImplementedError
+
+    def recent(self, session_id: str, max_user_turns: int, from_id: int = 0) -> Turns:
+        """
+        The last `max_user_turns` user turns of a session and everything
+        after them, oldest first, leaving out turns before `from_id`.
+        """
+        raise NotImplementedError
+
+    def since(self, session_id: str, after_id: int) -> Turns:
+        """
+        Turns other processes appended after `after_id`, oldest first.
+        """
+        raise NotImplementedError
+
+    def save_summary(self, session_id: str, summary: str, summarized_tokens: int, pinned: List[Dict], kept: int) -> None:
+        """
+        Record a session's rolling summary. It covers every turn of the
+        session but the newest `kept`, apart from the `pinned` entries.
+        """
+
+    def load_summary(self, session_id: str) -> Optional[Summary]:
+        return None
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SessionStore on an SQLite file in WAL mode.
+
+    WAL lets readers in every process run alongside the single writer, and
+    the rowid gives turns one global order no matter which process wrote
+    them. Appends are queued and written by a background thread in one
+    transaction per batch, at most `flush_ms` after they were made.
+    """
+
+    def __init__(self, path: str = None, flush_ms: float = None, batch_size: int = None, busy_timeout_ms: int = 5000):
+        if path is None:
+            path = os.getenv("SESSION_DB_PATH", os.path.join("data", "sessions.db"))
+        if flush_ms is None:
+            flush_ms = float(os.getenv("SESSION_STORE_FLUSH_MS", "50"))
+        if batch_size is None:
+            batch_size = int(os.getenv("SESSION_STORE_BATCH", "200"))
+        # Absolute, so a later chdir does not move the database.
+        path = os.path.abspath(path)
+        self.path = path
+        self.flush_interval = flush_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        # Tags this process's rows so `since` does not hand them back.
+        self.writer_id = uuid.uuid4().hex[:16]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.appended = 0
+        self.written = 0
+        self.batches = 0
+        self.loads = 0
+        self.syncs = 0
+        self.write_errors = 0
+        self.summaries_saved = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def append(self, session_id: str, role: str, text: str) -> None:
+        self._queue.put((session_id, role, text, self.writer_id, time.time()))
+        self._pending.set()
+        with self._stats_lock:
+            self.appended += 1
+
+    def _run(self) -> None:
+        conn = self._connect()
+        try:
+            while not self._closed.is_set():
+                if not self._pending.wait(0.5):
+                    continue
+                if self.flush_interval:
+                    # Give the rest of the turn a moment to join the batch.
+                    self._closed.wait(self.flush_interval)
+                self._pending.clear()
+                self._write(conn)
+            # Turns queued before close() are written here, on the
+            # connection that is already open.
+            self._write(conn)
+        finally:
+            conn.close()
+
+    def _drain(self) -> List[tuple]:
+        rows = []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, conn: sqlite3.Connection) -> None:
+        # Under the lock so batches from the writer thread and from flush()
+        # commit in the order they were queued.
+        with self._flush_lock:
+            while True:
+                rows = self._drain()
+                if not rows:
+                    return
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.executemany(
+                        "INSERT INTO turns (session_id, role, text, writer, created_at) VALUES (?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    conn.execute("COMMIT")
+                except sqlite3.Error as e:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    with self._stats_lock:
+                        self.write_errors += 1
+                    logger.error("Session store failed to write %d turns: %s", len(rows), e)
+                    return
+                with self._stats_lock:
+                    self.written += len(rows)
+                    self.batches += 1
+
+    def flush(self) -> None:
+        """
+        Write every queued turn now, on the calling thread.
+        """
+        if self._queue.empty():
+            return
+        conn = self._reader()
+        self._write(conn)
+
+    def recent(self, session_id: str, max_user_turns: int, from_id: int = 0) -> Turns:
+        # A session evicted and reloaded by this process must see its own
+        # latest turns, including the ones still queued.
+        self.flush()
+        conn = self._reader()
+        start = from_id
+        if max_user_turns and max_user_turns > 0:
+            row = conn.execute(
+                "SELECT id FROM turns WHERE session_id = ? AND role = 'user' ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (session_id, max_user_turns - 1),
+            ).fetchone()
+            if row is not None:
+                start = max(start, row[0])
+        rows = conn.execute(
+            "SELECT id, role, text FROM turns WHERE session_id = ? AND id >= ? ORDER BY id",
+            (session_id, start),
+        ).fetchall()
+        with self._stats_lock:
+            self.loads += 1
+        if not rows:
+            last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM turns").fetchone()[0]
+            return [], last
+        return [_entry(role, text) for _, role, text in rows], rows[-1][0]
+
+    def since(self, session_id: str, after_id: int) -> Turns:
+        rows = self._reader().execute(
+            "SELECT id, role, text, writer FROM turns WHERE session_id = ? AND id > ? ORDER BY id",
+            (session_id, after_id),
+        ).fetchall()
+        with self._stats_lock:
+            self.syncs += 1
+        if not rows:
+            return [], after_id
+        entries = [_entry(role, text) for _, role, text, writer in rows if writer != self.writer_id]
+        return entries, rows[-1][0]
+
+    def save_summary(self, session_id: str, summary: str, summarized_tokens: int, pinned: List[Dict], kept: int) -> None:
+        # The summary's boundary is a turn id, so the session's own queued
+        # turns must have theirs first.
+        self.flush()
+        conn = self._reader()
+        try:
+            if kept > 0:
+                row = conn.execute(
+                    "SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                    (session_id, kept - 1),
+                ).fetchone()
+                from_id = row[0] if row is not None else 0
+            else:
+                from_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM turns").fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (session_id, summary, summarized_tokens, pinned, from_id, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, summary, summarized_tokens, json.dumps(pinned), from_id, time.time()),
+            )
+        except sqlite3.Error as e:
+            with self._stats_lock:
+                self.write_errors += 1
+            logger.error("Session store failed to save the summary of session %s: %s", session_id, e)
+            return
+        with self._stats_lock:
+            self.summaries_saved += 1
+
+    def load_summary(self, session_id: str) -> Optional[Summary]:
+        row = self._reader().execute(
+            "SELECT summary, summarized_tokens, pinned, from_id FROM summaries WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        summary, summarized_tokens, pinned, from_id = row
+        return summary, summarized_tokens, json.loads(pinned), from_id
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._pending.set()
+        self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "appended": self.appended,
+                "written": self.written,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "avg_batch": round(self.written / self.batches, 1) if self.batches else None,
+                "loads": self.loads,
+                "syncs": self.syncs,
+                "summaries_saved": self.summaries_saved,
+                "write_errors": self.write_errors,
+            }
+
+
+def _entry(role: str, text: str) -> Dict:
+    return {"role": role, "parts": [{"text": text}]}
+
+
+def create_session_store(backend: str = None) -> Optional[SessionStore]:
+    """
+    The store named by SESSION_STORE: "sqlite" (default) or "memory", which
+    keeps history in the process only and returns None.
+    """
+    if backend is None:
+        backend = os.getenv("SESSION_STORE", "sqlite")
+    backend = backend.strip().lower()
+    if backend == "memory":
+        return None
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown SESSION_STORE {backend!r}; use 'sqlite' or 'memory'.")
@@ -1,15 +1,177 @@
-import whisper
+import os
+import subprocess
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Whisper's own fallback schedule, used when a greedy/beam pass looks wrong.
+TEMPERATURE_FALLBACK = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode encoded audio bytes (webm, mp3, wav, ...) in memory into the mono
+    float32 array Whisper expects, piping through ffmpeg instead of a temp file.
+    """
+    if not data:
+        raise ValueError("Audio data must not be empty.")
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+class WhisperProfile:
+    """
+    Model and decoding settings for running Whisper on CPU.
+
+    - model: checkpoint name ("tiny", "base", "small", "base.en", ...)
+    - quantize: int8 dynamic quantization of the Linear layers (CPU only)
+    - language: pin the language (e.g. "en") to skip detection on every clip
+    - beam_size: None for greedy decoding, otherwise the beam width
+    - temperature_fallback: retry at higher temperatures when a decode
+      looks wrong (Whisper's default); off decodes exactly once
+    - threads: torch intra-op threads, 0 to leave torch's default
+    """
+
+    def __init__(
+        self,
+        model: str = "base",
+        quantize: bool = False,
+        language: str = None,
+        beam_size: int = None,
+        temperature_fallback: bool = True,
+        threads: int = 0,
+    ):
+        self.model = model
+        self.quantize = quantize
+        self.language = language or None
+        self.beam_size = beam_size or None
+        self.temperature_fallback = temperature_fallback
+        self.threads = threads
+
+    @classmethod
+    def from_env(cls) -> "WhisperProfile":
+        """
+        Start from the STT_PROFILE preset (default "default") and apply any
+        of STT_MODEL, STT_QUANTIZE, STT_LANGUAGE, STT_BEAM_SIZE,
+        STT_TEMPERATURE_FALLBACK and STT_TORCH_THREADS that are set.
+        """
+        name = os.getenv("STT_PROFILE", "default")
+        if name not in PROFILES:
+            raise ValueError(f"Unknown STT_PROFILE {name!r}; choose from {', '.join(PROFILES)}.")
+        settings = PROFILES[name].as_dict()
+        overrides = {
+            "model": os.getenv("STT_MODEL"),
+            "quantize": os.getenv("STT_QUANTIZE"),
+            "language": os.getenv("STT_LANGUAGE"),
+            "beam_size": os.getenv("STT_BEAM_SIZE"),
+            "temperature_fallback": os.getenv("STT_TEMPERATURE_FALLBACK"),
+            "threads": os.getenv("STT_TORCH_THREADS"),
+        }
+        for key, value in overrides.items():
+            if value is None:
+                continue
+            if key in ("quantize", "temperature_fallback"):
+                value = value == "1"
+            elif key in ("beam_size", "threads"):
+                value = int(value)
+            settings[key] = value
+        return cls(**settings)
+
+    def decode_options(self) -> dict:
+        """
+        Keyword arguments for model.transcribe.
+        """
+        options = {
+            "fp16": False,
+            "language": self.language,
+            "temperature": TEMPERATURE_FALLBACK if self.temperature_fallback else 0.0,
+        }
+        if self.beam_size:
+            options["beam_size"] = self.beam_size
+            options["best_of"] = self.beam_size
+        return options
+
+    def as_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "quantize": self.quantize,
+            "language": self.language,
+            "beam_size": self.beam_size,
+            "temperature_fallback": self.temperature_fallback,
+            "threads": self.threads,
+        }
+
+
+# "default" matches Whisper's own defaults, i.e. the behaviour before profiles.
+PROFILES = {
+    "default": WhisperProfile("base"),
+    "accurate": WhisperProfile("small", beam_size=5),
+    "fast": WhisperProfile("base", quantize=True, language="en", temperature_fallback=False),
+    "fastest": WhisperProfile("tiny.en", quantize=True, language="en", temperature_fallback=False),
+}
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of the attention and MLP Linear layers, which
+    hold most of Whisper's weights and compute. CPU only.
+    """
+    import torch
+    import whisper.model
+
+    # whisper.model.Linear only adds an fp16 cast; quantize_dynamic accepts
+    # just the plain class, and on CPU in fp32 the two behave the same.
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
 
 class SpeechToText:
-    def __init__(self, model_name: str = "base"):
+    def __init__(self, model_name: str = None, profile: WhisperProfile = None):
         """
         We initialise the whisper model.
+
+        Settings come from `profile`, or from the environment (see
+        WhisperProfile.from_env); `model_name` overrides the profile's model.
         """
-        self.model = whisper.load_model(model_name)
-        
-    def transcribe(self, audio_path: str) -> str:
+        # Imported here: whisper pulls in torch, which takes seconds to import.
+        import torch
+        import whisper
+
+        profile = profile or WhisperProfile.from_env()
+        if model_name:
+            profile = WhisperProfile(**dict(profile.as_dict(), model=model_name))
+        self.profile = profile
+        if self.profile.threads:
+            torch.set_num_threads(self.profile.threads)
+        if self.profile.quantize:
+            self.model = quantize_int8(whisper.load_model(self.profile.model, device="cpu"))
+        else:
+            self.model = whisper.load_model(self.profile.model)
+        self.decode_options = self.profile.decode_options()
+
+    def warm_up(self) -> None:
+        """
+        Run one inference on a second of silence so the first real request
+        does not pay for kernel and allocator initialization.
+        """
+        self.model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), **self.decode_options)
+
+    def transcribe(self, audio_path) -> str:
         """ 
         Transcribe an audio file to plain text.
+
+        Also accepts raw encoded bytes or an already decoded 16 kHz float array.
         """
-        result = self.model.transcribe(audio_path)
-        return result["text"]
\ No newline at end of file
+        if isinstance(audio_path, (bytes, bytearray)):
+            audio_path = decode_audio(bytes(audio_path))
+        result = self.model.transcribe(audio_path, **self.decode_options)
+        return result["text"]
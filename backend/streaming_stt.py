@@ -0,0 +1,142 @@
+import os
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+from backend.speech_to_text import SAMPLE_RATE
+
+
+def pcm16_to_float(pcm: bytes) -> np.ndarray:
+    """
+    Little-endian 16-bit mono PCM to the float32 samples Whisper expects.
+    """
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+
+class EnergyVAD:
+    """
+    Frame-level voice activity detector.
+
+    A frame is speech when its RMS is `ratio` times above the running noise
+    floor and above `min_rms`. The floor follows the quietest recent frames,
+    so it adapts to the room without a calibration step.
+    """
+
+    def __init__(self, ratio: float = 3.0, min_rms: float = 0.01, adapt: float = 0.05):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.adapt = adapt
+        self.noise_floor = None
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(frame * frame))) if len(frame) else 0.0
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        speech = rms > max(self.min_rms, self.noise_floor * self.ratio)
+        if not speech or rms < self.noise_floor:
+            self.noise_floor += self.adapt * (rms - self.noise_floor)
+        return speech
+
+
+class StreamingSegmenter:
+    """
+    Cuts a live PCM stream into utterance segments at pauses.
+
+    Feed it audio as it arrives; a segment is complete once speech is
+    followed by `min_silence_ms` of silence, or when it reaches
+    `max_segment_s`. Each segment keeps `padding_ms` of audio on both sides
+    so Whisper does not clip word edges. Bursts shorter than `min_speech_ms`
+    (clicks, bumps) are dropped.
+    """
+
+    def __init__(
+        self,
+        vad: EnergyVAD = None,
+        sample_rate: int = SAMPLE_RATE,
+        frame_ms: int = 30,
+        min_silence_ms: int = None,
+        max_segment_s: float = None,
+        padding_ms: int = 200,
+        min_speech_ms: int = 150,
+    ):
+        if min_silence_ms is None:
+            min_silence_ms = int(os.getenv("STREAM_STT_MIN_SILENCE_MS", "500"))
+        if max_segment_s is None:
+            max_segment_s = float(os.getenv("STREAM_STT_MAX_SEGMENT_S", "15"))
+        self.vad = vad or EnergyVAD()
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.min_silence_frames = max(1, min_silence_ms // frame_ms)
+        self.max_segment_frames = max(1, int(max_segment_s * 1000) // frame_ms)
+        self.padding_frames = padding_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self._pending = b""
+        self._leading = deque(maxlen=self.padding_frames or 1)
+        self._frames: List[np.ndarray] = []
+        self._speech_frames = 0
+        self._silent_run = 0
+        self.received_seconds = 0.0
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._frames)
+
+    def feed(self, pcm: bytes) -> List[np.ndarray]:
+        """
+        Add 16-bit PCM and return the segments it completed, oldest first.
+        """
+        data = self._pending + pcm
+        frame_bytes = self.frame_samples * 2
+        usable = len(data) - len(data) % frame_bytes
+        self._pending = data[usable:]
+        self.received_seconds += usable / 2 / self.sample_rate
+        samples = pcm16_to_float(data[:usable])
+        segments = []
+        for start in range(0, len(samples), self.frame_samples):
+            segment = self._push(samples[start:start + self.frame_samples])
+            if segment is not None:
+                segments.append(segment)
+        return segments
+
+    def _push(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        speech = self.vad.is_speech(frame)
+        if not self._frames:
+            if not speech:
+                if self.padding_frames:
+                    self._leading.append(frame)
+                return None
+            self._frames = list(self._leading) if self.padding_frames else []
+            self._leading.clear()
+
+        self._frames.append(frame)
+        if speech:
+            self._speech_frames += 1
+            self._silent_run = 0
+        else:
+            self._silent_run += 1
+        if self._silent_run >= self.min_silence_frames or len(self._frames) >= self.max_segment_frames:
+            return self._cut()
+        return None
+
+    def _cut(self) -> Optional[np.ndarray]:
+        # Trim the trailing silence down to the padding we want to keep.
+        excess = max(0, self._silent_run - self.padding_frames)
+        frames = self._frames[:len(self._frames) - excess] if excess else self._frames
+        speech_frames = self._speech_frames
+        self._frames = []
+        self._speech_frames = 0
+        self._silent_run = 0
+        if speech_frames < self.min_speech_frames:
+            return None
+        return np.concatenate(frames)
+
+    def flush(self) -> Optional[np.ndarray]:
+        """
+        End of stream: return the unfinished segment, if it holds speech.
+        """
+        self._pending = b""
+        self._leading.clear()
+        if not self._frames:
+            return None
+        return self._cut()
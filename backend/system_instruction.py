@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List
 from enum import Enum
 
 class TherapyPhase(Enum):
@@ -20,6 +20,7 @@ class SafetyProtocol:
     trigger_words: List[str]
     response_template: str
     escalation_guidance: str
+    trigger_categories: Dict[str, str] = field(default_factory=dict)
 
 @dataclass
 class SystemInstruction:
@@ -48,7 +49,17 @@ def get_advanced_therapist_instruction() -> SystemInstruction:
         escalation_guidance=(
             "If user expresses immediate danger, provide crisis resources and encourage immediate professional help. "
             "Continue to offer emotional support while emphasizing the importance of professional intervention."
-        )
+        ),
+        trigger_categories={
+            "suicide": "suicidal_ideation",
+            "kill myself": "suicidal_ideation",
+            "end it all": "suicidal_ideation",
+            "not worth living": "suicidal_ideation",
+            "hurt myself": "self_harm",
+            "self-harm": "self_harm",
+            "hopeless": "hopelessness",
+            "nothing matters": "hopelessness"
+        }
     )
     
     return SystemInstruction(
@@ -188,6 +199,17 @@ def get_advanced_therapist_instruction() -> SystemInstruction:
         )
     )
 
+def build_system_prompt(instruction: SystemInstruction) -> str:
+    return (
+        f"{instruction.role}\n"
+        f"{instruction.core_principles}\n"
+        f"{instruction.therapeutic_approach}\n"
+        f"{instruction.communication_style}\n"
+        f"{instruction.intervention_strategies}\n"
+        f"{instruction.ethical_boundaries}\n"
+        f"{instruction.crisis_management}\n"
+    )
+
 def get_therapeutic_techniques() -> List[TherapeuticTechnique]:
     return [
         TherapeuticTechnique(
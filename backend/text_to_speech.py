@@ -1,23 +1,126 @@
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+import asyncio
+import logging
 import os
+import random
+import threading
+import time
 import dotenv
 
+from backend.audio_store import CHUNK_SIZE, decode_base64_chunks
+
 dotenv.load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Murf responses worth retrying: rate limiting and upstream/server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitBreaker:
+    """
+    Fails fast after `failure_threshold` consecutive upstream failures.
+
+    Once open, calls are refused for `reset_timeout` seconds; after that a
+    single trial call is let through (half-open) and its outcome decides
+    whether the breaker closes again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """
+        Give back a half-open trial that ended without an outcome (cancelled,
+        or failed on our side), so the next call can try again.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_in_flight:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
 class MurfTTSClient:
     """
     Murf Text-to-Speech client.
+
+    Requests go through one pooled keep-alive session, are retried with
+    jittered exponential backoff on 429/5xx and network errors, and are
+    refused immediately while the circuit breaker is open.
     """
 
     BASE_URL = "https://api.murf.ai/v1/speech/generate"
 
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        pool_size: int = None,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        max_retries: int = None,
+        backoff_base: float = None,
+        backoff_max: float = None,
+        breaker: CircuitBreaker = None,
+    ):
         if api_key is None:
             api_key = os.getenv("MURF_API_KEY")
         if not api_key or not isinstance(api_key, str):
             raise ValueError("API key must be provided and must be a string.")
         self.api_key = api_key
+        self.base_url = base_url or os.getenv("MURF_BASE_URL", self.BASE_URL)
+        self.pool_size = pool_size or int(os.getenv("MURF_POOL_SIZE", "10"))
+        self.connect_timeout = connect_timeout or float(os.getenv("MURF_CONNECT_TIMEOUT", "3.05"))
+        self.read_timeout = read_timeout or float(os.getenv("MURF_READ_TIMEOUT", "30"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("MURF_MAX_RETRIES", "2"))
+        self.backoff_base = backoff_base or float(os.getenv("MURF_BACKOFF_BASE", "0.25"))
+        self.backoff_max = backoff_max or float(os.getenv("MURF_BACKOFF_MAX", "4"))
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("MURF_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("MURF_BREAKER_RESET", "30")),
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.retries = 0
+        self._async_client = None
 
     def generate_speech(
         self,
@@ -36,22 +139,210 @@ class MurfTTSClient:
         """
         Generate speech from text.
         """
+        payload, error = self._build_payload(
+            text, voice_id, style, encode_as_base64, format, sample_rate,
+            channel_type, rate, pitch, variation, pronunciation_dict,
+        )
+        if error:
+            return error
+        if not self.breaker.allow():
+            return self._circuit_open_error()
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    resp = self.session.post(
+                        self.base_url,
+                        json=payload,
+                        headers=self._headers(),
+                        timeout=(self.connect_timeout, self.read_timeout),
+                    )
+                except requests.RequestException as e:
+                    logger.warning("Murf request failed (attempt %d): %s", attempt + 1, e)
+                    if attempt < self.max_retries:
+                        self.retries += 1
+                        time.sleep(self._backoff(attempt))
+                        continue
+                    self.breaker.record_failure()
+                    return {
+                        "success": False,
+                        "error": "Network or request exception",
+                        "details": str(e)
+                    }
+                if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    self.retries += 1
+                    time.sleep(self._backoff(attempt, resp.headers.get("Retry-After")))
+                    continue
+                break
+        except BaseException:
+            # Cancelled or crashed mid-call: not an answer from Murf, so it
+            # does not count, but a half-open trial must not stay taken.
+            self.breaker.release_trial()
+            raise
+
+        # Only the size: the body may carry the whole clip as base64.
+        logger.debug("Murf API status %s, %d bytes", resp.status_code, len(resp.content))
+        self._record_outcome(resp.status_code)
+        return self._parse_response(resp)
+
+    async def generate_speech_async(self, text: str, voice_id: str, **kwargs) -> dict:
+        """
+        Non-blocking variant of generate_speech for the asyncio serving mode.
+
+        Takes the same keyword arguments as generate_speech and shares one
+        pooled httpx.AsyncClient across calls.
+        """
+        import httpx
 
+        payload, error = self._build_payload(text, voice_id, **kwargs)
+        if error:
+            return error
+        if not self.breaker.allow():
+            return self._circuit_open_error()
+
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    resp = await self._async_client.post(self.base_url, json=payload, headers=self._headers())
+                except httpx.HTTPError as e:
+                    logger.warning("Murf request failed (attempt %d): %s", attempt + 1, e)
+                    if attempt < self.max_retries:
+                        self.retries += 1
+                        await asyncio.sleep(self._backoff(attempt))
+                        continue
+                    self.breaker.record_failure()
+                    return {
+                        "success": False,
+                        "error": "Network or request exception",
+                        "details": str(e)
+                    }
+                if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    self.retries += 1
+                    await asyncio.sleep(self._backoff(attempt, resp.headers.get("Retry-After")))
+                    continue
+                break
+        except BaseException:
+            # Cancelled or crashed mid-call: not an answer from Murf, so it
+            # does not count, but a half-open trial must not stay taken.
+            self.breaker.release_trial()
+            raise
+
+        logger.debug("Murf API status %s, %d bytes", resp.status_code, len(resp.content))
+        self._record_outcome(resp.status_code)
+        return self._parse_response(resp)
+
+    def iter_audio(self, url: str, chunk_size: int = CHUNK_SIZE):
+        """
+        Download the audioFile Murf returns when encodeAsBase64 is off, as raw
+        bytes in chunks. Network errors are retried like generate_speech
+        until the first byte arrives.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self.session.get(url, stream=True, timeout=(self.connect_timeout, self.read_timeout))
+            except requests.RequestException as e:
+                logger.warning("Murf audio download failed (attempt %d): %s", attempt + 1, e)
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(self._backoff(attempt))
+                continue
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                resp.close()
+                self.retries += 1
+                time.sleep(self._backoff(attempt, resp.headers.get("Retry-After")))
+                continue
+            break
+        with resp:
+            resp.raise_for_status()
+            yield from resp.iter_content(chunk_size)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def close(self):
+        self.session.close()
+
+    def transport_stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "times_opened": self.breaker.times_opened,
+            "retries": self.retries,
+            "pool_size": self.pool_size,
+        }
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        """
+        Full-jitter exponential backoff, honouring Retry-After when Murf sends one.
+        """
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record_outcome(self, status_code: int) -> None:
+        if status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _circuit_open_error(self) -> dict:
+        return {
+            "success": False,
+            "error": "Murf circuit open",
+            "details": f"Murf is failing; retrying after {self.breaker.reset_timeout:.0f}s cooldown."
+        }
+
+    def _headers(self) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "api-key": self.api_key
+        }
+
+    def _build_payload(
+        self,
+        text: str,
+        voice_id: str,
+        style: str = None,
+        encode_as_base64: bool = True,
+        format: str = "MP3",
+        sample_rate: int = 44100,
+        channel_type: str = "MONO",
+        rate: float = 0.0,
+        pitch: float = 0.0,
+        variation: int = 1,
+        pronunciation_dict: dict = None,
+    ):
+        """
+        Validate the arguments and build the Murf request body.
+
+        Returns (payload, None) on success or (None, error_dict) on bad input.
+        """
         # Validate minimal required
         if not text or not isinstance(text, str):
-            return {"success": False, "error": "Text is required and must be a string."}
+            return None, {"success": False, "error": "Text is required and must be a string."}
         if not voice_id or not isinstance(voice_id, str):
-            return {"success": False, "error": "voice_id is required and must be a string."}
+            return None, {"success": False, "error": "voice_id is required and must be a string."}
 
         # Validate optional parameters against Murf limits
         if rate is not None and not (-50 <= rate <= 50):
-            return {"success": False, "error": "rate must be between -50 and +50."}
+            return None, {"success": False, "error": "rate must be between -50 and +50."}
         if pitch is not None and not (-50 <= pitch <= 50):
-            return {"success": False, "error": "pitch must be between -50 and +50."}
+            return None, {"success": False, "error": "pitch must be between -50 and +50."}
         if sample_rate not in {8000, 24000, 44100, 48000}:
-            return {"success": False, "error": f"sample_rate {sample_rate} is invalid."}
+            return None, {"success": False, "error": f"sample_rate {sample_rate} is invalid."}
         if channel_type.upper() not in {"MONO", "STEREO"}:
-            return {"success": False, "error": "channel_type must be MONO or STEREO."}
+            return None, {"success": False, "error": "channel_type must be MONO or STEREO."}
 
         payload = {
             "text": text,
@@ -68,25 +359,10 @@ class MurfTTSClient:
             payload["style"] = style
         if pronunciation_dict:
             payload["pronunciationDictionary"] = pronunciation_dict
+        return payload, None
 
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.api_key
-        }
-
-        try:
-            resp = requests.post(self.BASE_URL, json=payload, headers=headers, timeout=30)
-        except requests.RequestException as e:
-            print(f"Network or request exception: {e}")
-            return {
-                "success": False,
-                "error": "Network or request exception",
-                "details": str(e)
-            }
-
-        print(f"DEBUG Murf API status: {resp.status_code}")
-        print(f"DEBUG Murf API response: {resp.text}")
-
+    @staticmethod
+    def _parse_response(resp) -> dict:
         if resp.status_code != 200:
             try:
                 body = resp.json()
@@ -116,6 +392,7 @@ class MurfTTSClient:
     ) -> str:
         """
         Saves base64 encoded audio to a file in the specified folder, overwriting if exists.
+        The audio is decoded and written in chunks.
 
         Returns the full path to the saved file.
         """
@@ -125,6 +402,7 @@ class MurfTTSClient:
         os.makedirs(folder, exist_ok=True)
         path = os.path.join(folder, filename)
         with open(path, "wb") as f:
-            f.write(base64.b64decode(encoded_audio))
-        print(f"Audio saved successfully at {path}")
+            for chunk in decode_base64_chunks(encoded_audio):
+                f.write(chunk)
+        logger.debug("Audio saved at %s", path)
         return path
\ No newline at end of file
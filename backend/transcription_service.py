@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from backend.latency import LatencyTracker
+
+# Set inside each worker process by _init_worker.
+_worker_stt = None
+
+
+class TranscriptionQueueFull(RuntimeError):
+    """
+    Raised by TranscriptionService.submit when the job queue is full.
+    """
+
+    def __init__(self, queue_depth: int, max_queue: int):
+        super().__init__(f"Transcription queue is full ({queue_depth}/{max_queue} jobs waiting).")
+        self.queue_depth = queue_depth
+        self.max_queue = max_queue
+
+
+def _init_worker(profile: dict):
+    global _worker_stt
+    from backend.speech_to_text import SpeechToText, WhisperProfile
+
+    # SpeechToText pins torch to profile["threads"] intra-op threads.
+    _worker_stt = SpeechToText(profile=WhisperProfile(**profile))
+    _worker_stt.warm_up()
+
+
+def _run_job(audio) -> dict:
+    started = time.time()
+    text = _worker_stt.transcribe(audio)
+    return {"text": text, "started": started, "finished": time.time()}
+
+
+class TranscriptionService:
+    """
+    Runs Whisper in a pool of worker processes fed by a bounded job queue.
+
+    Each worker loads the model once, with the model and decoding settings of
+    the STT_PROFILE WhisperProfile, and pins torch to `torch_threads` intra-op
+    threads, so concurrent voice turns do not fight over cores. At most
+    `workers + max_queue` jobs are accepted at a time; beyond that, submit()
+    fails fast with TranscriptionQueueFull.
+    """
+
+    def __init__(
+        self,
+        model_name: str = None,
+        workers: int = None,
+        torch_threads: int = None,
+        max_queue: int = None,
+    ):
+        from backend.speech_to_text import WhisperProfile
+
+        profile = WhisperProfile.from_env()
+        if model_name is None:
+            model_name = profile.model
+        if workers is None:
+            workers = int(os.getenv("STT_WORKERS", "1"))
+        if torch_threads is None:
+            torch_threads = profile.threads or max(1, (os.cpu_count() or 1) // workers)
+        if max_queue is None:
+            max_queue = int(os.getenv("STT_MAX_QUEUE", "8"))
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+
+        profile.model = model_name
+        profile.threads = torch_threads
+        self.profile = profile
+        self.model_name = model_name
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.max_queue = max_queue
+        self.latency = LatencyTracker()
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(profile.as_dict(),),
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, audio) -> Future:
+        """
+        Queue audio for transcription and return a Future for its text.
+
+        `audio` is a file path or the raw encoded bytes of an upload; bytes are
+        decoded in memory inside the worker process.
+
+        The future carries a `queue_position` attribute: the number of jobs
+        that were already pending when this one was accepted.
+        """
+        with self._lock:
+            queue_depth = max(0, self._pending - self.workers)
+            if queue_depth >= self.max_queue:
+                self.rejected += 1
+                raise TranscriptionQueueFull(queue_depth, self.max_queue)
+            position = self._pending
+            self._pending += 1
+
+        submitted = time.time()
+        result = Future()
+        result.queue_position = position
+        job = self._pool.submit(_run_job, audio)
+
+        def on_done(job_future: Future):
+            with self._lock:
+                self._pending -= 1
+            try:
+                outcome = job_future.result()
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                result.set_exception(e)
+                return
+            self.latency.record("queue_wait", (outcome["started"] - submitted) * 1000)
+            self.latency.record("inference", (outcome["finished"] - outcome["started"]) * 1000)
+            self.latency.record("total", (outcome["finished"] - submitted) * 1000)
+            with self._lock:
+                self.completed += 1
+            result.set_result(outcome["text"])
+
+        job.add_done_callback(on_done)
+        return result
+
+    def transcribe(self, audio_path, timeout: float = None) -> str:
+        """
+        Blocking convenience wrapper with the same signature as SpeechToText.
+        """
+        return self.submit(audio_path).result(timeout=timeout)
+
+    def warm_up(self) -> None:
+        """
+        Start every worker now so the first requests do not pay for model
+        loading; each worker runs a dummy inference before taking jobs.
+        """
+        futures = [self._pool.submit(time.sleep, 0) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def is_alive(self) -> bool:
+        """
+        False once a worker process has died and the pool can no longer run jobs.
+        """
+        return not getattr(self._pool, "_broken", False)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = self._pending
+            counters = {
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+        return {
+            "model": self.model_name,
+            "profile": self.profile.as_dict(),
+            "workers": self.workers,
+            "torch_threads": self.torch_threads,
+            "max_queue": self.max_queue,
+            "in_flight": min(pending, self.workers),
+            "queue_depth": max(0, pending - self.workers),
+            **counters,
+            "latency": self.latency.summary(),
+        }
@@ -0,0 +1,367 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(
+    text: str,
+    voice_id: str,
+    style: str = None,
+    rate: float = 0.0,
+    pitch: float = 0.0,
+    format: str = "MP3",
+    sample_rate: int = 44100,
+    **_ignored,
+) -> str:
+    """
+    Content address for one synthesized utterance.
+    """
+    material = json.dumps(
+        [text, voice_id, style, rate, pitch, (format or "").upper(), sample_rate],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class CachedTTSClient:
+    """
+    Drop-in wrapper around MurfTTSClient that caches synthesized audio.
+
+    Audio is keyed by a hash of the text and voice settings and kept in two
+    tiers: an in-memory LRU bounded by `memory_bytes` and a directory on disk
+    bounded by `disk_bytes`. Concurrent requests for the same key share a
+    single Murf call.
+
+    With encode_as_base64=False (raw audio) only the disk tier is used: the
+    audioFile Murf returns is downloaded straight into the cache in chunks,
+    and responses carry `audio_path`, the cache file, instead of base64.
+    """
+
+    def __init__(
+        self,
+        client,
+        cache_dir: str = None,
+        memory_bytes: int = None,
+        disk_bytes: int = None,
+    ):
+        if cache_dir is None:
+            cache_dir = os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts"))
+        if memory_bytes is None:
+            memory_bytes = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+        if disk_bytes is None:
+            disk_bytes = int(os.getenv("TTS_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+        self.client = client
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_async = {}
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.coalesced = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            try:
+                self._disk_size += os.path.getsize(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+    def __getattr__(self, name):
+        # Anything we do not override (save_audio, api_key, ...) goes to the client.
+        return getattr(self.client, name)
+
+    def generate_speech(self, text: str, voice_id: str, **kwargs) -> dict:
+        """
+        Same contract as MurfTTSClient.generate_speech, served from cache when possible.
+        """
+        raw = not kwargs.get("encode_as_base64", True)
+        key = cache_key(text, voice_id, **kwargs)
+        if raw:
+            cached = self._lookup_raw(key)
+            if cached is not None:
+                return cached
+        else:
+            audio = self._lookup(key)
+            if audio is not None:
+                return self._cached_response(audio)
+
+        # Raw and base64 requests for the same key wait on separate calls.
+        inflight_key = f"{key}:raw" if raw else key
+        with self._lock:
+            pending = self._inflight.get(inflight_key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[inflight_key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return pending.result()
+
+        try:
+            resp = self.client.generate_speech(text=text, voice_id=voice_id, **kwargs)
+            resp = self._download(key, resp) if raw else self._store_response(key, resp)
+            pending.set_result(resp)
+            return resp
+        except BaseException as e:
+            # Followers are blocked on pending: resolve it on every way out.
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(inflight_key, None)
+
+    async def generate_speech_async(self, text: str, voice_id: str, **kwargs) -> dict:
+        raw = not kwargs.get("encode_as_base64", True)
+        key = cache_key(text, voice_id, **kwargs)
+        if raw:
+            cached = await asyncio.to_thread(self._lookup_raw, key)
+            if cached is not None:
+                return cached
+        else:
+            audio = await asyncio.to_thread(self._lookup, key)
+            if audio is not None:
+                return self._cached_response(audio)
+
+        inflight_key = f"{key}:raw" if raw else key
+        pending = self._inflight_async.get(inflight_key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        pending = self._inflight_async[inflight_key] = asyncio.get_running_loop().create_future()
+        self.misses += 1
+        try:
+            resp = await self.client.generate_speech_async(text=text, voice_id=voice_id, **kwargs)
+            store = self._download if raw else self._store_response
+            resp = await asyncio.to_thread(store, key, resp)
+            pending.set_result(resp)
+            return resp
+        except BaseException as e:
+            # Followers are awaiting pending: resolve it on every way out.
+            # A future cannot hold a CancelledError, so a cancelled leader
+            # fails them with an error of their own instead.
+            if not pending.done():
+                if not isinstance(e, Exception):
+                    e = RuntimeError("TTS request was cancelled")
+                pending.set_exception(e)
+                # Mark the exception as retrieved when nobody else was waiting.
+                pending.exception()
+            raise
+        finally:
+            self._inflight_async.pop(inflight_key, None)
+
+    def prewarm(self, texts: Iterable[str], voice_id: str, background: bool = True, **kwargs) -> Optional[threading.Thread]:
+        """
+        Synthesize known fixed phrases into the cache ahead of time.
+        """
+        def run():
+            for text in texts:
+                try:
+                    resp = self.generate_speech(text=text, voice_id=voice_id, **kwargs)
+                    if not resp.get("success"):
+                        logger.warning("TTS prewarm failed for %r: %s", text[:40], resp.get("error"))
+                except Exception as e:
+                    logger.warning("TTS prewarm failed for %r: %s", text[:40], e)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="tts-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_bytes": self._disk_size,
+            }
+
+    @staticmethod
+    def _cached_response(audio: bytes = None, path: str = None, raw: bool = False) -> dict:
+        """
+        A hit in generate_speech's response shape. Raw requests get the
+        bytes (`audio`) or the cache file (`audio_path`) as they are; only
+        base64 requests pay for encoding.
+        """
+        return {
+            "success": True,
+            "audio_file": None,
+            "audio_path": path,
+            "audio": audio if raw else None,
+            "encoded_audio": base64.b64encode(audio).decode("ascii") if audio is not None and not raw else None,
+            "audio_length_seconds": None,
+            "warning": None,
+            "cached": True,
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.audio")
+
+    def _lookup(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return audio
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)  # keep recently used files away from eviction
+        except OSError:
+            return None
+        with self._lock:
+            self.hits_disk += 1
+            self._remember(key, audio)
+        return audio
+
+    def _lookup_raw(self, key: str) -> Optional[dict]:
+        """
+        A raw-audio hit: the bytes from the memory tier, otherwise the
+        disk-tier file, without reading it.
+        """
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+        if audio is not None:
+            return self._cached_response(audio, raw=True)
+        path = self._lookup_path(key)
+        return self._cached_response(path=path) if path is not None else None
+
+    def _lookup_path(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            os.utime(path)  # keep recently used files away from eviction
+        except OSError:
+            return None
+        with self._lock:
+            self.hits_disk += 1
+        return path
+
+    def _download(self, key: str, resp: dict) -> dict:
+        """
+        Stream a raw-audio response's audioFile into the disk tier and point
+        the response at it. Base64 responses are stored as usual.
+        """
+        if not resp or not resp.get("success"):
+            return resp
+        if resp.get("encoded_audio") or not resp.get("audio_file"):
+            return self._store_response(key, resp)
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        size = 0
+        # Clips small enough for the memory tier are kept there as well.
+        chunks = []
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in self.client.iter_audio(resp["audio_file"]):
+                    f.write(chunk)
+                    size += len(chunk)
+                    if chunks is not None and size <= self.memory_bytes:
+                        chunks.append(chunk)
+                    else:
+                        chunks = None
+            previous = _file_size(path)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning("TTS audio download failed: %s", e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return {"success": False, "error": "Audio download failed", "details": str(e)}
+        with self._lock:
+            self._disk_size += size - previous
+            if chunks:
+                self._remember(key, b"".join(chunks))
+        self._evict_disk()
+        return dict(resp, audio_path=path)
+
+    def _store_response(self, key: str, resp: dict) -> dict:
+        if not resp or not resp.get("success") or not resp.get("encoded_audio"):
+            return resp
+        audio = base64.b64decode(resp["encoded_audio"])
+        with self._lock:
+            self._remember(key, audio)
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(audio)
+            previous = _file_size(path)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("TTS cache write failed: %s", e)
+            return resp
+        with self._lock:
+            self._disk_size += len(audio) - previous
+        self._evict_disk()
+        return resp
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        # Caller holds self._lock.
+        if len(audio) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = audio
+        self._memory_size += len(audio)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict_disk(self) -> None:
+        with self._lock:
+            if self._disk_size <= self.disk_bytes:
+                return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_size = total
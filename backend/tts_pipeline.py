@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+from backend import metrics
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+SEGMENT_MIN_CHARS = int(os.getenv("TTS_SEGMENT_MIN_CHARS", "40"))
+SEGMENT_MAX_CHARS = int(os.getenv("TTS_SEGMENT_MAX_CHARS", "300"))
+SEGMENT_PARALLELISM = int(os.getenv("TTS_SEGMENT_PARALLELISM", "3"))
+
+
+def split_into_segments(
+    text: str,
+    min_chars: int = SEGMENT_MIN_CHARS,
+    max_chars: int = SEGMENT_MAX_CHARS,
+) -> List[str]:
+    """
+    Split a reply into sentence-sized pieces for speech synthesis.
+
+    Short sentences are merged with the next one so we do not pay a Murf
+    round trip for "Okay." on its own, and sentences longer than `max_chars`
+    are broken at clause punctuation.
+    """
+    if not text or not text.strip():
+        return []
+
+    pieces = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        current = ""
+        for clause in _CLAUSE_END.split(sentence):
+            if current and len(current) + len(clause) + 1 > max_chars:
+                pieces.append(current)
+                current = clause
+            else:
+                current = f"{current} {clause}".strip()
+        if current:
+            pieces.append(current)
+
+    segments = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            segments.append(current)
+            current = ""
+        current = f"{current} {piece}".strip()
+        if len(current) >= min_chars:
+            segments.append(current)
+            current = ""
+    if current:
+        if segments and len(segments[-1]) + len(current) + 1 <= max_chars:
+            segments[-1] = f"{segments[-1]} {current}"
+        else:
+            segments.append(current)
+    return segments
+
+
+def synthesize_segments(
+    murf_client,
+    segments: List[str],
+    max_parallel: int = SEGMENT_PARALLELISM,
+    **speech_kwargs,
+) -> Iterator[dict]:
+    """
+    Synthesize segments concurrently and yield the Murf results in order.
+
+    At most `max_parallel` requests are in flight at once. Each result is
+    yielded as soon as it and every earlier segment have finished, so the
+    caller can start playback after the first segment.
+    """
+    if not segments:
+        return
+    generate_speech = metrics.timed("tts", murf_client.generate_speech)
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="tts-segment") as pool:
+        # Each call runs in a copy of the caller's context, so its logs keep
+        # the request id.
+        futures = [
+            pool.submit(contextvars.copy_context().run, generate_speech, text=segment, **speech_kwargs)
+            for segment in segments
+        ]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+async def synthesize_segments_async(
+    murf_client,
+    segments: List[str],
+    max_parallel: int = SEGMENT_PARALLELISM,
+    **speech_kwargs,
+):
+    """
+    asyncio variant of synthesize_segments using generate_speech_async.
+    """
+    if not segments:
+        return
+    limit = asyncio.Semaphore(max(1, max_parallel))
+
+    async def synthesize(segment: str) -> dict:
+        async with limit:
+            with metrics.stage("tts"):
+                return await murf_client.generate_speech_async(text=segment, **speech_kwargs)
+
+    tasks = [asyncio.ensure_future(synthesize(segment)) for segment in segments]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from backend import metrics
+from backend.latency import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+
+class TTSProfile:
+    """
+    Output format of synthesized speech.
+
+    - name: what clients ask for in X-Audio-Profile
+    - format: Murf output format ("MP3", "OGG", ...)
+    - sample_rate: Murf sample rate (8000, 24000, 44100 or 48000); one
+      voice needs far less than 44.1 kHz
+    - mime_type: what the client must be able to play
+    - ext: extension the clip is saved under
+    """
+
+    def __init__(self, name: str, format: str, sample_rate: int, mime_type: str, ext: str):
+        self.name = name
+        self.format = format
+        self.sample_rate = sample_rate
+        self.mime_type = mime_type
+        self.ext = ext
+
+    def speech_settings(self, raw: bool = None) -> dict:
+        """
+        Keyword arguments for generate_speech. With `raw` (TTS_RAW_AUDIO,
+        on by default) Murf is asked for the audioFile URL, and the clip is
+        then downloaded as raw bytes instead of a base64 string a third
+        larger.
+        """
+        if raw is None:
+            raw = os.getenv("TTS_RAW_AUDIO", "1") == "1"
+        return {"format": self.format, "sample_rate": self.sample_rate, "encode_as_base64": not raw}
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "format": self.format,
+            "sample_rate": self.sample_rate,
+            "mime_type": self.mime_type,
+        }
+
+
+PROFILES = {
+    # The original output: 44.1 kHz MP3.
+    "mp3-44k": TTSProfile("mp3-44k", "MP3", 44100, "audio/mpeg", ".mp3"),
+    "mp3-24k": TTSProfile("mp3-24k", "MP3", 24000, "audio/mpeg", ".mp3"),
+    # Murf's OGG output, Opus-encoded: the smallest at a given quality.
+    "opus-24k": TTSProfile("opus-24k", "OGG", 24000, "audio/ogg", ".ogg"),
+    # Telephone quality for clients on slow or metered connections.
+    "mp3-8k": TTSProfile("mp3-8k", "MP3", 8000, "audio/mpeg", ".mp3"),
+}
+
+
+def default_profile() -> TTSProfile:
+    name = os.getenv("TTS_PROFILE", "mp3-24k")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown TTS_PROFILE {name!r}; choose from {', '.join(PROFILES)}.")
+    return PROFILES[name]
+
+
+def _base_type(mime_type: str) -> str:
+    return mime_type.split(";")[0].strip().lower()
+
+
+def negotiate_profile(formats: Optional[str] = None, requested: Optional[str] = None) -> TTSProfile:
+    """
+    Pick the output profile for a client.
+
+    `formats` lists the MIME types the client can play, comma-separated
+    (the X-Audio-Formats header); `requested` names a profile it would
+    like (X-Audio-Profile), such as "mp3-8k" when it wants to save data.
+    A requested profile is used if the client can play it. Otherwise the
+    first profile in TTS_PROFILE_PREFERENCE (default "opus-24k,mp3-24k")
+    that it can play, and TTS_PROFILE for clients that say nothing.
+    """
+    playable = None
+    if formats:
+        playable = {_base_type(mime_type) for mime_type in formats.split(",") if mime_type.strip()}
+
+    def can_play(profile: TTSProfile) -> bool:
+        return playable is None or _base_type(profile.mime_type) in playable
+
+    profile = PROFILES.get((requested or "").strip().lower())
+    if profile is not None and can_play(profile):
+        return profile
+    if requested and profile is None:
+        logger.debug("Ignoring unknown audio profile %r", requested)
+    if playable is not None:
+        for name in os.getenv("TTS_PROFILE_PREFERENCE", "opus-24k,mp3-24k").split(","):
+            profile = PROFILES.get(name.strip())
+            if profile is not None and can_play(profile):
+                return profile
+    return default_profile()
+
+
+class ProfileStats:
+    """
+    Audio bytes per turn and time to audio (from the start of the turn to
+    its first clip being ready), per output profile.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.time_to_audio = LatencyTracker(window)
+        self._lock = threading.Lock()
+        self._turns: Dict[str, int] = {}
+        self._bytes: Dict[str, int] = {}
+
+    def record(self, profile: TTSProfile, audio_filepaths: List[str], time_to_audio_ms: float) -> None:
+        size = 0
+        for path in audio_filepaths:
+            try:
+                size += os.path.getsize(path)
+            except (OSError, TypeError):
+                pass
+        with self._lock:
+            self._turns[profile.name] = self._turns.get(profile.name, 0) + 1
+            self._bytes[profile.name] = self._bytes.get(profile.name, 0) + size
+        self.time_to_audio.record(profile.name, time_to_audio_ms)
+        metrics.TTS_AUDIO_BYTES.observe(size, profile=profile.name)
+        metrics.TIME_TO_AUDIO_SECONDS.observe(time_to_audio_ms / 1000, profile=profile.name)
+
+    def summary(self) -> dict:
+        latencies = self.time_to_audio.summary()
+        with self._lock:
+            return {
+                name: {
+                    "turns": turns,
+                    "avg_bytes_per_turn": round(self._bytes[name] / turns),
+                    "total_bytes": self._bytes[name],
+                    "time_to_audio": latencies.get(name, {"count": 0}),
+                }
+                for name, turns in self._turns.items()
+            }
@@ -0,0 +1,120 @@
+"""
+Benchmark prompt size over a long conversation, with and without history
+compaction.
+
+Drives one session through --turns turns against the fake Gemini model of
+benchmarks/fakes.py, once with compaction off (SESSION_TOKEN_BUDGET=0) and
+once with --budget. Turn --crisis-turn carries a safety trigger, to check
+that it is still in the history verbatim at the end. Reported per mode:
+
+- prompt tokens of the model call every --every turns (as counted by the
+  fake model, one token per word) and their average and total
+- turn latency, which should not grow when summaries are produced, since
+  they are made in the background between turns
+- summaries applied and whether the crisis turn survived verbatim
+
+Usage:
+    python benchmarks/bench_history.py [--turns 40] [--budget 1500] [--keep-turns 4]
+        [--every 5] [--summary-latency-ms 300] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+os.environ["SESSION_STORE"] = "memory"
+os.environ["LLM_CACHE"] = "0"
+
+from benchmarks.fakes import FakeGeminiModel  # noqa: E402
+
+CRISIS_MESSAGE = "Some nights everything feels hopeless and I think about ending it all."
+TOPICS = [
+    "my manager keeps adding deadlines and I lie awake replaying every meeting",
+    "my sister and I argued again about looking after our mother",
+    "I skipped the gym all week and I feel guilty about it",
+    "the breathing exercise helped a little on Tuesday but not on Thursday",
+    "I keep checking my phone at night waiting for work messages",
+]
+
+
+def user_message(turn: int, crisis_turn: int) -> str:
+    if turn == crisis_turn:
+        return CRISIS_MESSAGE
+    topic = TOPICS[turn % len(TOPICS)]
+    return f"Turn {turn}: {topic}, and honestly it is wearing me down more than I expected."
+
+
+def run(args, budget: int) -> dict:
+    from backend import gemini_client
+    from backend.orchastrator import Orchestrator
+
+    os.environ["SESSION_TOKEN_BUDGET"] = str(budget)
+    os.environ["SESSION_SUMMARY_KEEP_TURNS"] = str(args.keep_turns)
+    gemini_client._model = FakeGeminiModel(latency_ms=args.latency_ms, tokens_per_sec=0, reply_tokens=args.reply_tokens)
+    gemini_client._model_expires_at = None
+    gemini_client._summary_model = FakeGeminiModel(latency_ms=args.summary_latency_ms, tokens_per_sec=0, reply_tokens=120)
+    orch = Orchestrator()
+
+    prompt_tokens = []
+    latencies = []
+    for turn in range(1, args.turns + 1):
+        started = time.perf_counter()
+        orch.start_session([user_message(turn, args.crisis_turn)], session_id="bench")
+        latencies.append((time.perf_counter() - started) * 1000)
+        prompt_tokens.append(gemini_client.get_token_usage()["last_prompt_tokens"])
+        # Think time between turns, which is when summaries get made.
+        time.sleep(args.think_ms / 1000)
+
+    session = orch.sessions.get("bench")
+    texts = [entry["parts"][0]["text"] for entry in session.chat_history]
+    return {
+        "budget": budget,
+        "prompt_tokens": prompt_tokens,
+        "avg_prompt_tokens": round(sum(prompt_tokens) / len(prompt_tokens), 1),
+        "total_prompt_tokens": sum(prompt_tokens),
+        "avg_turn_ms": round(sum(latencies) / len(latencies), 1),
+        "max_turn_ms": round(max(latencies), 1),
+        "summaries_applied": orch.compactor.applied,
+        "crisis_turn_verbatim": CRISIS_MESSAGE in texts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=1500, help="SESSION_TOKEN_BUDGET for the compacted run")
+    parser.add_argument("--keep-turns", type=int, default=4, help="SESSION_SUMMARY_KEEP_TURNS")
+    parser.add_argument("--crisis-turn", type=int, default=3)
+    parser.add_argument("--reply-tokens", type=int, default=120, help="Words per model reply")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Fake chat model latency")
+    parser.add_argument("--summary-latency-ms", type=float, default=300, help="Fake summary model latency")
+    parser.add_argument("--think-ms", type=float, default=100, help="Pause between turns")
+    parser.add_argument("--every", type=int, default=5, help="Print prompt tokens every N turns")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    # SESSION_MAX_TURNS would otherwise cap the uncompacted run.
+    os.environ["SESSION_MAX_TURNS"] = str(args.turns + 1)
+    results = {"full": run(args, 0), "compacted": run(args, args.budget)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.turns} turns, {args.reply_tokens}-word replies, budget {args.budget}, keep {args.keep_turns} turns")
+    print(f"{'turn':>6} {'full':>8} {'compacted':>10}")
+    for turn in range(args.every, args.turns + 1, args.every):
+        print(f"{turn:>6} {results['full']['prompt_tokens'][turn - 1]:>8} {results['compacted']['prompt_tokens'][turn - 1]:>10}")
+    for name in ("full", "compacted"):
+        row = results[name]
+        print(
+            f"{name:>10}: avg {row['avg_prompt_tokens']} prompt tokens, total {row['total_prompt_tokens']}, "
+            f"turn avg {row['avg_turn_ms']} ms / max {row['max_turn_ms']} ms, "
+            f"{row['summaries_applied']} summaries, crisis turn verbatim: {row['crisis_turn_verbatim']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark the logging cost of one voice turn, old pattern against new.
+
+The old pattern is what the server used to do: a synchronous StreamHandler,
+INFO dumps of the request and response bodies, and a print of the whole
+Murf JSON response (base64 audio included) for every synthesized segment.
+The new pattern is backend.logging_setup.configure_logging(): bodies at
+DEBUG, sizes at INFO, redaction and a bounded queue drained by a background
+thread.
+
+Reports the time spent on the request thread per turn and the bytes that
+end up in the log. The log file is throttled to --sink-mbps to stand in for
+a terminal or container log pipe; the old pattern pays that cost on the
+request thread, the new one on the writer thread.
+
+Usage:
+    python benchmarks/bench_logging.py [--turns 200] [--segments 4] [--level INFO] [--sink-mbps 20] [--json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import CANNED_MP3_BASE64, canned_reply  # noqa: E402
+
+USER_MESSAGE = "I have been feeling anxious about work lately and I can't sleep."
+
+
+class ThrottledFile:
+    """
+    File wrapper whose writes take as long as they would on a sink that
+    accepts `mbps` megabytes per second.
+    """
+
+    def __init__(self, f, mbps: float):
+        self.f = f
+        self.seconds_per_byte = 1 / (mbps * 1_000_000) if mbps > 0 else 0
+
+    def write(self, text: str) -> int:
+        if self.seconds_per_byte:
+            time.sleep(len(text) * self.seconds_per_byte)
+        return self.f.write(text)
+
+    def flush(self) -> None:
+        self.f.flush()
+
+
+def murf_body() -> str:
+    return json.dumps({
+        "audioFile": None,
+        "encodedAudio": CANNED_MP3_BASE64,
+        "audioLengthInSeconds": 3.2,
+        "warning": None,
+    })
+
+
+def legacy_turn(logger, out, reply, body, segments):
+    data = {"user_message": USER_MESSAGE, "dtype": "audio", "session_id": "bench"}
+    logger.info(f"Request data: {data}")
+    logger.info(f"User message: {USER_MESSAGE}")
+    logger.info(f"AI response: {reply}")
+    for _ in range(segments):
+        print("DEBUG Murf API status: 200", file=out, flush=True)
+        print(f"DEBUG Murf API response: {body}", file=out, flush=True)
+        print("Audio saved successfully at audios/ai_response.mp3", file=out, flush=True)
+    response = {"user_message": USER_MESSAGE, "ai_response": reply, "audioFile": "/audios/ai_response.mp3"}
+    logger.info(f"Returning audio response: {response}")
+
+
+def new_turn(logger, tts_logger, reply, body, segments):
+    data = {"user_message": USER_MESSAGE, "dtype": "audio", "session_id": "bench"}
+    logger.debug("Request data: %s", data)
+    logger.info("dtype=%s session_id=%s message_chars=%d", "audio", "bench", len(USER_MESSAGE))
+    logger.debug("AI response: %s", reply)
+    for _ in range(segments):
+        tts_logger.debug("Murf API status %s, %d bytes", 200, len(body))
+        tts_logger.debug("Audio saved at %s", "audios/ai_response.mp3")
+    logger.info("Returning audio response (%d chars)", len(reply))
+
+
+def run_legacy(path, turns, segments, reply, body, mbps):
+    logger = logging.getLogger("bench.legacy")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    with open(path, "w") as f:
+        out = ThrottledFile(f, mbps)
+        handler = logging.StreamHandler(out)
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+        logger.addHandler(handler)
+        started = time.perf_counter()
+        for _ in range(turns):
+            legacy_turn(logger, out, reply, body, segments)
+        elapsed = time.perf_counter() - started
+        logger.removeHandler(handler)
+    return elapsed
+
+
+def run_new(path, turns, segments, reply, body, level, mbps):
+    from backend import logging_setup
+
+    os.environ["LOG_LEVEL"] = level
+    with open(path, "w") as f:
+        logging_setup.configure_logging(stream=ThrottledFile(f, mbps))
+        logger = logging.getLogger("app")
+        tts_logger = logging.getLogger("backend.text_to_speech")
+        started = time.perf_counter()
+        for _ in range(turns):
+            new_turn(logger, tts_logger, reply, body, segments)
+        elapsed = time.perf_counter() - started
+        logging_setup.stop_logging()
+    return elapsed, logging_setup.logging_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--segments", type=int, default=4, help="TTS segments per turn")
+    parser.add_argument("--level", default="INFO", help="LOG_LEVEL for the new pattern")
+    parser.add_argument("--sink-mbps", type=float, default=20, help="Simulated log sink throughput, 0 for unthrottled")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    reply = canned_reply(60)
+    body = murf_body()
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.log")
+        new_path = os.path.join(tmp, "new.log")
+        legacy_s = run_legacy(legacy_path, args.turns, args.segments, reply, body, args.sink_mbps)
+        new_s, stats = run_new(new_path, args.turns, args.segments, reply, body, args.level, args.sink_mbps)
+        results = {
+            "turns": args.turns,
+            "segments_per_turn": args.segments,
+            "level": args.level.upper(),
+            "sink_mbps": args.sink_mbps,
+            "legacy": {
+                "caller_ms_per_turn": round(legacy_s / args.turns * 1000, 3),
+                "bytes_per_turn": os.path.getsize(legacy_path) // args.turns,
+            },
+            "new": {
+                "caller_ms_per_turn": round(new_s / args.turns * 1000, 3),
+                "bytes_per_turn": os.path.getsize(new_path) // args.turns,
+                "dropped": stats["dropped"],
+                "redacted": stats["redacted"],
+            },
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.turns} turns, {args.segments} TTS segments each, new pattern at {results['level']}, sink {args.sink_mbps} MB/s")
+    print(f"{'pattern':>8} {'caller ms/turn':>15} {'log bytes/turn':>15}")
+    for name in ("legacy", "new"):
+        row = results[name]
+        print(f"{name:>8} {row['caller_ms_per_turn']:>15} {row['bytes_per_turn']:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark the compiled safety matcher against the old per-trigger loop.
+
+Builds synthetic lexicons of increasing size and reports the scan cost per
+character of input. The compiled matcher should stay flat as the lexicon
+grows; the naive loop grows linearly with it.
+
+Before timing, the default lexicon is checked against RECALL_CASES, where
+every message must trigger the listed phrase as it did with the old
+substring check, and PRECISION_CASES, where none may trigger it. The
+script exits with an error if a check fails.
+
+Usage:
+    python benchmarks/bench_safety_matcher.py [--sizes 10,1000,5000,20000] [--json] [--check-only]
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.safety_matcher import SafetyMatcher  # noqa: E402
+from backend.system_instruction import get_advanced_therapist_instruction  # noqa: E402
+
+SAMPLE_MESSAGE = (
+    "I've been feeling really overwhelmed lately. Work keeps piling up, I can't sleep, "
+    "and honestly some days it feels like nothing I do makes a difference. "
+    "My friends say I should talk to someone, so here I am. "
+)
+
+# (message, trigger phrase it must match): inflected forms the old substring
+# check caught, plus the plain phrases.
+RECALL_CASES = [
+    ("my hopelessness is crushing", "hopeless"),
+    ("I have been self-harming", "self-harm"),
+    ("I self-harmed yesterday", "self-harm"),
+    ("suicides", "suicide"),
+    ("I feel so hopeless", "hopeless"),
+    ("I want to kill myself", "kill myself"),
+    ("Sometimes I think about ending it... I want to end it all.", "end it all"),
+]
+
+# (message, trigger phrase it must not match): longer words that start with
+# a phrase's last word. These would skip Gemini for the crisis template.
+PRECISION_CASES = [
+    ("I just want to end it already", "end it all"),
+    ("I want to end it also", "end it all"),
+    ("I didn't mean to hurt myselfish feelings", "hurt myself"),
+    ("Nothing mattered more to me than that trip", "nothing matters"),
+]
+
+
+def check_recall(matcher: SafetyMatcher) -> list:
+    """
+    The RECALL_CASES `matcher` misses, as (message, phrase) pairs.
+    """
+    return [
+        (message, phrase) for message, phrase in RECALL_CASES
+        if phrase not in {match.phrase for match in matcher.scan(message)}
+    ]
+
+
+def check_precision(matcher: SafetyMatcher) -> list:
+    """
+    The PRECISION_CASES `matcher` wrongly fires on, as (message, phrase) pairs.
+    """
+    return [
+        (message, phrase) for message, phrase in PRECISION_CASES
+        if phrase in {match.phrase for match in matcher.scan(message)}
+    ]
+
+
+def random_phrase(rng: random.Random) -> str:
+    words = rng.randint(1, 3)
+    return " ".join(
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+        for _ in range(words)
+    )
+
+
+def naive_scan(triggers, text):
+    # The pre-matcher implementation from GeminiChatSession.add_user_message.
+    return [t for t in triggers if t in text.lower()]
+
+
+def time_per_char(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(text)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,5000,20000")
+    parser.add_argument("--text-repeat", type=int, default=8, help="Copies of the sample message per scan")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    parser.add_argument("--check-only", action="store_true", help="Only run the recall and precision checks")
+    args = parser.parse_args()
+
+    default = SafetyMatcher.from_protocol(get_advanced_therapist_instruction().safety_protocols)
+    missed = check_recall(default)
+    false_hits = check_precision(default)
+    for message, phrase in missed:
+        print(f"recall regression: {message!r} no longer matches {phrase!r}", file=sys.stderr)
+    for message, phrase in false_hits:
+        print(f"precision regression: {message!r} matches {phrase!r}", file=sys.stderr)
+    if missed or false_hits:
+        sys.exit(1)
+    if args.check_only:
+        print(f"{len(RECALL_CASES)} recall and {len(PRECISION_CASES)} precision checks passed")
+        return
+
+    rng = random.Random(42)
+    text = SAMPLE_MESSAGE * args.text_repeat
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        phrases = {random_phrase(rng): "synthetic" for _ in range(size)}
+        started = time.perf_counter()
+        matcher = SafetyMatcher(phrases)
+        build_ms = (time.perf_counter() - started) * 1000
+        results.append({
+            "phrases": len(matcher),
+            "text_chars": len(text),
+            "build_ms": round(build_ms, 1),
+            "compiled_ns_per_char": round(time_per_char(matcher.scan, text, args.repeat), 1),
+            "naive_ns_per_char": round(time_per_char(lambda t: naive_scan(list(phrases), t), text, args.repeat), 1),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'phrases':>8} {'build ms':>9} {'compiled ns/char':>17} {'naive ns/char':>14}")
+    for row in results:
+        print(f"{row['phrases']:>8} {row['build_ms']:>9} {row['compiled_ns_per_char']:>17} {row['naive_ns_per_char']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure cold-start time of the API server.
+
+Each run starts a fresh interpreter, imports the app module, kicks off
+initialize_clients() and waits until every subsystem is ready or failed.
+Reported per run:
+
+- import_ms:       importing the app module (should stay well under a second)
+- responsive_ms:   import plus initialize_clients() returning, i.e. when
+                   /health can first be answered
+- <subsystem>_ms:  time from loading the app module until that subsystem
+                   was ready (or failed, see the state columns)
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 3] [--app app|asgi_app] [--json]
+        [--max-import-ms 1000]
+
+Exits with status 1 when the median import time exceeds --max-import-ms, so
+it can guard against cold-start regressions in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+app = __import__(sys.argv[1])
+imported = time.perf_counter()
+app.initialize_clients()
+responsive = time.perf_counter()
+app.readiness.wait(timeout=float(sys.argv[2]))
+result = {
+    "import_ms": round((imported - started) * 1000, 1),
+    "responsive_ms": round((responsive - started) * 1000, 1),
+}
+for name, entry in app.readiness.snapshot().items():
+    result[name + "_ms"] = entry["ready_ms"]
+    result[name + "_state"] = entry["state"]
+print("BENCH " + json.dumps(result), flush=True)
+"""
+
+
+def run_once(module, timeout):
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, module, str(timeout)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=timeout + 60,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    raise RuntimeError(f"Startup run failed:\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--app", default="app", choices=["app", "asgi_app"])
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for subsystems per run")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    runs = [run_once(args.app, args.timeout) for _ in range(args.runs)]
+    timing_keys = [key for key in runs[0] if key.endswith("_ms")]
+    summary = {
+        key: round(statistics.median(run[key] for run in runs if run[key] is not None), 1)
+        for key in timing_keys
+        if any(run[key] is not None for run in runs)
+    }
+
+    if args.json:
+        print(json.dumps({"app": args.app, "runs": runs, "median": summary}, indent=2))
+    else:
+        print(f"{args.app}: median of {len(runs)} cold starts")
+        for key in timing_keys:
+            states = {run.get(key[:-3] + "_state") for run in runs} - {None}
+            note = f"  ({', '.join(sorted(states))})" if states else ""
+            print(f"  {key:<22} {summary.get(key, '-'):>10}{note}")
+
+    if args.max_import_ms is not None and summary["import_ms"] > args.max_import_ms:
+        print(f"import_ms {summary['import_ms']} exceeds budget {args.max_import_ms}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark Whisper performance profiles on CPU.
+
+For each profile (see backend.speech_to_text.PROFILES) the model is loaded,
+warmed up and run over the sample clips. Reported per profile:
+
+- load_s:  loading (and quantizing) the model
+- rtf:     real-time factor, processing seconds per second of audio
+           (lower is faster; 0.1 means ten times faster than real time)
+- wer:     word error rate against the reference transcripts
+
+A clip's reference transcript is read from a text file next to it with the
+same name (audios/user_audio.txt for audios/user_audio.mp3). Clips without
+one are scored against the output of --reference-profile instead, which
+measures how far a faster profile drifts from the accurate one.
+
+Usage:
+    python benchmarks/bench_whisper.py [--profiles default,fast,fastest]
+        [--samples audios/user_audio.mp3] [--reference-profile accurate]
+        [--threads 0] [--repeat 1] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.speech_to_text import PROFILES, SAMPLE_RATE, SpeechToText, WhisperProfile, decode_audio  # noqa: E402
+
+
+def normalize_words(text: str) -> list:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    (substitutions + deletions + insertions) / reference words.
+    """
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_samples(paths):
+    samples = []
+    for path in paths:
+        with open(path, "rb") as f:
+            audio = decode_audio(f.read())
+        transcript_path = os.path.splitext(path)[0] + ".txt"
+        reference = None
+        if os.path.isfile(transcript_path):
+            with open(transcript_path, encoding="utf-8") as f:
+                reference = f.read().strip()
+        samples.append({"path": path, "audio": audio, "seconds": len(audio) / SAMPLE_RATE, "reference": reference})
+    return samples
+
+
+def run_profile(name, samples, repeat, threads=0):
+    profile = PROFILES[name]
+    if threads:
+        profile = WhisperProfile(**dict(profile.as_dict(), threads=threads))
+    started = time.perf_counter()
+    stt = SpeechToText(profile=profile)
+    load_s = time.perf_counter() - started
+    stt.warm_up()
+
+    outputs = []
+    busy = 0.0
+    for sample in samples:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            text = stt.transcribe(sample["audio"])
+            busy += time.perf_counter() - started
+        outputs.append(text.strip())
+    audio_seconds = sum(sample["seconds"] for sample in samples) * repeat
+    return {
+        "profile": name,
+        "settings": profile.as_dict(),
+        "load_s": round(load_s, 2),
+        "rtf": round(busy / audio_seconds, 3),
+    }, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="default,fast,fastest")
+    parser.add_argument("--samples", default=os.path.join(ROOT, "audios", "user_audio.mp3"), help="Comma-separated audio files")
+    parser.add_argument("--reference-profile", default="accurate", help="Scores clips that have no transcript file")
+    parser.add_argument("--threads", type=int, default=0, help="Torch threads for every profile (0: torch default)")
+    parser.add_argument("--repeat", type=int, default=1, help="Transcriptions per clip and profile")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    unknown = [name for name in names + [args.reference_profile] if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profile(s) {', '.join(unknown)}; choose from {', '.join(PROFILES)}")
+
+    samples = load_samples(args.samples.split(","))
+    if any(sample["reference"] is None for sample in samples):
+        _, reference_outputs = run_profile(args.reference_profile, samples, 1, args.threads)
+        for sample, text in zip(samples, reference_outputs):
+            if sample["reference"] is None:
+                sample["reference"] = text
+                sample["reference_source"] = f"profile:{args.reference_profile}"
+    for sample in samples:
+        sample.setdefault("reference_source", "transcript")
+
+    results = []
+    for name in names:
+        row, outputs = run_profile(name, samples, args.repeat, args.threads)
+        errors = [word_error_rate(sample["reference"], text) for sample, text in zip(samples, outputs)]
+        row["wer"] = round(sum(errors) / len(errors), 3)
+        results.append(row)
+
+    report = {
+        "samples": [
+            {"path": s["path"], "seconds": round(s["seconds"], 1), "reference": s["reference_source"]}
+            for s in samples
+        ],
+        "profiles": results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for sample in report["samples"]:
+        print(f"{sample['path']}: {sample['seconds']} s, reference from {sample['reference']}")
+    print(f"{'profile':>10} {'model':>8} {'int8':>5} {'lang':>5} {'beam':>6} {'fallback':>9} {'threads':>7} {'load s':>7} {'RTF':>7} {'WER':>6}")
+    for row in results:
+        s = row["settings"]
+        print(
+            f"{row['profile']:>10} {s['model']:>8} {str(s['quantize']):>5} {str(s['language']):>5} "
+            f"{str(s['beam_size'] or 'greedy'):>6} {str(s['temperature_fallback']):>9} {s['threads'] or 'auto':>7} "
+            f"{row['load_s']:>7} {row['rtf']:>7} {row['wer']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
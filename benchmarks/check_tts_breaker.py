@@ -0,0 +1,102 @@
+"""
+Regression checks for the Murf circuit breaker, against the mock Murf server.
+
+- Cancelled calls (a client disconnect, or synthesize_segments_async
+  cancelling the other segments after one fails) must leave the breaker
+  closed: they say nothing about Murf's health.
+- A cancelled half-open trial must give the trial back, so the next call
+  can try again.
+- 503s from Murf must still open it.
+
+Exits with an error if a check fails. No API keys needed.
+
+Usage:
+    python benchmarks/check_tts_breaker.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.text_to_speech import CircuitBreaker, MurfTTSClient  # noqa: E402
+from benchmarks.fakes import MockMurfServer  # noqa: E402
+
+CALL = {"text": "Take a slow breath with me.", "voice_id": "en-US-natalie"}
+
+
+def client_for(murf: MockMurfServer, breaker: CircuitBreaker) -> MurfTTSClient:
+    return MurfTTSClient(api_key="bench", base_url=murf.url, max_retries=0, breaker=breaker)
+
+
+async def cancel_calls(client: MurfTTSClient, count: int) -> None:
+    tasks = [asyncio.create_task(client.generate_speech_async(**CALL)) for _ in range(count)]
+    await asyncio.sleep(0.05)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def check_cancelled_calls(murf: MockMurfServer) -> list:
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    client = client_for(murf, breaker)
+    try:
+        await cancel_calls(client, 5)
+        failures = []
+        if breaker.state != "closed":
+            failures.append(f"5 cancelled calls left the breaker {breaker.state}")
+        resp = await client.generate_speech_async(**CALL)
+        if not resp.get("success"):
+            failures.append(f"call after cancellations failed: {resp.get('error')}")
+        return failures
+    finally:
+        await client.aclose()
+
+
+async def check_cancelled_trial(murf: MockMurfServer) -> list:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()  # half-open from here on
+    client = client_for(murf, breaker)
+    try:
+        await cancel_calls(client, 1)
+        resp = await client.generate_speech_async(**CALL)
+        if not resp.get("success"):
+            return [f"cancelled half-open trial blocked the next call: {resp.get('error')}"]
+        return []
+    finally:
+        await client.aclose()
+
+
+def check_upstream_errors(murf: MockMurfServer) -> list:
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    client = client_for(murf, breaker)
+    murf.error_rate = 1.0
+    try:
+        for _ in range(3):
+            client.generate_speech(**CALL)
+    finally:
+        murf.error_rate = 0.0
+        client.close()
+    if breaker.state != "open":
+        return [f"3 Murf 503s left the breaker {breaker.state}"]
+    return []
+
+
+def main():
+    murf = MockMurfServer(latency_ms=500, jitter_ms=0).start()
+    try:
+        failures = asyncio.run(check_cancelled_calls(murf))
+        failures += asyncio.run(check_cancelled_trial(murf))
+        murf.latency = 0
+        failures += check_upstream_errors(murf)
+    finally:
+        murf.stop()
+    if failures:
+        for failure in failures:
+            print(f"breaker regression: {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("3 breaker checks passed")
+
+
+if __name__ == "__main__":
+    main()
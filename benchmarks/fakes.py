@@ -0,0 +1,256 @@
+"""
+Local stand-ins for the external services, used by the offline load test.
+
+- FakeGeminiModel replaces the shared Gemini model handle and produces a
+  canned reply with configurable first-token latency and token rate.
+- MockMurfServer is a Murf-compatible HTTP endpoint that returns canned
+  audio after a configurable delay, as base64 or as an audioFile URL it
+  also serves. Point MURF_BASE_URL at its `url`.
+- StubSpeechToText takes the place of Whisper and returns fixed text.
+"""
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+REPLY_SENTENCES = [
+    "I hear you, and it makes sense that you feel this way right now.",
+    "Thank you for trusting me with something so personal.",
+    "Let's take a slow breath together before we look at it more closely.",
+    "What do you notice in your body when that thought comes up?",
+    "You do not have to solve everything today, one small step is enough.",
+    "Could you tell me a little more about when this started?",
+]
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz), repeated for ~0.5 s.
+_MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+CANNED_MP3_BASE64 = base64.b64encode(_MP3_FRAME * 19).decode("ascii")
+# Typical bit rates of Murf's output for one voice, by format and sample rate.
+_BIT_RATES = {
+    ("MP3", 8000): 24000,
+    ("MP3", 24000): 64000,
+    ("MP3", 44100): 128000,
+    ("MP3", 48000): 128000,
+    ("OGG", 8000): 16000,
+    ("OGG", 24000): 32000,
+    ("OGG", 44100): 48000,
+    ("OGG", 48000): 48000,
+}
+
+
+def canned_audio(text: str, format: str = "MP3", sample_rate: int = 44100) -> bytes:
+    """
+    Stand-in audio as long as `text` would take to speak (15 characters a
+    second), at the bit rate of `format` and `sample_rate`. Only the size
+    is realistic.
+    """
+    seconds = max(0.5, len(text) / 15)
+    bit_rate = _BIT_RATES.get(((format or "MP3").upper(), sample_rate), 128000)
+    size = int(seconds * bit_rate / 8)
+    header = b"OggS" if (format or "").upper() == "OGG" else _MP3_FRAME[:4]
+    frame = header + bytes(413)
+    return (frame * (size // len(frame) + 1))[:size]
+
+
+def canned_reply(tokens: int) -> str:
+    words = []
+    index = 0
+    while len(words) < tokens:
+        words.extend(REPLY_SENTENCES[index % len(REPLY_SENTENCES)].split())
+        index += 1
+    text = " ".join(words[:tokens])
+    return text if text.endswith((".", "?", "!")) else text + "."
+
+
+class FakeGeminiModel:
+    """
+    Mimics GenerativeModel.generate_content(_async), with and without stream=True.
+
+    The first chunk arrives after `latency_ms`; the reply then streams at
+    `tokens_per_sec` words per second, `chunk_tokens` words per chunk.
+    """
+
+    def __init__(self, latency_ms: float = 300, tokens_per_sec: float = 60, reply_tokens: int = 60, chunk_tokens: int = 8):
+        self.latency = latency_ms / 1000
+        self.token_delay = 1 / tokens_per_sec if tokens_per_sec > 0 else 0
+        self.reply = canned_reply(reply_tokens)
+        self.chunk_tokens = chunk_tokens
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _chunks(self):
+        words = self.reply.split()
+        for i in range(0, len(words), self.chunk_tokens):
+            piece = words[i:i + self.chunk_tokens]
+            text = " ".join(piece) + (" " if i + self.chunk_tokens < len(words) else "")
+            yield text, len(piece) * self.token_delay
+
+    def _response(self, contents, text: str):
+        prompt_tokens = sum(len(p.get("text", "").split()) for c in contents for p in c["parts"])
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                cached_content_token_count=0,
+                candidates_token_count=len(text.split()),
+            ),
+        )
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        self._count()
+        if stream:
+            return self._stream(contents)
+        time.sleep(self.latency + len(self.reply.split()) * self.token_delay)
+        return self._response(contents, self.reply)
+
+    def _stream(self, contents):
+        time.sleep(self.latency)
+        for text, delay in self._chunks():
+            time.sleep(delay)
+            yield self._response(contents, text)
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        self._count()
+        if stream:
+            return self._stream_async(contents)
+        await asyncio.sleep(self.latency + len(self.reply.split()) * self.token_delay)
+        return self._response(contents, self.reply)
+
+    async def _stream_async(self, contents):
+        await asyncio.sleep(self.latency)
+        for text, delay in self._chunks():
+            await asyncio.sleep(delay)
+            yield self._response(contents, text)
+
+
+class StubSpeechToText:
+    """
+    Same interface as SpeechToText; sleeps `latency_ms` and returns `text`.
+    """
+
+    def __init__(self, latency_ms: float = 150, text: str = "I have been feeling anxious about work lately."):
+        self.latency = latency_ms / 1000
+        self.text = text
+
+    def transcribe(self, audio_path) -> str:
+        time.sleep(self.latency)
+        return self.text
+
+    def warm_up(self) -> None:
+        pass
+
+
+class MockMurfServer:
+    """
+    Murf-compatible /v1/speech/generate endpoint on a local port.
+
+    Each request waits `latency_ms` (plus up to `jitter_ms`) and returns
+    canned audio sized for the text, format and sample rate: base64 in the
+    body, or with encodeAsBase64 false an audioFile URL served by GET. A
+    fraction `error_rate` of requests answers 503 instead. `bytes_sent`
+    counts the bytes of every response body.
+    """
+
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50, error_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.downloads = 0
+        self.bytes_sent = 0
+        self._files: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/speech/generate"
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                time.sleep(mock.latency + random.uniform(0, mock.jitter))
+                with mock._lock:
+                    mock.requests += 1
+                    failed = random.random() < mock.error_rate
+                    if failed:
+                        mock.errors += 1
+                if failed:
+                    self._send(json.dumps({"error": "Service unavailable"}).encode("utf-8"), 503)
+                    return
+                text = payload.get("text", "")
+                audio = canned_audio(text, payload.get("format"), payload.get("sampleRate", 44100))
+                body = {
+                    "audioFile": None,
+                    "encodedAudio": None,
+                    "audioLengthInSeconds": round(len(text) / 15, 2),
+                    "warning": None,
+                }
+                if payload.get("encodeAsBase64", True):
+                    body["encodedAudio"] = base64.b64encode(audio).decode("ascii")
+                else:
+                    name = uuid.uuid4().hex
+                    with mock._lock:
+                        mock._files[name] = audio
+                        while len(mock._files) > 1000:
+                            mock._files.popitem(last=False)
+                    host, port = mock._server.server_address[:2]
+                    body["audioFile"] = f"http://{host}:{port}/audio/{name}"
+                self._send(json.dumps(body).encode("utf-8"), 200)
+
+            def do_GET(self):
+                name = self.path.rsplit("/", 1)[-1]
+                with mock._lock:
+                    audio = mock._files.get(name)
+                    if audio is not None:
+                        mock.downloads += 1
+                if audio is None:
+                    self._send(b"not found", 404, "text/plain")
+                    return
+                self._send(audio, 200, "audio/mpeg")
+
+            def _send(self, data: bytes, status: int, content_type: str = "application/json"):
+                with mock._lock:
+                    mock.bytes_sent += len(data)
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled the call
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "MockMurfServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-murf", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
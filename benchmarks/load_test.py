@@ -0,0 +1,370 @@
+"""
+Offline end-to-end load test for the AI Therapist API.
+
+Starts the real Flask (or Quart) app on a local port with Gemini, Murf and
+Whisper replaced by the stand-ins in benchmarks/fakes.py, drives the real
+endpoints at a fixed concurrency and reports latency percentiles,
+throughput and error rate per scenario as JSON. No API keys or models needed.
+
+Scenarios:
+    chat_text     POST /chat            dtype=message
+    chat_audio    POST /chat            dtype=audio (file path on the server)
+    chat_stream   POST /chat/stream     SSE, also reports time to first token
+    voice_turn    POST /voice-turn      multipart upload, JSON reply
+    voice_stream  POST /voice-turn      stream=1, also reports time to first audio
+    voice_job     POST /jobs            multipart upload, then the job's SSE events
+                                        until done; also reports time to audio
+    chat_crisis   POST /chat            a message that trips the safety matcher, then
+                                        the follow-up job's SSE events until done;
+                                        first_event is the time to the safety reply
+
+Audio replies use the output profile named by --audio-profile (sent as
+X-Audio-Profile), downloaded raw unless --base64-audio is given; the report
+adds the server's audio bytes per turn and time to audio for that profile,
+and the bytes the mock Murf sent.
+
+Usage:
+    python benchmarks/load_test.py [--app app|asgi_app] [--concurrency 8]
+        [--requests 100] [--scenarios chat_text,chat_stream,...]
+        [--audio-profile mp3-24k] [--base64-audio]
+        [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeGeminiModel, MockMurfServer, StubSpeechToText  # noqa: E402
+from backend.latency import LatencyTracker  # noqa: E402
+
+SCENARIOS = ["chat_text", "chat_audio", "chat_stream", "voice_turn", "voice_stream", "voice_job", "chat_crisis"]
+USER_MESSAGE = "I have been feeling anxious about work lately and I can't switch off at night."
+CRISIS_MESSAGE = "Everything feels hopeless lately and I keep thinking about ending it all."
+BENCH_AUDIO = os.path.join("audios", "bench_input.webm")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def install_fakes(module, args):
+    """
+    Initialize the app's clients against the stand-ins instead of the real
+    services, and mark every subsystem ready.
+    """
+    import backend.gemini_client as gemini_client
+
+    gemini = FakeGeminiModel(args.gemini_latency_ms, args.gemini_tokens_per_sec, args.gemini_reply_tokens)
+    gemini_client._model = gemini
+    gemini_client._model_expires_at = None
+    gemini_client._summary_model = gemini
+    module.load_orchestrator()
+    module.load_text_to_speech()
+    module.sst_client = StubSpeechToText(args.stt_latency_ms)
+    for name in ("orchestrator", "speech_to_text", "text_to_speech"):
+        module.readiness.mark(name, "ready")
+    return gemini
+
+
+def start_flask(module, port):
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", port, module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-flask", daemon=True).start()
+    return server.shutdown
+
+
+def start_quart(module, port):
+    import asyncio
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.accesslog = None
+    stop = threading.Event()
+
+    def run():
+        async def trigger():
+            while not stop.is_set():
+                await asyncio.sleep(0.1)
+        asyncio.run(serve(module.app, config, shutdown_trigger=trigger))
+
+    threading.Thread(target=run, name="bench-quart", daemon=True).start()
+    return stop.set
+
+
+def wait_until_up(base_url, timeout=30):
+    import requests
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/ready", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+def read_sse(response, first_events, started):
+    """
+    Consume an SSE response. Returns (ms from `started` to the first event
+    named in `first_events` or None, error message or None).
+    """
+    first_ms = None
+    event = None
+    # Read byte by byte: larger reads can block until the buffer fills and
+    # would hide when the first event actually arrived.
+    for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+            if first_ms is None and event in first_events:
+                first_ms = (time.perf_counter() - started) * 1000
+        elif line.startswith("data: ") and event == "error":
+            return first_ms, json.loads(line[len("data: "):]).get("error", "error event")
+    return first_ms, None
+
+
+def send(session, base_url, scenario, session_id, audio_bytes):
+    """
+    Issue one request. Returns (ms to first streamed event or None, error or None).
+    """
+    started = time.perf_counter()
+    if scenario in ("chat_text", "chat_audio"):
+        payload = {"user_message": USER_MESSAGE, "dtype": "message", "session_id": session_id}
+        if scenario == "chat_audio":
+            payload.update(user_message=BENCH_AUDIO, dtype="audio")
+        resp = session.post(f"{base_url}/chat", json=payload, timeout=120)
+        body = resp.json()
+        return None, None if resp.status_code == 200 and "error" not in body else body.get("error", resp.status_code)
+    if scenario == "chat_stream":
+        payload = {"user_message": USER_MESSAGE, "session_id": session_id}
+        with session.post(f"{base_url}/chat/stream", json=payload, stream=True, timeout=120) as resp:
+            if resp.status_code != 200:
+                return None, f"HTTP {resp.status_code}"
+            return read_sse(resp, ("token", "done"), started)
+    if scenario == "chat_crisis":
+        payload = {"user_message": CRISIS_MESSAGE, "dtype": "message", "session_id": session_id}
+        resp = session.post(f"{base_url}/chat", json=payload, timeout=120)
+        first_ms = (time.perf_counter() - started) * 1000
+        body = resp.json()
+        if resp.status_code != 200 or not body.get("crisis"):
+            return None, body.get("error", "not answered on the crisis path")
+        if not body.get("follow_up"):
+            return first_ms, None
+        with session.get(f"{base_url}{body['follow_up']['events_url']}", stream=True, timeout=120) as events:
+            if events.status_code != 200:
+                return first_ms, f"HTTP {events.status_code}"
+            return first_ms, read_sse(events, (), started)[1]
+    if scenario == "voice_job":
+        files = {"audio": ("recording.webm", audio_bytes, "audio/webm")}
+        resp = session.post(f"{base_url}/jobs", data={"session_id": session_id}, files=files, timeout=120)
+        if resp.status_code != 202:
+            return None, f"HTTP {resp.status_code}"
+        with session.get(f"{base_url}{resp.json()['events_url']}", stream=True, timeout=120) as events:
+            if events.status_code != 200:
+                return None, f"HTTP {events.status_code}"
+            return read_sse(events, ("audio",), started)
+    stream = scenario == "voice_stream"
+    data = {"session_id": session_id, "stream": "1" if stream else "0"}
+    files = {"audio": ("recording.webm", audio_bytes, "audio/webm")}
+    with session.post(f"{base_url}/voice-turn", data=data, files=files, stream=stream, timeout=120) as resp:
+        if resp.status_code != 200:
+            return None, f"HTTP {resp.status_code}"
+        if stream:
+            return read_sse(resp, ("segment",), started)
+        body = resp.json()
+        return None, body.get("error")
+
+
+def run_scenario(base_url, scenario, concurrency, total, audio_bytes, headers=None):
+    import requests
+
+    tracker = LatencyTracker(window=total)
+    errors = []
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+
+    def worker(index):
+        session = requests.Session()
+        session.headers.update(headers or {})
+        session_id = f"bench-{scenario}-{index}-{uuid.uuid4().hex[:8]}"
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            started = time.perf_counter()
+            try:
+                first_ms, error = send(session, base_url, scenario, session_id, audio_bytes)
+            except Exception as e:
+                first_ms, error = None, str(e)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if error:
+                errors.append(str(error))
+                continue
+            tracker.record("latency", elapsed_ms)
+            if first_ms is not None:
+                tracker.record("first_event", first_ms)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    duration = time.perf_counter() - started
+    summary = tracker.summary()
+    completed = summary.get("latency", {}).get("count", 0)
+    return {
+        "requests": total,
+        "completed": completed,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / total, 4) if total else 0.0,
+        "duration_s": round(duration, 2),
+        "throughput_rps": round(completed / duration, 2) if duration else None,
+        "latency": summary.get("latency", {"count": 0}),
+        "first_event": summary.get("first_event"),
+        "sample_errors": sorted(set(errors))[:5],
+    }
+
+
+def compare(baseline, current):
+    print(f"{'scenario':<14} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for label, path in (("p50_ms", ("latency", "p50_ms")), ("p99_ms", ("latency", "p99_ms")), ("throughput_rps", ("throughput_rps",)), ("error_rate", ("error_rate",))):
+            old, new = before, result
+            for key in path:
+                old = (old or {}).get(key) if isinstance(old, dict) else None
+                new = (new or {}).get(key) if isinstance(new, dict) else None
+            change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else "-"
+            print(f"{name:<14} {label:<15} {old if old is not None else '-':>10} {new if new is not None else '-':>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app", choices=["app", "asgi_app"])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300)
+    parser.add_argument("--gemini-tokens-per-sec", type=float, default=60)
+    parser.add_argument("--gemini-reply-tokens", type=int, default=60)
+    parser.add_argument("--murf-latency-ms", type=float, default=200)
+    parser.add_argument("--murf-error-rate", type=float, default=0.0)
+    parser.add_argument("--stt-latency-ms", type=float, default=150)
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the Gemini reply cache on")
+    parser.add_argument("--tts-cache", action="store_true", help="Keep the TTS audio cache on")
+    parser.add_argument("--audio-profile", default="mp3-24k", help="Output profile to request (X-Audio-Profile)")
+    parser.add_argument("--base64-audio", action="store_true", help="Have Murf return base64 instead of an audioFile URL")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show server output")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    murf = MockMurfServer(args.murf_latency_ms, error_rate=args.murf_error_rate).start()
+    # Must be set before the app (and backend.gemini_client) is imported.
+    os.environ.update({
+        "GEMINI_API_KEY": "offline",
+        "MURF_API_KEY": "offline",
+        "MURF_BASE_URL": murf.url,
+        "STT_WORKERS": "0",
+        "LLM_CACHE": "1" if args.llm_cache else "0",
+        "TTS_CACHE": "1" if args.tts_cache else "0",
+        "TTS_RAW_AUDIO": "0" if args.base64_audio else "1",
+    })
+    # Work in a scratch directory so generated audio never lands in the repo.
+    workdir = tempfile.mkdtemp(prefix="therapist-loadtest-")
+    os.chdir(workdir)
+    os.makedirs("audios", exist_ok=True)
+    audio_bytes = b"\x1aE\xdf\xa3" + os.urandom(4096)
+    with open(BENCH_AUDIO, "wb") as f:
+        f.write(audio_bytes)
+
+    quiet = open(os.devnull, "w") if not args.verbose else None
+    with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+        import logging
+        module = __import__(args.app)
+        logging.disable(logging.INFO if not args.verbose else logging.NOTSET)
+        port = free_port()
+        if args.app == "app":
+            gemini = install_fakes(module, args)
+            stop = start_flask(module, port)
+        else:
+            fakes = {}
+            module.initialize_clients = lambda wait=False: fakes.setdefault("gemini", install_fakes(module, args))
+            stop = start_quart(module, port)
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(base_url)
+        if args.app != "app":
+            gemini = fakes["gemini"]
+
+        results = {}
+        for scenario in scenarios:
+            results[scenario] = run_scenario(
+                base_url, scenario, args.concurrency, args.requests, audio_bytes,
+                headers={"X-Audio-Profile": args.audio_profile},
+            )
+        tts_profiles = module.tts_profiles.summary()
+        stop()
+        murf.stop()
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "app": args.app,
+        "config": {
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "gemini_latency_ms": args.gemini_latency_ms,
+            "gemini_tokens_per_sec": args.gemini_tokens_per_sec,
+            "gemini_reply_tokens": args.gemini_reply_tokens,
+            "murf_latency_ms": args.murf_latency_ms,
+            "murf_error_rate": args.murf_error_rate,
+            "stt_latency_ms": args.stt_latency_ms,
+            "llm_cache": args.llm_cache,
+            "tts_cache": args.tts_cache,
+            "audio_profile": args.audio_profile,
+            "base64_audio": args.base64_audio,
+        },
+        "scenarios": results,
+        "tts_profiles": tts_profiles,
+        "upstream": {
+            "gemini_calls": gemini.calls,
+            "murf_requests": murf.requests,
+            "murf_errors": murf.errors,
+            "murf_downloads": murf.downloads,
+            "murf_bytes_sent": murf.bytes_sent,
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+Production launcher: loads Whisper once and forks workers that share it.
+
+Usage:
+    python serve.py [--app app|asgi_app] [--workers 2] [--threads N] [--pin-cpus] [--port 5001]
+
+See backend/prefork.py and the "Pre-fork workers" section of api_documentation.md.
+"""
+from backend.prefork import main
+
+if __name__ == "__main__":
+    main()